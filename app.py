@@ -1,11 +1,12 @@
 import json
 import base64
+import contextlib
 import urllib.parse
-import requests
 import datetime
 import os
-
-from openai import OpenAI
+import threading
+import time
+from concurrent.futures import as_completed
 
 from flask import Flask, request, abort, jsonify
 from dotenv import load_dotenv
@@ -15,19 +16,92 @@ from linebot.v3.messaging import (
     MessagingApi,
     ApiClient,
     ReplyMessageRequest,
+    PushMessageRequest,
     TextMessage,
 )
 from linebot.v3.webhooks import MessageEvent, TextMessageContent
 
 # ⭐ 新增這三個 import
-from modules.sheet_utils import get_gsheet, load_sheet_commands
-from modules.memory import save_group_message, load_group_memory
-from modules.llm import ask_bot_with_memory
-
-from modules.fantasy.player_stats import get_recent_stats, format_stats_for_llm
-from modules.fantasy.analysis_llm import analyze_last14
+from modules.sheet_utils import (
+    get_worksheet,
+    load_sheet_commands,
+    sheet_metrics_scope,
+    get_sheet_metrics,
+)
+from modules.memory import (
+    save_group_message,
+    load_group_memory,
+    get_group_log_stats,
+    start_group_memory_import,
+)
+from modules.llm import ask_bot_with_memory, get_llm_stats
+
+from modules.fantasy.player_stats import (
+    get_recent_stats,
+    get_season_stats,
+    get_recent_stats_multi,
+    format_stats_for_llm,
+    format_injury_status,
+)
+from modules.fantasy.analysis_llm import analyze_last14, compare_players, evaluate_trade
 from modules.fantasy.last14 import analyze_last14
 from modules.fantasy.value import analyze_value
+from modules.fantasy.stats_cache import get_cached_days, save_days, is_final_date
+from modules.fantasy.player_index import lookup_player, remember_player
+from modules.fantasy.stat_schema import get_stat_schema, parse_ratio, GP_STAT_ID
+from modules.fantasy.player_cache import get_cached_players, get_cached_player, save_players
+from modules.rate_limit import yahoo_rate_limiter
+from modules.http_client import http_get, http_post, get_http_stats
+from modules.nba_cache import get_json as get_nba_json, mark_final, get_nba_cache_stats
+from modules.scheduler import scheduler, Job, SCHEDULER_ENABLED
+from modules.fantasy.injury_feed import (
+    subscribe as subscribe_alerts,
+    unsubscribe as unsubscribe_alerts,
+    is_subscribed as is_alerts_subscribed,
+)
+from modules.fantasy.live import (
+    get_live_tracker,
+    get_live_stats,
+    find_team as find_live_team,
+    format_team_live,
+    format_all_live,
+)
+from modules.fantasy.trade import (
+    parse_trade_argument,
+    get_roster_snapshot,
+    format_trade_result,
+    TradeError,
+)
+from modules.fantasy.matchup import (
+    get_week_projection,
+    find_matchup,
+    format_matchup,
+    format_all_matchups,
+)
+from modules.fantasy.fa import collect_fa_stats, rank_fa, format_fa_ranking, llm_rank_fa
+from modules.fantasy.ranking import parse_category_args
+from modules.tenants import (
+    TenantExecutor,
+    tenant_scope,
+    current_tenant,
+    current_league_key,
+    get_tenant,
+    bind_league,
+    bind_own_token,
+    unbind as unbind_tenant,
+    is_bound as is_tenant_bound,
+    may_choose_league,
+    create_login_state,
+    peek_login_state,
+    consume_login_state,
+    get_tenant_stats,
+    run_for_each_tenant,
+    DEFAULT_TOKEN_SHEET,
+    TENANT_LOGIN_TTL,
+)
+from modules.jobs import job_queue
+from modules.commands import router, required_argument, UsageError, FALLBACK_NAME
+from modules.llm_cache import llm_cache
 
 
 
@@ -49,7 +123,6 @@ if not OPENAI_KEY:
 app = Flask(__name__)
 configuration = Configuration(access_token=CHANNEL_ACCESS_TOKEN)
 handler = WebhookHandler(CHANNEL_SECRET)
-client = OpenAI(api_key=OPENAI_KEY)
 
 
 # ==============================
@@ -60,49 +133,80 @@ YAHOO_CLIENT_SECRET = os.getenv("YAHOO_CLIENT_SECRET")
 
 REDIRECT_URI = "https://line-fantasy-bot.onrender.com/yahoo/callback"
 
+# 預設聯盟（沒有用 !league 綁定的群組都用這個）；實際查詢一律用 current_league_key()
 YAHOO_LEAGUE_KEY = os.getenv("YAHOO_LEAGUE_KEY") 
 
 if not YAHOO_LEAGUE_KEY:
-    print("⚠️ 尚未設定 YAHOO_LEAGUE_KEY，Fantasy 查詢會無法使用")
+    print("⚠️ 尚未設定 YAHOO_LEAGUE_KEY，沒有綁定聯盟的群組無法使用 Fantasy 查詢")
+
+NO_LEAGUE_TEXT = "這個群組還沒設定 Yahoo 聯盟，請用 !league 設定"
+
+# 背景執行模式：慢指令先回「處理中」，完成後用 push message 送結果
+ASYNC_COMMANDS = os.getenv("ASYNC_COMMANDS", "1") == "1"
+SLOW_COMMANDS = {"last14", "value", "vs", "trade", "fa", "nba", "matchup", "bot"}
+
+YAHOO_TOKEN_URL = "https://api.login.yahoo.com/oauth2/get_token"
+
+
+def _yahoo_token_headers():
+    """Token API 用的 Basic Authentication"""
+    auth_str = f"{YAHOO_CLIENT_ID}:{YAHOO_CLIENT_SECRET}"
+    basic_auth = base64.b64encode(auth_str.encode()).decode()
+    return {
+        "Authorization": f"Basic {basic_auth}",
+        "Content-Type": "application/x-www-form-urlencoded",
+    }
+
+
+def yahoo_login_page(state=None):
+    """
+    Yahoo 登入連結（Flask / ASGI 共用）。
+    state：!league login 產生的一次性 OAuth state（連結會帶 ?state=）；沒帶就是登入預設帳號，這裡產生一個
+    """
+    if state:
+        if peek_login_state(state) is None:
+            return "❌ 連結無效或已過期，請在群組重新輸入 !league login"
+    else:
+        state = create_login_state()
 
-# Yahoo Step 1：Login URL
-@app.route("/yahoo/login")
-def yahoo_login():
     auth_url = (
         "https://api.login.yahoo.com/oauth2/request_auth?"
         f"client_id={YAHOO_CLIENT_ID}&"
         f"redirect_uri={urllib.parse.quote(REDIRECT_URI)}&"
         "response_type=code&"
-        "language=en-us"
+        "language=en-us&"
+        f"state={urllib.parse.quote(state)}"
     )
     return f"<a href='{auth_url}'>點此登入 Yahoo Fantasy</a>"
 
 
-# Yahoo Step 2：Callback -> Exchange Token
-@app.route("/yahoo/callback")
-def yahoo_callback():
-    code = request.args.get("code")
+def yahoo_code_exchange(code, state):
+    """
+    /yahoo/callback 的參數檢查（Flask / ASGI 共用）。
+    回傳 ((token_sheet, group_id), 要 POST 給 Token API 的 data, 錯誤訊息)
+    """
     if not code:
-        return "❌ 授權失敗：缺少 code"
-
-    token_url = "https://api.login.yahoo.com/oauth2/get_token"
-
-    # Basic Authentication
-    auth_str = f"{YAHOO_CLIENT_ID}:{YAHOO_CLIENT_SECRET}"
-    basic_auth = base64.b64encode(auth_str.encode()).decode()
+        return None, None, "❌ 授權失敗：缺少 code"
 
-    headers = {
-        "Authorization": f"Basic {basic_auth}",
-        "Content-Type": "application/x-www-form-urlencoded",
-    }
+    # state 只能用一次；群組在登入途中 !league reset 的話 state 也已經作廢
+    login = consume_login_state(state)
+    if login is None:
+        return None, None, "❌ 授權失敗：無效或已過期的 state，請重新登入"
 
     data = {
         "grant_type": "authorization_code",
         "redirect_uri": REDIRECT_URI,
         "code": code,
     }
+    return login, data, None
 
-    response = requests.post(token_url, headers=headers, data=data)
+
+def yahoo_save_login(response, login):
+    """
+    Token API 的回應 → 存 token，回傳要顯示的訊息。
+    login = (token_sheet, group_id)：群組的登入要等 token 存好才切到群組自己的分頁
+    """
+    token_sheet, group_id = login
     try:
         result = response.json()
     except:
@@ -114,39 +218,124 @@ def yahoo_callback():
     save_yahoo_token(
         result["access_token"],
         result["refresh_token"],
-        result["expires_in"]
+        result["expires_in"],
+        token_sheet=token_sheet,
     )
+    if group_id:
+        bind_own_token(group_id)
 
     return "Yahoo Token 已成功儲存！你可以關閉這個視窗。"
 
 
+# Yahoo Step 1：Login URL
+@app.route("/yahoo/login")
+def yahoo_login():
+    return yahoo_login_page(request.args.get("state"))
+
+
+# Yahoo Step 2：Callback -> Exchange Token
+@app.route("/yahoo/callback")
+def yahoo_callback():
+    login, data, error = yahoo_code_exchange(
+        request.args.get("code"), request.args.get("state")
+    )
+    if error:
+        return error
+
+    response = http_post(YAHOO_TOKEN_URL, headers=_yahoo_token_headers(), data=data)
+    return yahoo_save_login(response, login)
+
+
 # ==============================
 # Token Storage
 # ==============================
-def save_yahoo_token(access_token, refresh_token, expires_in):
-    try:
-        expires_at = (datetime.datetime.utcnow() +
-                      datetime.timedelta(seconds=expires_in)).isoformat()
+# 記憶體中的 Yahoo token：{token 分頁: (access_token, refresh_token, expires_at datetime)}
+# 每個 tenant 的 token 存在自己的 Sheet 分頁（預設 yahoo_token），互不影響
+# Google Sheet 只當持久備份，啟動 / 快過期時才讀，refresh 後才寫
+_YAHOO_TOKENS = {}
+_YAHOO_TOKEN_LOCKS = {}
+_YAHOO_TOKEN_LOCKS_LOCK = threading.Lock()
+
+# 到期前多久就視為過期（秒）
+TOKEN_EXPIRY_MARGIN = 60
+
+# 讀取 / refresh 失敗後，這個 token 分頁多久內不再重試（秒）
+# Yahoo 掛掉時不會每個請求都去讀 Google Sheet、打 Token API
+TOKEN_REFRESH_BACKOFF = float(os.getenv("TOKEN_REFRESH_BACKOFF", "30"))
+
+# {token 分頁: 可以再試的時間（time.monotonic）}
+_YAHOO_TOKEN_RETRY_AT = {}
+
+
+def _token_sheet(token_sheet=None):
+    return token_sheet or current_tenant().token_sheet
+
 
-        ws = get_gsheet().worksheet("yahoo_token")
+def _token_lock(token_sheet):
+    with _YAHOO_TOKEN_LOCKS_LOCK:
+        return _YAHOO_TOKEN_LOCKS.setdefault(token_sheet, threading.Lock())
 
-        # MUST use 2D array format
-        ws.update("B2", [[access_token]])
-        ws.update("B3", [[refresh_token]])
-        ws.update("B4", [[expires_at]])
 
-        print("✅ Token 寫入成功")
+def _set_cached_token(token_sheet, access_token, refresh_token, expires_at):
+    expires_at_dt = None
+    if expires_at:
+        try:
+            expires_at_dt = datetime.datetime.fromisoformat(expires_at)
+        except ValueError:
+            print("⚠️ Token 到期時間格式錯誤：", expires_at)
+
+    # 整個 tuple 一次替換，其他 thread 不會讀到一半的資料
+    _YAHOO_TOKENS[token_sheet] = (access_token, refresh_token, expires_at_dt)
+
+
+def _token_failed(token_sheet):
+    _YAHOO_TOKEN_RETRY_AT[token_sheet] = time.monotonic() + TOKEN_REFRESH_BACKOFF
+
+
+def _token_backoff(token_sheet) -> bool:
+    return time.monotonic() < _YAHOO_TOKEN_RETRY_AT.get(token_sheet, 0)
+
+
+def _cached_token_if_fresh(token_sheet):
+    access_token, _, expires_at_dt = _YAHOO_TOKENS.get(token_sheet, (None, None, None))
+    if not access_token or not expires_at_dt:
+        return None
+
+    margin = datetime.timedelta(seconds=TOKEN_EXPIRY_MARGIN)
+    if datetime.datetime.utcnow() > expires_at_dt - margin:
+        return None
+
+    return access_token
+
+
+def save_yahoo_token(access_token, refresh_token, expires_in, token_sheet=None):
+    token_sheet = _token_sheet(token_sheet)
+    expires_at = (datetime.datetime.utcnow() +
+                  datetime.timedelta(seconds=expires_in)).isoformat()
+
+    # 先更新記憶體，Sheet 寫入失敗也不影響本 process 使用
+    _set_cached_token(token_sheet, access_token, refresh_token, expires_at)
+    _YAHOO_TOKEN_RETRY_AT.pop(token_sheet, None)
+
+    try:
+        ws = get_worksheet(token_sheet, create=True)
+
+        # MUST use 2D array format；B2:B4 一次寫入
+        ws.update("B2:B4", [[access_token], [refresh_token], [expires_at]])
+
+        print("✅ Token 寫入成功：", token_sheet)
 
     except Exception as e:
         print("❌ Token 寫入失敗：", e)
 
 
-def load_yahoo_token():
+def load_yahoo_token(token_sheet=None):
     try:
-        ws = get_gsheet().worksheet("yahoo_token")
-        access_token = ws.acell("B2").value
-        refresh_token = ws.acell("B3").value
-        expires_at = ws.acell("B4").value
+        ws = get_worksheet(_token_sheet(token_sheet))
+        # B2:B4 一次讀回來（空白儲存格會被省略）
+        rows = ws.get("B2:B4")
+        values = [row[0] if row else None for row in rows] + [None, None, None]
+        access_token, refresh_token, expires_at = values[:3]
         return access_token, refresh_token, expires_at
     except Exception as e:
         print("❌ Token 讀取失敗：", e)
@@ -156,47 +345,67 @@ def load_yahoo_token():
 # ==============================
 # Auto Refresh Yahoo Token
 # ==============================
-def refresh_yahoo_token_if_needed():
-    access_token, refresh_token, expires_at = load_yahoo_token()
-
-    if not access_token or not refresh_token or not expires_at:
-        return access_token  # token 不存在，返回 None
-
-    expires_at_dt = datetime.datetime.fromisoformat(expires_at)
-    now = datetime.datetime.utcnow()
+def refresh_yahoo_token_if_needed(token_sheet=None):
+    """
+    取得目前 tenant（或指定 token 分頁）可用的 access_token。
+    - 記憶體中的 token 還沒過期：直接回傳，不碰 Google Sheet
+    - 快過期：拿鎖，先看 Sheet 是否已被其他 worker 更新，沒有才向 Yahoo refresh
+      同時間只有一個 thread 會 refresh，其他 thread 等它完成後直接用新 token
+    - 失敗（Sheet 沒有 token、Yahoo 錯誤）後 TOKEN_REFRESH_BACKOFF 秒內直接回傳記憶體中的舊 token（或 None）
+    """
+    token_sheet = _token_sheet(token_sheet)
+    token = _cached_token_if_fresh(token_sheet)
+    if token:
+        return token
+    if _token_backoff(token_sheet):
+        return _YAHOO_TOKENS.get(token_sheet, (None, None, None))[0]
+
+    with _token_lock(token_sheet):
+        # 等鎖期間可能已經有別的 thread refresh 好了（或失敗了）
+        token = _cached_token_if_fresh(token_sheet)
+        if token:
+            return token
+        if _token_backoff(token_sheet):
+            return _YAHOO_TOKENS.get(token_sheet, (None, None, None))[0]
+
+        # 其他 gunicorn worker 可能已經 refresh 並寫回 Sheet
+        _set_cached_token(token_sheet, *load_yahoo_token(token_sheet))
+        token = _cached_token_if_fresh(token_sheet)
+        if token:
+            return token
+
+        access_token, refresh_token, expires_at_dt = _YAHOO_TOKENS[token_sheet]
+        if not access_token or not refresh_token or not expires_at_dt:
+            _token_failed(token_sheet)
+            return access_token  # token 不存在，返回 None
 
-    # 若 token 已過期 60 秒前，就 refresh
-    if now > expires_at_dt - datetime.timedelta(seconds=60):
         print("🔄 Token 已過期，開始 refresh...")
 
-        token_url = "https://api.login.yahoo.com/oauth2/get_token"
-
-        auth_str = f"{YAHOO_CLIENT_ID}:{YAHOO_CLIENT_SECRET}"
-        basic_auth = base64.b64encode(auth_str.encode()).decode()
-
-        headers = {
-            "Authorization": f"Basic {basic_auth}",
-            "Content-Type": "application/x-www-form-urlencoded",
-        }
-
         data = {
             "grant_type": "refresh_token",
             "refresh_token": refresh_token,
             "redirect_uri": REDIRECT_URI,
         }
 
-        res = requests.post(token_url, headers=headers, data=data)
-        result = res.json()
+        try:
+            res = http_post(YAHOO_TOKEN_URL, headers=_yahoo_token_headers(), data=data)
+            result = res.json()
+        except Exception as e:
+            print("❌ Refresh Token 失敗：", e)
+            _token_failed(token_sheet)
+            return access_token
 
         if "access_token" in result:
             save_yahoo_token(
                 result["access_token"],
                 result.get("refresh_token", refresh_token),
-                result["expires_in"]
+                result["expires_in"],
+                token_sheet=token_sheet,
             )
             return result["access_token"]
 
         print("❌ Refresh Token 失敗：", result)
+        _token_failed(token_sheet)
 
     return access_token
 
@@ -220,7 +429,10 @@ def yahoo_api_get(path: str):
         "Accept": "application/json",
     }
 
-    res = requests.get(url, headers=headers)
+    # 全域限流，避免並行抓取時打爆 Yahoo rate limit
+    yahoo_rate_limiter.acquire()
+
+    res = http_get(url, headers=headers)
     if res.status_code != 200:
         print("❌ Yahoo API 呼叫失敗：", res.status_code, res.text[:200])
         return None
@@ -232,12 +444,29 @@ def yahoo_api_get(path: str):
         return None
 
 def yahoo_search_player_by_name(name: str):
-    if not YAHOO_LEAGUE_KEY:
-        print("⚠️ 尚未設定 YAHOO_LEAGUE_KEY")
+    """
+    用名字找球員：先查本機球員索引（全名 / 綽號 / 模糊比對），
+    找不到才呼叫 Yahoo players;search=，並把結果記進索引。
+    """
+    league_key = current_league_key()
+    if not league_key:
+        print("⚠️ 尚未設定聯盟")
         return None
 
+    player = lookup_player(league_key, name)
+    if player:
+        return player
+
+    player = _yahoo_search_player(name)
+    if player:
+        remember_player(league_key, name, player)
+    return player
+
+
+def _yahoo_search_player(name: str):
+    """Yahoo players;search= 即時搜尋，取第一筆"""
     encoded_name = urllib.parse.quote(name)
-    path = f"league/{YAHOO_LEAGUE_KEY}/players;search={encoded_name};count=5"
+    path = f"league/{current_league_key()}/players;search={encoded_name};count=5"
 
     data = yahoo_api_get(path)
     if not data:
@@ -291,6 +520,10 @@ def yahoo_get_player_season_avg(player_key: str):
     """
     抓 Yahoo Fantasy 本季「場均」數據
     """
+    cached = get_cached_player("season", player_key)
+    if cached is not None:
+        return cached
+
     path = f"player/{player_key}/stats;type=season"
     data = yahoo_api_get(path)
     if not data:
@@ -318,108 +551,539 @@ def yahoo_get_player_season_avg(player_key: str):
             if stat_id is not None:
                 stat_map[stat_id] = value
 
+        save_players("season", {player_key: stat_map})
         return stat_map
 
     except Exception as e:
         print("❌ 解析 season avg 失敗：", e)
         return None
 
-def yahoo_get_player_stats_by_date_range(player_key: str, days: int = 7):
-    """
-    抓某球員「最近 N 天」的累積 stats，並盡可能降低記憶體使用。
-    """
-    all_stats = {}
-    today = datetime.date.today()
+# Yahoo players;player_keys= 一次最多 25 位球員
+YAHOO_PLAYER_KEYS_PER_CALL = 25
 
-    for d in range(days):
-        date = today - datetime.timedelta(days=d)
-        date_str = date.strftime("%Y-%m-%d")
+# 同時對 Yahoo 發出的請求數上限（日期無法合併成一次，只能並行）
+YAHOO_MAX_WORKERS = int(os.getenv("YAHOO_MAX_WORKERS", "8"))
 
-        # 呼叫 API（每次回傳非常大，所以不要保留 data）
-        data = yahoo_api_get(f"player/{player_key}/stats;type=date;date={date_str}")
-        if not data:
+
+def _chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _add_daily_stats(total: dict, stats_list):
+    """把單日的 stats list 累加進 total（stat_id -> 數值；命中 / 出手保留 "5/11" 字串）"""
+    for s in stats_list:
+        stat = s.get("stat", {})
+        stat_id = stat.get("stat_id")
+        value = stat.get("value")
+
+        if stat_id is None or value in [None, "", "-"]:
             continue
 
         try:
-            player_arr = data["fantasy_content"]["player"]
+            v = float(value)
+        except:
+            # 區間合併時分子分母分開加總，才能算出正確的命中率
+            if parse_ratio(value):
+                total[stat_id] = value
+            continue
+
+        total[stat_id] = total.get(stat_id, 0) + v
+
+
+def yahoo_get_players_daily_stats(player_keys, date_str: str):
+    """
+    一次抓多位球員「某一天」的 stats。
+    Yahoo API: players;player_keys=a,b,c/stats;type=date;date=YYYY-MM-DD
+    回傳 {player_key: stats_list}，抓不到的球員不會出現在結果裡。
+    """
+    keys = ",".join(player_keys)
+    data = yahoo_api_get(f"players;player_keys={keys}/stats;type=date;date={date_str}")
+    if not data:
+        return {}
+
+    result = {}
+    try:
+        players_obj = data["fantasy_content"]["players"]
+
+        for i in range(int(players_obj["count"])):
+            player_arr = players_obj[str(i)]["player"]
+
+            player_key = None
+            for block in player_arr[0]:
+                if isinstance(block, dict) and "player_key" in block:
+                    player_key = block["player_key"]
+                    break
 
-            stats_block = None
             for part in player_arr:
                 if isinstance(part, dict) and "player_stats" in part:
-                    stats_block = part["player_stats"]
+                    result[player_key] = part["player_stats"]["stats"]
                     break
 
-            if not stats_block:
-                continue
+    except Exception as e:
+        print("❌ 解析多球員單日 stats 失敗：", date_str, e)
 
-            stats_list = stats_block["stats"]
+    finally:
+        # 🚀 強制釋放 API 回傳資料，避免佔用記憶體
+        del data
 
-            for s in stats_list:
-                stat = s.get("stat", {})
-                stat_id = stat.get("stat_id")
-                value = stat.get("value")
+    return result
 
-                if stat_id is None or value in [None, "", "-"]:
-                    continue
 
+def yahoo_get_players_stats_by_date_range(player_keys, days: int = 7):
+    """
+    抓多位球員「最近 N 天」的累積 stats。
+    - 已結束的日期先查本機快取（stats_cache），只向 Yahoo 補抓缺的日期
+    - 同一天的球員合併成一次 players;player_keys= 請求（每次最多 25 位）
+    - 不同天無法合併，改用 thread pool 並行送出
+    回傳 {player_key: {stat_id: 值}}：計數項目為總和、GP_STAT_ID 為出賽場數、
+    百分比項目由命中 / 出手重算（和 Yahoo 本季 / lastweek stats 同格式，見 StatSchema.combine_days）
+    """
+    player_keys = list(dict.fromkeys(player_keys))
+    all_stats = {k: {} for k in player_keys}
+    if not player_keys or days <= 0:
+        return all_stats
+
+    today = datetime.date.today()
+    dates = [
+        (today - datetime.timedelta(days=d)).strftime("%Y-%m-%d")
+        for d in range(days)
+    ]
+
+    # 每日 stats：{(player_key, date): {stat_id: value}}
+    daily_stats = get_cached_days(player_keys, dates)
+
+    tasks = []
+    for date_str in dates:
+        missing = [k for k in player_keys if (k, date_str) not in daily_stats]
+        for chunk in _chunked(missing, YAHOO_PLAYER_KEYS_PER_CALL):
+            tasks.append((chunk, date_str))
+
+    if tasks:
+        to_save = []
+
+        workers = max(1, min(YAHOO_MAX_WORKERS, len(tasks)))
+        with TenantExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(yahoo_get_players_daily_stats, chunk, date_str): date_str
+                for chunk, date_str in tasks
+            }
+
+            for future in as_completed(futures):
+                date_str = futures[future]
                 try:
-                    v = float(value)
-                except:
+                    daily = future.result()
+                except Exception as e:
+                    print("❌ 抓取單日 stats 失敗：", e)
                     continue
 
-                all_stats[stat_id] = all_stats.get(stat_id, 0) + v
+                for player_key, stats_list in daily.items():
+                    day_total = {}
+                    _add_daily_stats(day_total, stats_list)
+                    daily_stats[(player_key, date_str)] = day_total
 
-        except:
-            continue
+                    # 只有打完的日期才寫進快取，今天的數據之後還會變
+                    if is_final_date(date_str):
+                        to_save.append((player_key, date_str, day_total))
 
-        finally:
-            # 🚀 強制釋放 API 回傳資料，避免佔用記憶體
-            del data
+        save_days(to_save)
+
+    # 用每日數據合成區間 stats
+    days_by_player = {k: [] for k in player_keys}
+    for (player_key, _), day_total in daily_stats.items():
+        if player_key in days_by_player:
+            days_by_player[player_key].append(day_total)
+
+    schema = get_stat_schema()
+    for player_key, days in days_by_player.items():
+        all_stats[player_key] = schema.combine_days(days)
 
     return all_stats
 
 
-def yahoo_get_fa_list(league_key, count=15):
+def yahoo_get_player_stats_by_date_range(player_key: str, days: int = 7):
     """
-    抓取自由球員清單（按 Yahoo 排序）
+    抓某球員「最近 N 天」的累積 stats。
+    各日期的請求會並行送出，格式同 yahoo_get_players_stats_by_date_range。
+    """
+    return yahoo_get_players_stats_by_date_range([player_key], days).get(player_key, {})
+
+
+def _parse_player_info(info_list):
+    """
+    解析 Yahoo player[0] 的 metadata 區塊，回傳
+    {player_key, name, team, positions, status}
     """
-    path = f"league/{league_key}/players;status=FA;count={count}"
+    info = {
+        "player_key": None,
+        "name": None,
+        "team": "",
+        "positions": [],
+        "status": "",
+    }
+
+    for block in info_list:
+        if not isinstance(block, dict):
+            continue
+        if "player_key" in block:
+            info["player_key"] = block["player_key"]
+        if "name" in block:
+            info["name"] = block["name"]["full"]
+        if "editorial_team_abbr" in block:
+            info["team"] = block["editorial_team_abbr"]
+        if "eligible_positions" in block:
+            info["positions"] = [
+                pos["position"] for pos in block["eligible_positions"]
+                if isinstance(pos, dict) and "position" in pos
+            ]
+        if "status" in block:
+            info["status"] = block["status"]
+
+    return info
+
+
+def _parse_player_stats(player_arr):
+    """從 player 陣列取出 stats，回傳 {stat_id: value}（沒有 stats 回傳 None）"""
+    for part in player_arr:
+        if isinstance(part, dict) and "player_stats" in part:
+            stat_map = {}
+            for s in part["player_stats"]["stats"]:
+                stat = s.get("stat", {})
+                if stat.get("stat_id") is not None:
+                    stat_map[stat["stat_id"]] = stat.get("value")
+            return stat_map
+    return None
+
+
+def _fetch_league_players_page(league_key, filters: str, stats_type=None):
+    """
+    抓一頁聯盟球員（filters 例如 'status=FA;count=20' 或 'start=25;count=25'），
+    可附帶 stats 子資源，回傳 [(info, stats), ...]
+    """
+    path = f"league/{league_key}/players;{filters}"
+    if stats_type:
+        path += f"/stats;type={stats_type}"
+
     data = yahoo_api_get(path)
     if not data:
         return []
 
     try:
         players_obj = data["fantasy_content"]["league"][1]["players"]
+
+        # 超過最後一頁時 Yahoo 回傳空 list
+        if not isinstance(players_obj, dict):
+            return []
+
         result = []
 
         for i in range(int(players_obj["count"])):
             p = players_obj[str(i)]["player"]
 
-            info_list = p[0]
+            info = _parse_player_info(p[0])
+            if not info["name"]:
+                continue
+
+            result.append((info, _parse_player_stats(p)))
+
+        return result
+
+    except Exception as e:
+        print("❌ 解析聯盟球員清單失敗：", filters, e)
+        return []
+
+
+def _fetch_fa_page(league_key, count, stats_type=None):
+    """抓一頁 FA 清單（可附帶 stats 子資源），回傳 [(info, stats), ...]"""
+    return _fetch_league_players_page(league_key, f"status=FA;count={count}", stats_type)
+
+
+def yahoo_get_league_players(league_key, stats_type=None, max_players=2000):
+    """
+    分頁抓聯盟內「所有」球員（每頁 25 位），回傳 [(info, stats), ...]
+    stats_type 例如 'season' 時每位球員會附帶 stats。
+    """
+    result = []
+    start = 0
+
+    while start < max_players:
+        page = _fetch_league_players_page(
+            league_key,
+            f"start={start};count={YAHOO_PLAYER_KEYS_PER_CALL}",
+            stats_type,
+        )
+        result.extend(page)
+
+        if len(page) < YAHOO_PLAYER_KEYS_PER_CALL:
+            break
+        start += YAHOO_PLAYER_KEYS_PER_CALL
+
+    return result
+
+
+def yahoo_get_top_players(league_key, count, stats_type="season"):
+    """
+    抓聯盟排名前 count 位球員（Yahoo 實際排名 sort=AR，含 stats），回傳 [(info, stats), ...]
+    已知總數，所以各頁可以並行送出。
+    """
+    starts = list(range(0, count, YAHOO_PLAYER_KEYS_PER_CALL))
+    sort = "sort=AR" if stats_type == "season" else f"sort=AR;sort_type={stats_type}"
+
+    def fetch(start):
+        size = min(YAHOO_PLAYER_KEYS_PER_CALL, count - start)
+        return _fetch_league_players_page(
+            league_key, f"{sort};start={start};count={size}", stats_type
+        )
+
+    workers = max(1, min(YAHOO_MAX_WORKERS, len(starts)))
+    with TenantExecutor(max_workers=workers) as pool:
+        pages = list(pool.map(fetch, starts))
+
+    return [row for page in pages for row in page]
+
+
+def yahoo_get_players_stats(league_key, player_keys, stats_type="season"):
+    """
+    抓多位球員在聯盟內的 stats（每 25 位一次請求，並行送出）
+    回傳 {player_key: {stat_id: value}}
+    """
+    player_keys = list(dict.fromkeys(player_keys))
+    chunks = list(_chunked(player_keys, YAHOO_PLAYER_KEYS_PER_CALL))
+    if not chunks:
+        return {}
+
+    def fetch(chunk):
+        return _fetch_league_players_page(
+            league_key, f"player_keys={','.join(chunk)}", stats_type
+        )
+
+    workers = max(1, min(YAHOO_MAX_WORKERS, len(chunks)))
+    with TenantExecutor(max_workers=workers) as pool:
+        pages = list(pool.map(fetch, chunks))
+
+    return {info["player_key"]: stats or {} for page in pages for info, stats in page}
+
+
+def _fetch_players(player_keys, sub=""):
+    """
+    抓 players;player_keys=...{sub} 集合（每 25 位一次請求，並行送出）
+    回傳每位球員的 player 陣列 list
+    """
+    chunks = list(_chunked(list(player_keys), YAHOO_PLAYER_KEYS_PER_CALL))
+    if not chunks:
+        return []
+
+    def fetch(chunk):
+        data = yahoo_api_get(f"players;player_keys={','.join(chunk)}{sub}")
+        if not data:
+            return []
+        try:
+            players_obj = data["fantasy_content"]["players"]
+            if not isinstance(players_obj, dict):
+                return []
+            return [players_obj[str(i)]["player"] for i in range(int(players_obj["count"]))]
+        except Exception as e:
+            print("❌ 解析球員集合失敗：", e)
+            return []
+
+    workers = max(1, min(YAHOO_MAX_WORKERS, len(chunks)))
+    with TenantExecutor(max_workers=workers) as pool:
+        pages = list(pool.map(fetch, chunks))
+
+    return [player_arr for page in pages for player_arr in page]
+
+
+def _parse_player_detail(info_list):
+    """從 player[0] 的 metadata 取出 {status, injury, notes_ts}（notes_ts：最新 note 的時間）"""
+    status = None
+    injury_note = None
+    notes_ts = None
+    for block in info_list:
+        if not isinstance(block, dict):
+            continue
+        if "status" in block:
+            status = block["status"]
+        if "injury_note" in block:
+            injury_note = block["injury_note"]
+        if "player_notes_last_timestamp" in block:
+            notes_ts = str(block["player_notes_last_timestamp"])
+    return {"status": status, "injury": injury_note, "notes_ts": notes_ts}
+
+
+def yahoo_get_players_season_stats(player_keys, refresh=False):
+    """
+    多位球員本季 stats（格式同 yahoo_get_player_season_avg），回傳 {player_key: {stat_id: value}}
+    先查本機 player_cache，缺的才一次抓；refresh=True 時全部重抓
+    """
+    player_keys = list(dict.fromkeys(player_keys))
+    result = {} if refresh else get_cached_players("season", player_keys)
+    missing = [k for k in player_keys if k not in result]
+
+    fetched = {}
+    for player_arr in _fetch_players(missing, "/stats;type=season"):
+        key = _parse_player_info(player_arr[0])["player_key"]
+        stats = _parse_player_stats(player_arr)
+        if key and stats is not None:
+            fetched[key] = stats
+
+    save_players("season", fetched)
+    result.update(fetched)
+    return result
+
 
-            name = None
-            team = ""
+def yahoo_get_players_detail(player_keys, refresh=False):
+    """
+    多位球員傷病狀態（格式同 yahoo_get_player_detail），回傳 {player_key: {status, injury, notes_ts}}
+    先查本機 player_cache，缺的才一次抓；refresh=True 時全部重抓
+    """
+    player_keys = list(dict.fromkeys(player_keys))
+    result = {} if refresh else get_cached_players("detail", player_keys)
+    missing = [k for k in player_keys if k not in result]
+
+    fetched = {}
+    for player_arr in _fetch_players(missing):
+        key = _parse_player_info(player_arr[0])["player_key"]
+        if key:
+            fetched[key] = _parse_player_detail(player_arr[0])
+
+    save_players("detail", fetched)
+    result.update(fetched)
+    return result
+
+
+def yahoo_get_league_rosters(league_key):
+    """
+    一次抓聯盟所有隊伍的名單
+    Yahoo API: league/{league_key}/teams/roster
+    回傳 {team_key: {"team_key", "name", "is_mine", "players": [info, ...]}}
+    """
+    data = yahoo_api_get(f"league/{league_key}/teams/roster")
+    if not data:
+        return {}
+
+    try:
+        teams_obj = data["fantasy_content"]["league"][1]["teams"]
+        result = {}
+
+        for i in range(int(teams_obj["count"])):
+            team_arr = teams_obj[str(i)]["team"]
 
-            for block in info_list:
+            team = {"team_key": None, "name": "", "is_mine": False, "players": []}
+            for block in team_arr[0]:
                 if not isinstance(block, dict):
                     continue
+                if "team_key" in block:
+                    team["team_key"] = block["team_key"]
                 if "name" in block:
-                    name = block["name"]["full"]
-                if "editorial_team_abbr" in block:
-                    team = block["editorial_team_abbr"]
+                    team["name"] = block["name"]
+                if block.get("is_owned_by_current_login"):
+                    team["is_mine"] = True
 
-            if not name:
-                continue
+            roster = team_arr[1]["roster"]["0"]["players"]
+            if isinstance(roster, dict):
+                for j in range(int(roster["count"])):
+                    info = _parse_player_info(roster[str(j)]["player"][0])
+                    if info["player_key"]:
+                        team["players"].append(info)
 
-            result.append({
-                "name": name,
-                "team": team
-            })
+            result[team["team_key"]] = team
 
         return result
 
-    except Exception:
-        return []
+    except Exception as e:
+        print("❌ 解析聯盟名單失敗：", e)
+        return {}
+
+
+def yahoo_get_scoreboard(league_key, week=None):
+    """
+    聯盟本週（或指定週）的對戰與目前各隊累積 stats
+    Yahoo API: league/{league_key}/scoreboard;week=N
+    回傳 {"week", "week_start", "week_end", "matchups": [[teamA, teamB], ...]}，
+    每隊 = {"team_key", "name", "stats": {stat_id: value}}
+    """
+    path = f"league/{league_key}/scoreboard"
+    if week:
+        path += f";week={week}"
+
+    data = yahoo_api_get(path)
+    if not data:
+        return None
+
+    try:
+        scoreboard = data["fantasy_content"]["league"][1]["scoreboard"]
+        matchups_obj = scoreboard["0"]["matchups"]
+
+        result = {
+            "week": scoreboard.get("week"),
+            "week_start": None,
+            "week_end": None,
+            "matchups": [],
+        }
+
+        for i in range(int(matchups_obj["count"])):
+            matchup = matchups_obj[str(i)]["matchup"]
+            result["week_start"] = matchup.get("week_start")
+            result["week_end"] = matchup.get("week_end")
+
+            teams_obj = matchup["0"]["teams"]
+            teams = []
+            for j in range(int(teams_obj["count"])):
+                team_arr = teams_obj[str(j)]["team"]
+
+                team = {"team_key": None, "name": "", "stats": {}}
+                for block in team_arr[0]:
+                    if not isinstance(block, dict):
+                        continue
+                    if "team_key" in block:
+                        team["team_key"] = block["team_key"]
+                    if "name" in block:
+                        team["name"] = block["name"]
+
+                for part in team_arr[1:]:
+                    if isinstance(part, dict) and "team_stats" in part:
+                        for s in part["team_stats"]["stats"]:
+                            stat = s.get("stat", {})
+                            if stat.get("stat_id") is not None:
+                                team["stats"][str(stat["stat_id"])] = stat.get("value")
+
+                teams.append(team)
+
+            if len(teams) == 2:
+                result["matchups"].append(teams)
+
+        return result
+
+    except Exception as e:
+        print("❌ 解析 scoreboard 失敗：", e)
+        return None
+
+
+def yahoo_get_fa_list(league_key, count=15, with_stats=False):
+    """
+    抓取自由球員清單（按 Yahoo 排序）
+    每位球員回傳 {player_key, name, team, positions, status}
+
+    with_stats=True 時額外帶上：
+    - season：本季 stats（stats;type=season）
+    - lastweek：最近一週 stats（stats;type=lastweek）
+    整份 FA 名單只需兩次請求。
+    """
+    if not with_stats:
+        return [info for info, _ in _fetch_fa_page(league_key, count)]
+
+    season_page = _fetch_fa_page(league_key, count, stats_type="season")
+    lastweek_page = _fetch_fa_page(league_key, count, stats_type="lastweek")
+
+    lastweek_by_key = {info["player_key"]: stats for info, stats in lastweek_page}
+
+    result = []
+    for info, season in season_page:
+        info["season"] = season
+        info["lastweek"] = lastweek_by_key.get(info["player_key"])
+        result.append(info)
+
+    return result
 
 
 
@@ -469,55 +1133,20 @@ def yahoo_get_player_update(player_key: str):
 # 動態讀取聯盟 stat 設定 & 格式化球員數據
 # ==============================
 
-STAT_LABEL_MAP = None  # display_name -> stat_id 的對照表（例如 "PTS" -> "25"）
-
-# 想要顯示的欄位（左邊是我們想顯示的 label，用來排順序）
-DESIRED_LABELS = [
-    "PTS",   # 得分
-    "REB",   # 籃板
-    "AST",   # 助攻
-    "STL",   # 抄截
-    "BLK",   # 火鍋
-    "FG%",   # 命中率
-    "FT%",   # 罰球命中率
-    "3PTM",  # 場均三分命中數
-    "3PT%",  # 三分命中率
-    "TO",    # 失誤
-]
-
-# 各項目可能在 Yahoo 裡的名稱（有些聯盟會用 ST / STL 或 3PTM / 3PM 等）
-LABEL_CANDIDATES = {
-    "PTS":  ["PTS"],
-    "REB":  ["REB"],
-    "AST":  ["AST"],
-    "STL":  ["ST", "STL"],
-    "BLK":  ["BLK"],
-    "FG%":  ["FG%", "FG PCT"],
-    "FT%":  ["FT%", "FT PCT"],
-    "3PTM": ["3PTM", "3PM", "3-PTM"],
-    "3PT%": ["3PT%", "3P%", "3-PT%"],
-    "TO":   ["TO", "TOV", "TURNOVERS"],
-}
-
-def load_stat_label_map():
+def yahoo_get_league_stat_categories(league_key: str = None):
     """
-    呼叫 league/{league_key}/settings，建立 display_name -> stat_id 的 mapping。
-    只會在第一次用到時打 API，之後都用快取。
+    呼叫 league/{league_key}/settings，回傳 display_name -> stat_id 的 mapping
+    （例如 {"PTS": "12", ...}）。失敗回傳 None。
+    快取與重新整理由 modules/fantasy/stat_schema.py 負責。
     """
-    global STAT_LABEL_MAP
-
-    if STAT_LABEL_MAP is not None:
-        return STAT_LABEL_MAP
-
-    if not YAHOO_LEAGUE_KEY:
-        print("⚠️ 尚未設定 YAHOO_LEAGUE_KEY，無法載入 stat 設定")
-        STAT_LABEL_MAP = {}
-        return STAT_LABEL_MAP
+    league_key = league_key or current_league_key()
+    if not league_key:
+        print("⚠️ 尚未設定聯盟，無法載入 stat 設定")
+        return None
 
-    data = yahoo_api_get(f"league/{YAHOO_LEAGUE_KEY}/settings")
+    data = yahoo_api_get(f"league/{league_key}/settings")
     if not data:
-        STAT_LABEL_MAP = {}
-        return STAT_LABEL_MAP
+        return None
 
     try:
         league = data["fantasy_content"]["league"]
@@ -530,8 +1159,7 @@ def load_stat_label_map():
 
         if not settings_block:
             print("⚠️ 找不到 settings 區塊")
-            STAT_LABEL_MAP = {}
-            return STAT_LABEL_MAP
+            return None
 
         stats = settings_block["stat_categories"]["stats"]
         label_map = {}
@@ -550,151 +1178,42 @@ def load_stat_label_map():
             stat_id = stat["stat_id"]
             label = stat.get("display_name") or stat.get("name")
             if label:
-                label_map[label] = stat_id
+                label_map[label] = str(stat_id)
 
-        STAT_LABEL_MAP = label_map
-        print("✅ 已載入 league stat 設定：", STAT_LABEL_MAP)
-        return STAT_LABEL_MAP
+        return label_map
 
     except Exception as e:
         print("❌ 解析 league settings 失敗：", e)
-        STAT_LABEL_MAP = {}
-        return STAT_LABEL_MAP
+        return None
 
 
-def _find_stat_id_for_label(label: str, label_map: dict):
-    """從 STAT_LABEL_MAP 裡，用 candidates 找到對應的 stat_id"""
-    candidates = LABEL_CANDIDATES.get(label, [label])
-    for cand in candidates:
-        if cand in label_map:
-            return label_map[cand]
-    return None
+def _games_played(stats: dict):
+    """stats["0"] 通常就是出賽場數"""
+    try:
+        return float(stats[GP_STAT_ID])
+    except (KeyError, TypeError, ValueError):
+        return None
 
 
-def format_player_stats(stats: dict):
+def format_player_stats(stats: dict, games=None):
     """
     將 Yahoo 回傳的 season stats 轉成場均格式：
     PTS / REB / AST / STL / BLK / FG% / FT% / 3PTM / 3PT% / TO
+    games 沒給就用 stats 裡的出賽場數
     """
+    if games is None:
+        games = _games_played(stats)
 
-    label_map = load_stat_label_map()
-
-    # ------------------------
-    # 先處理場次（GP）
-    # ------------------------
-    gp = None
-
-    # stats["0"] 通常就是出賽場數
-    if "0" in stats:
-        try:
-            gp = float(stats["0"])
-        except:
-            gp = None
-
-    print("🔎 Games played (from stats['0']):", gp)
-
-    lines = []
-
-    for label in DESIRED_LABELS:
-        stat_id = _find_stat_id_for_label(label, label_map)
-        if not stat_id:
-            continue
-
-        raw_val = stats.get(str(stat_id))
-        if raw_val is None or raw_val == "":
-            continue
-
-        try:
-            v = float(raw_val.replace("%", "")) if isinstance(raw_val, str) else float(raw_val)
-        except:
-            lines.append(f"{label}: {raw_val}")
-            continue
-
-        # 場均數據
-        if label in ["PTS", "REB", "AST", "STL", "BLK", "3PTM", "TO"]:
-            if gp and gp > 0:
-                per_game = v / gp
-                lines.append(f"{label}: {per_game:.1f}")
-            else:
-                lines.append(f"{label}: {v}")
-
-        # 百分比
-        elif label in ["FG%", "FT%", "3PT%"]:
-            if v > 1:
-                v = v / 100
-            lines.append(f"{label}: {v:.3f}")
+    lines = get_stat_schema().format_lines(stats, games)
 
     if not lines:
         return "尚無可讀數據"
 
     return "\n".join(lines)
 
-def format_player_recent_avg(stats: dict, days: int):
-    """
-    把最近 N 天累積 stats → 換算成「場均」
-    """
-    if not stats:
-        return "最近沒有比賽數據"
-
-    # 先用季 stats 的 formatter（它會處理 FG%、FT% 等百分比）
-    # 但需要告知 formatter：這不是累積而是要除以天數
-    per_game_stats = {}
-
-    for stat_id, total in stats.items():
-        try:
-            per_game_stats[stat_id] = float(total) / days
-        except:
-            per_game_stats[stat_id] = total
-
-    return format_player_stats(per_game_stats)
-
-
-    # DEBUG：你也可以暫時印出看看原始 stats & label_map
-    print("🔎 Raw stats:", stats)
-    print("🔎 Label map:", label_map)
-    print("🔎 Games played (gp):", gp)
-
-    lines = []
-
-    for label in DESIRED_LABELS:
-        stat_id = _find_stat_id_for_label(label, label_map)
-        if not stat_id:
-            continue
-
-        raw_val = stats.get(stat_id)
-        if raw_val is None or raw_val == "":
-            continue
-
-        try:
-            v = float(raw_val)
-        except Exception:
-            # 偶爾會是字串，直接顯示
-            lines.append(f"{label}: {raw_val}")
-            continue
-
-        # 計數型：換算成「本季場均」
-        if label in ["PTS", "REB", "AST", "STL", "BLK", "3PTM", "TO"]:
-            if gp and gp > 0:
-                per_game = v / gp
-                lines.append(f"{label}: {per_game:.1f}")
-            else:
-                lines.append(f"{label}: {v}")
-
-        # 百分比型：用 0.XXX 千分比顯示
-        elif label in ["FG%", "FT%", "3PT%"]:
-            # 如果 Yahoo 給的是 47.1 就除以 100；如果本來就是 0.471 就直接用
-            if v > 1:
-                v = v / 100.0
-            lines.append(f"{label}: {v:.3f}")
-
-    if not lines:
-        return "尚無可讀數據"
-
-    return "\n".join(lines)
-
-
 
 def yahoo_get_my_leagues():
+    """目前 tenant 的 Yahoo 帳號參加的 NBA 聯盟：[{league_key, name}, ...]（!league 綁定用）"""
     data = yahoo_api_get("users;use_login=1/games;game_keys=nba/leagues")
 
     if not data:
@@ -705,62 +1224,23 @@ def yahoo_get_my_leagues():
         user0 = users["0"]["user"][1]
         games = user0["games"]
 
-        league_keys = []
+        result = []
 
         for i in range(int(games["count"])):
             leagues = games[str(i)]["game"][1]["leagues"]
             for j in range(int(leagues["count"])):
-                league_key = leagues[str(j)]["league"][0]["league_key"]
-                league_keys.append(league_key)
+                league = leagues[str(j)]["league"][0]
+                result.append({
+                    "league_key": league["league_key"],
+                    "name": league.get("name", league["league_key"]),
+                })
 
-        return league_keys
+        return result
 
     except Exception as e:
         print("解析 league 列表失敗：", e)
         return None
 
-def compare_two_players(nameA: str, nameB: str):
-    # 找球員
-    pA = yahoo_search_player_by_name(nameA)
-    pB = yahoo_search_player_by_name(nameB)
-
-    if not pA or not pB:
-        return "找不到其中一位球員，請確認名字"
-
-    # 抓 7 天 stats
-    statsA = yahoo_get_player_stats_by_date_range(pA["player_key"], days=7)
-    statsB = yahoo_get_player_stats_by_date_range(pB["player_key"], days=7)
-
-    # 格式化並列
-    label_map = load_stat_label_map()
-
-    lines = []
-    lines.append(f"📊 {pA['name']} vs {pB['name']} — 最近 7 天場均\n")
-
-    for label in DESIRED_LABELS:
-        sid = _find_stat_id_for_label(label, label_map)
-        if not sid:
-            continue
-
-        vA = statsA.get(sid, 0)
-        vB = statsB.get(sid, 0)
-
-        # 計數型
-        if label in ["PTS", "REB", "AST", "STL", "BLK", "3PTM", "TO"]:
-            line = f"{label:<4} {vA:.1f} vs {vB:.1f}"
-
-        # 百分比
-        else:
-            # 若大於 1 的話轉回 0.xxx
-            if vA > 1: vA /= 100
-            if vB > 1: vB /= 100
-            line = f"{label:<4} {vA:.3f} vs {vB:.3f}"
-
-        lines.append(line)
-
-    return "\n".join(lines)
-
-
 def format_player_update(name, team, update):
     if not update:
         return f"{name}（{team}）目前沒有相關傷情資訊。"
@@ -788,7 +1268,12 @@ def yahoo_get_player_detail(player_key):
     """
     取得玩家完整資訊（包含傷病與狀態）
     Yahoo API: player/{player_key}
+    先查本機 player_cache（背景排程會預先填好）
     """
+    cached = get_cached_player("detail", player_key)
+    if cached is not None:
+        return cached
+
     path = f"player/{player_key}"
     data = yahoo_api_get(path)
     if not data:
@@ -797,44 +1282,65 @@ def yahoo_get_player_detail(player_key):
     try:
         player_arr = data["fantasy_content"]["player"]
 
-        status = None
-        injury_note = None
+        # 玩家 metadata 都在 player_arr[0] 裡（受傷狀態 INJ / OUT、傷病內容）
+        detail = _parse_player_detail(player_arr[0])
+        save_players("detail", {player_key: detail})
+        return detail
 
-        # 玩家 metadata 都在 player_arr[0] 裡
-        for block in player_arr[0]:
-            if not isinstance(block, dict):
-                continue
+    except Exception as e:
+        print("❌ 解析玩家傷情失敗：", e)
+        return None
 
-            # 受傷狀態 (INJ, OUT)
-            if "status" in block:
-                status = block["status"]
+NBA_SCOREBOARD_URL = "https://cdn.nba.com/static/json/liveData/scoreboard/todaysScoreboard_00.json"
 
-            # 傷病內容
-            if "injury_note" in block:
-                injury_note = block["injury_note"]
+# !nba 同時抓 boxscore 的數量
+NBA_MAX_WORKERS = int(os.getenv("NBA_MAX_WORKERS", "8"))
 
-        return {
-            "status": status,
-            "injury": injury_note,
-        }
+# NBA gameStatus：1 = 尚未開打，3 = 已結束
+NBA_GAME_SCHEDULED = 1
+NBA_GAME_FINAL = 3
+
+
+def _boxscore_url(game_id):
+    return f"https://cdn.nba.com/static/json/liveData/boxscore/boxscore_{game_id}.json"
 
-    except Exception as e:
-        print("❌ 解析玩家傷情失敗：", e)
-        return None
 
 def get_nba_today_games():
-    url = "https://cdn.nba.com/static/json/liveData/scoreboard/todaysScoreboard_00.json"
-    res = requests.get(url, timeout=5)
-    data = res.json()
+    data, _ = get_nba_json(NBA_SCOREBOARD_URL)
     return data["scoreboard"]["games"]
 
-def get_game_leaders(game_id):
-    url = f"https://cdn.nba.com/static/json/liveData/boxscore/boxscore_{game_id}.json"
-    res = requests.get(url, timeout=5)
+def get_nba_schedule():
+    """
+    整季 NBA 賽程（cdn scheduleLeagueV2），回傳 gameDates list：
+    [{"gameDate": "10/21/2025 00:00:00", "games": [{gameId, gameStatus, homeTeam, awayTeam, ...}]}]
+    檔案很大，快取由 modules/fantasy/matchup.py 負責。
+    """
+    url = "https://cdn.nba.com/static/json/staticData/scheduleLeagueV2.json"
+    res = http_get(url, timeout=10)
     data = res.json()
+    return data["leagueSchedule"]["gameDates"]
 
+def _boxscore_game(url, data):
+    """boxscore JSON → game；已結束的比賽之後不再重抓"""
     game = data["game"]
+    if game.get("gameStatus") == NBA_GAME_FINAL:
+        mark_final(url)
+    return game
+
+
+def _get_boxscore(game_id):
+    """回傳 (game, version)"""
+    url = _boxscore_url(game_id)
+    data, version = get_nba_json(url)
+    return _boxscore_game(url, data), version
 
+
+def get_game_leaders(game_id):
+    game, _ = _get_boxscore(game_id)
+    return _parse_game_leaders(game)
+
+
+def _parse_game_leaders(game):
     # 兩隊
     home = game["homeTeam"]
     away = game["awayTeam"]
@@ -894,6 +1400,73 @@ def format_game_summary(game_info):
     )
 
 
+
+# 格式化好的比賽摘要：{game_id: (boxscore version, 文字)}，boxscore 沒變就直接用
+_GAME_SUMMARIES = {}
+_GAME_SUMMARIES_LOCK = threading.Lock()
+GAME_SUMMARY_CACHE_SIZE = 64
+
+
+def get_game_summary(game_id):
+    game, version = _get_boxscore(game_id)
+    return game_summary(game_id, game, version)
+
+
+def game_summary(game_id, game, version):
+    """格式化比賽摘要；同一個 boxscore 版本只算一次"""
+    with _GAME_SUMMARIES_LOCK:
+        cached = _GAME_SUMMARIES.get(game_id)
+        if cached and cached[0] == version:
+            return cached[1]
+
+    summary = format_game_summary(_parse_game_leaders(game))
+
+    with _GAME_SUMMARIES_LOCK:
+        _GAME_SUMMARIES[game_id] = (version, summary)
+        while len(_GAME_SUMMARIES) > GAME_SUMMARY_CACHE_SIZE:
+            _GAME_SUMMARIES.pop(next(iter(_GAME_SUMMARIES)))
+
+    return summary
+
+
+def unstarted_summary(g):
+    """還沒開打的比賽只顯示對戰與時間"""
+    return (
+        f"{g['awayTeam']['teamTricode']} @ {g['homeTeam']['teamTricode']}"
+        f"（{g.get('gameStatusText', '').strip()}）"
+    )
+
+
+def unavailable_summary(g):
+    return (
+        f"{g['awayTeam']['teamTricode']} @ {g['homeTeam']['teamTricode']}"
+        "（數據暫時無法取得）"
+    )
+
+
+def format_nba_today(summaries):
+    return "🏀 今日 NBA 概況\n\n" + "\n\n================\n\n".join(summaries)
+
+
+def get_game_summaries(games):
+    """並行抓今天每場比賽的摘要（維持原本順序）；還沒開打的只顯示對戰與時間"""
+    def summarize(g):
+        if g.get("gameStatus") == NBA_GAME_SCHEDULED:
+            return unstarted_summary(g)
+        try:
+            return get_game_summary(g["gameId"])
+        except Exception as e:
+            print("❌ 抓取 boxscore 失敗：", g["gameId"], e)
+            return unavailable_summary(g)
+
+    if not games:
+        return []
+
+    workers = max(1, min(NBA_MAX_WORKERS, len(games)))
+    with TenantExecutor(max_workers=workers) as pool:
+        return list(pool.map(summarize, games))
+
+
 # ==============================
 # LINE Webhook
 # ==============================
@@ -909,281 +1482,621 @@ def callback():
     return "OK"
 
 
+# ==============================
+# 執行狀態（連線池、重試等計數）
+# ==============================
+def collect_stats():
+    """/stats 的內容（Flask / ASGI 共用）"""
+    return {
+        "http": get_http_stats(),
+        "sheets": get_sheet_metrics(),
+        "group_log": get_group_log_stats(),
+        "jobs": job_queue.stats(),
+        "commands": router.stats(),
+        "llm": get_llm_stats(),
+        "llm_cache": llm_cache.stats(),
+        "nba_cache": get_nba_cache_stats(),
+        "scheduler": scheduler.stats(),
+        "live": get_live_stats(),
+        "tenants": get_tenant_stats(),
+    }
+
+
+@app.route("/stats")
+def stats():
+    return jsonify(collect_stats())
+
+
 # ==============================
 # LINE Message Handler
 # ==============================
-@handler.add(MessageEvent, message=TextMessageContent)
-def handle_message(event):
+@contextlib.contextmanager
+def message_scope(event, tenant=None):
+    """
+    處理一則訊息的 contextvars（Flask / ASGI 共用；背景指令 / 並行抓取也會沿用）。
+    tenant：呼叫端已經查好的 tenant（ASGI 版在 thread 裡查，不在 event loop 上讀 SQLite）
+    """
+    # Sheets 呼叫次數依指令分開統計（群組一般聊天算在 group_message）；
+    # 沒註冊的指令（Sheet 關鍵字、打錯字）都算在 FALLBACK_NAME，統計的 key 不會跟著使用者輸入變多
+    text = event.message.text.strip()
+    if text.startswith("!"):
+        name = text[1:].split(" ", 1)[0].lower()
+        scope = name if router.get(name) else FALLBACK_NAME
+    else:
+        scope = "group_message"
+
+    # 依群組綁定的聯盟處理
+    if tenant is None:
+        tenant = get_tenant(_push_target(event))
+    with sheet_metrics_scope(scope), tenant_scope(tenant):
+        yield
+
+
+def parse_command(event):
+    """
+    指令 → (command, argument)；其他訊息回傳 None（Flask / ASGI 共用）。
+    群組內的一般聊天會順便記錄下來。
+    """
     # 先處理重送訊息
     if event.delivery_context.is_redelivery:
         print("🔁 忽略重送訊息")
-        return
+        return None
 
     user_text = event.message.text.strip()
 
     # 群組內非指令 → 記錄訊息，不回覆
     if event.source.type == "group" and not user_text.startswith("!"):
         save_group_message(event, user_text)
-        return
+        return None
 
     # 非 ! 開頭 → 不處理
     if not user_text.startswith("!"):
-        return
+        return None
 
     # 解析指令
     parts = user_text[1:].split(" ", 1)
     command = parts[0].lower()
     argument = parts[1] if len(parts) > 1 else ""
+    return command, argument
 
-    reply_text = "（沒有產生回覆）"
 
-    # ===== Fantasy Module =====
-    if command == "ff":
-        reply_text = f"[Fantasy 指令收到] 參數：{argument}"
+@handler.add(MessageEvent, message=TextMessageContent)
+def handle_message(event):
+    with message_scope(event):
+        _handle_message(event)
 
-    elif command == "player":
-        if not argument:
-            reply_text = "請在 !player 後面加球員名字，例如：!player SGA"
-        else:
-            player = yahoo_search_player_by_name(argument)
-            if not player:
-                reply_text = f"找不到球員：{argument}"
-            else:
-                stats = yahoo_get_player_season_avg(player["player_key"])
-                if not stats:
-                    reply_text = f"{player['name']} 暫時查不到 stats"
-                else:
-                    pretty_stats = format_player_stats(stats)
-                    reply_text = (
-                        f"📊 {player['name']}（{player['team']}）\n"
-                        f"—— 本季場均 ——\n"
-                        f"{pretty_stats}"
-                    )
-
-    # !last14 <name>
-    elif command == "last14":
-        if not argument:
-            reply_text = "用法範例：!last14 SGA"
-        else:
-            reply_text = analyze_last14(argument)
 
-     # !injury <name>
-    elif command == "injury":
-        if not argument:
-            reply_text = "請在 !injury 後加球員名字"
-        else:
-            player = yahoo_search_player_by_name(argument)
-            if not player:
-                reply_text = f"找不到球員：{argument}"
-            else:
-                detail = yahoo_get_player_detail(player["player_key"])
-                from modules.fantasy.player_stats import format_injury_status
-                injury_text = format_injury_status(detail)
-                reply_text = (
-                    f"🩺 {player['name']}（{player['team']}）傷病狀態\n"
-                    f"{injury_text}"
-                )
-
-    # !value <name>
-    elif command == "value":
-        if not argument:
-            reply_text = "用法範例：!value Kawhi"
-        else:
-            reply_text = analyze_value(argument)
+def _handle_message(event):
+    parsed = parse_command(event)
+    if parsed is None:
+        return
+    command, argument = parsed
+
+    # 慢指令：先回覆「處理中」，背景跑完再用 push 送結果
+    if ASYNC_COMMANDS and command in SLOW_COMMANDS:
+        to = _push_target(event)
+
+        def on_done(text):
+            # 串流時第一段已經先送出，剩下的部分可能是空的
+            if text:
+                send_push(to, text)
+
+        accepted = job_queue.submit(
+            command,
+            lambda: run_command(
+                event, command, argument,
+                on_partial=lambda text: send_push(to, text),
+            ),
+            on_done=on_done,
+            on_error=lambda e: send_push(to, f"指令執行失敗：{e}"),
+        )
 
-     # !vs <nameA> <nameB>
-    elif command == "vs":
-        try:
-            nameA, nameB = argument.split(" ", 1)
-        except:
-            reply_text = "用法：!vs Curry Lillard"
+        if accepted:
+            send_reply(event.reply_token, f"⏳ 正在處理 !{command}，完成後會直接傳到這裡")
         else:
-            playerA = yahoo_search_player_by_name(nameA)
-            playerB = yahoo_search_player_by_name(nameB)
-    
-            if not playerA or not playerB:
-                reply_text = "找不到其中一位球員，請確認名字"
-            else:
-                from modules.fantasy.player_stats import (
-                    get_season_stats, 
-                    get_recent_stats, 
-                    format_stats_for_llm
-                )
-                from modules.fantasy.analysis_llm import compare_players
-    
-                # 取得 A 的 stats（season + 14 days）
-                statsA_season = get_season_stats(playerA["player_key"])
-                statsA_14 = get_recent_stats(playerA["player_key"], days=14)
-    
-                # 取得 B 的 stats（season + 14 days）
-                statsB_season = get_season_stats(playerB["player_key"])
-                statsB_14 = get_recent_stats(playerB["player_key"], days=14)
-    
-                # 格式化給 LLM
-                textA = (
-                    "【本季】\n" +
-                    format_stats_for_llm(statsA_season) +
-                    "\n\n【最近 14 天】\n" +
-                    format_stats_for_llm(statsA_14)
-                )
-    
-                textB = (
-                    "【本季】\n" +
-                    format_stats_for_llm(statsB_season) +
-                    "\n\n【最近 14 天】\n" +
-                    format_stats_for_llm(statsB_14)
-                )
-    
-                # LLM 分析
-                analysis = compare_players(playerA["name"], textA, playerB["name"], textB)
-    
-                reply_text = (
-                    f"📊 {playerA['name']} vs {playerB['name']} — Fantasy 比較\n\n"
-                    f"{analysis}"
-                )
-    # !trade <A> <B>
-    elif command == "trade":
-        try:
-            nameA, nameB = argument.split(" ", 1)
-        except:
-            reply_text = "用法：!trade Curry Lillard"
-        else:
-            playerA = yahoo_search_player_by_name(nameA)
-            playerB = yahoo_search_player_by_name(nameB)
-    
-            if not playerA or not playerB:
-                reply_text = "找不到其中一位球員，請確認名字"
-            else:
-                from modules.fantasy.player_stats import (
-                    get_season_stats, 
-                    get_recent_stats, 
-                    format_stats_for_llm
-                )
-                from modules.fantasy.analysis_llm import evaluate_trade
-    
-                # A 的資料
-                seasonA = get_season_stats(playerA["player_key"])
-                last14A = get_recent_stats(playerA["player_key"], days=14)
-    
-                textA = (
-                    "【本季】\n" +
-                    format_stats_for_llm(seasonA) +
-                    "\n\n【最近 14 天】\n" +
-                    format_stats_for_llm(last14A)
-                )
-    
-                # B 的資料
-                seasonB = get_season_stats(playerB["player_key"])
-                last14B = get_recent_stats(playerB["player_key"], days=14)
-    
-                textB = (
-                    "【本季】\n" +
-                    format_stats_for_llm(seasonB) +
-                    "\n\n【最近 14 天】\n" +
-                    format_stats_for_llm(last14B)
-                )
-    
-                # LLM 判斷交易
-                analysis = evaluate_trade(playerA["name"], textA, playerB["name"], textB)
-    
-                reply_text = (
-                    f"🔄 交易評估：{playerA['name']} ↔ {playerB['name']}\n\n"
-                    f"{analysis}"
-                )
+            send_reply(event.reply_token, "😵 目前指令太多，請稍後再試")
+        return
+
+    send_reply(event.reply_token, run_command(event, command, argument))
+
+
+class EarlyReply:
+    """
+    串流 LLM 分析時，第一段一完成就先用 send 送出（加上標題），
+    最後 finish() 只回傳還沒送出的部分。沒有 send 時就等全部完成才回。
+    """
+
+    def __init__(self, send, header: str):
+        self.send = send
+        self.header = header
+        self.sent = None
+
+    def on_section(self, section: str):
+        if self.send and self.sent is None:
+            self.sent = section
+            self.send(self.header + section)
+
+    def finish(self, full_text: str):
+        if self.sent is None:
+            return self.header + full_text
+
+        full_text = full_text.strip()
+        if full_text.startswith(self.sent):
+            return full_text[len(self.sent):].strip() or None
+        return full_text
+
+
+def run_command(event, command: str, argument: str, on_partial=None) -> str:
+    """
+    執行單一指令，回傳要送出的文字（指令的參數解析 / timeout / 同時執行上限見下面的註冊）。
+    on_partial(text)：長分析串流時，第一段完成就先送出（背景模式用 push）
+    """
+    return router.dispatch(event, command, argument, on_partial=on_partial)
+
+
+# ==============================
+# 指令
+# ==============================
+def _parse_vs(argument):
+    try:
+        nameA, nameB = argument.split(" ", 1)
+    except ValueError:
+        raise UsageError("用法：!vs Curry Lillard")
+    return nameA, nameB
+
 
+def _parse_trade(argument):
+    parsed = parse_trade_argument(argument)
+    if not parsed:
+        raise UsageError("用法：!trade Curry Lillard 或 !trade Curry, Green for Tatum")
+    return parsed
 
-    elif command == "nba":
+
+def _stats_text(season, recent):
+    """給 LLM 的單一球員數據（本季 + 最近 14 天）"""
+    return (
+        "【本季】\n" +
+        format_stats_for_llm(season) +
+        "\n\n【最近 14 天】\n" +
+        format_stats_for_llm(recent)
+    )
+
+
+# ===== Fantasy Module =====
+@router.command("ff")
+def _cmd_ff(ctx, argument):
+    return f"[Fantasy 指令收到] 參數：{argument}"
+
+
+@router.command(
+    "player",
+    parser=required_argument("請在 !player 後面加球員名字，例如：!player SGA"),
+    timeout=20, max_concurrency=8,
+)
+def _cmd_player(ctx, name):
+    player = yahoo_search_player_by_name(name)
+    if not player:
+        return f"找不到球員：{name}"
+
+    stats = yahoo_get_player_season_avg(player["player_key"])
+    if not stats:
+        return f"{player['name']} 暫時查不到 stats"
+
+    pretty_stats = format_player_stats(stats)
+    return (
+        f"📊 {player['name']}（{player['team']}）\n"
+        f"—— 本季場均 ——\n"
+        f"{pretty_stats}"
+    )
+
+
+# !last14 <name>
+@router.command(
+    "last14",
+    parser=required_argument("用法範例：!last14 SGA"),
+    timeout=60, max_concurrency=4,
+)
+def _cmd_last14(ctx, name):
+    return analyze_last14(name)
+
+
+# !injury <name>
+@router.command(
+    "injury",
+    parser=required_argument("請在 !injury 後加球員名字"),
+    timeout=20, max_concurrency=8,
+)
+def _cmd_injury(ctx, name):
+    player = yahoo_search_player_by_name(name)
+    if not player:
+        return f"找不到球員：{name}"
+
+    detail = yahoo_get_player_detail(player["player_key"])
+    injury_text = format_injury_status(detail)
+    return (
+        f"🩺 {player['name']}（{player['team']}）傷病狀態\n"
+        f"{injury_text}"
+    )
+
+
+# !value <name>
+@router.command(
+    "value",
+    parser=required_argument("用法範例：!value Kawhi"),
+    timeout=60, max_concurrency=4,
+)
+def _cmd_value(ctx, name):
+    return analyze_value(name)
+
+
+# !vs <nameA> <nameB>
+@router.command("vs", parser=_parse_vs, timeout=90, max_concurrency=3)
+def _cmd_vs(ctx, names):
+    nameA, nameB = names
+    playerA = yahoo_search_player_by_name(nameA)
+    playerB = yahoo_search_player_by_name(nameB)
+
+    if not playerA or not playerB:
+        return "找不到其中一位球員，請確認名字"
+
+    # 最近 14 天：兩人一起抓
+    recent = get_recent_stats_multi(
+        [playerA["player_key"], playerB["player_key"]], days=14
+    )
+
+    # 格式化給 LLM（season + 14 days）
+    textA = _stats_text(
+        get_season_stats(playerA["player_key"]), recent.get(playerA["player_key"], {})
+    )
+    textB = _stats_text(
+        get_season_stats(playerB["player_key"]), recent.get(playerB["player_key"], {})
+    )
+
+    # LLM 分析
+    early = EarlyReply(
+        ctx.on_partial,
+        f"📊 {playerA['name']} vs {playerB['name']} — Fantasy 比較\n\n",
+    )
+    analysis = compare_players(
+        playerA["name"], textA, playerB["name"], textB,
+        player_keys=[playerA["player_key"], playerB["player_key"]],
+        on_section=early.on_section,
+    )
+
+    return early.finish(analysis)
+
+
+# !trade <A> <B>
+@router.command("trade", parser=_parse_trade, timeout=120, max_concurrency=2)
+def _cmd_trade(ctx, parsed):
+    give_names, get_names = parsed
+    give = [yahoo_search_player_by_name(n) for n in give_names]
+    receive = [yahoo_search_player_by_name(n) for n in get_names]
+
+    missing = [n for n, p in zip(give_names + get_names, give + receive) if not p]
+    if missing:
+        return f"找不到球員：{', '.join(missing)}，請確認名字"
+
+    league_key = ctx.league_key
+    give_keys = [p["player_key"] for p in give]
+    get_keys = [p["player_key"] for p in receive]
+
+    # 兩隊交易前後的各項變化（同一份名單 snapshot 內會快取）
+    delta_text = ""
+    snapshot = get_roster_snapshot(league_key) if league_key else None
+    if snapshot:
         try:
-            games = get_nba_today_games()
-            all_text = []
-            for g in games:
-                gid = g["gameId"]
-                info = get_game_leaders(gid)
-                summary = format_game_summary(info)
-                all_text.append(summary)
+            delta_text = format_trade_result(snapshot.evaluate(give_keys, get_keys))
+        except TradeError as e:
+            delta_text = f"⚠️ 無法計算兩隊變化：{e}"
+
+    # 最近 14 天：交易涉及的球員一起抓
+    recent = get_recent_stats_multi(give_keys + get_keys, days=14)
+
+    def season_stats(player_key):
+        if snapshot and snapshot.stats.get(player_key):
+            return snapshot.stats[player_key]
+        return get_season_stats(player_key)
+
+    def side_text(players):
+        return "\n\n".join(
+            f"{p['name']}（{p['team']}）\n" +
+            _stats_text(season_stats(p["player_key"]), recent.get(p["player_key"], {}))
+            for p in players
+        )
+
+    textA = side_text(give)
+    textB = side_text(receive)
+
+    nameA = " + ".join(p["name"] for p in give)
+    nameB = " + ".join(p["name"] for p in receive)
+
+    # LLM 評論交易
+    header = f"🔄 交易評估：{nameA} ↔ {nameB}\n\n"
+    if delta_text:
+        header += delta_text + "\n\n"
+    early = EarlyReply(ctx.on_partial, header)
+    analysis = evaluate_trade(
+        nameA, textA, nameB, textB,
+        player_keys=(tuple(give_keys), tuple(get_keys)),
+        on_section=early.on_section,
+        delta_text=delta_text,
+    )
+
+    return early.finish(analysis)
 
-            reply_text = "🏀 今日 NBA 概況\n\n" + "\n\n================\n\n".join(all_text)
 
+# !matchup（自己的隊伍）/ !matchup <隊名> / !matchup all
+@router.command("matchup", parser=str.strip, timeout=60, max_concurrency=3)
+def _cmd_matchup(ctx, query):
+    league_key = ctx.league_key
+    if not league_key:
+        return NO_LEAGUE_TEXT
+
+    projection = get_week_projection(league_key)
+    if not projection:
+        return "目前抓不到本週對戰資料"
+    if query.lower() == "all":
+        return format_all_matchups(projection)
+
+    snapshot = get_roster_snapshot(league_key)
+    mine = [t for t, team in snapshot.teams.items() if team["is_mine"]] if snapshot else []
+    matchup, side = find_matchup(projection, query or None, mine)
+    if not matchup:
+        return f"找不到隊伍：{query}" if query else "找不到你的隊伍，請用 !matchup <隊名>"
+    return format_matchup(projection, matchup, side)
+
+
+# !live（自己的隊伍）/ !live <隊名> / !live all：今天各隊即時累積數據
+# 平常只讀記憶體；聯盟第一次用（或閒置停掉後）要同步抓一次，所以還是設 timeout
+@router.command("live", parser=str.strip, timeout=30)
+def _cmd_live(ctx, query):
+    if not ctx.league_key:
+        return NO_LEAGUE_TEXT
+
+    result, updated_at = get_live_tracker(current_tenant()).snapshot()
+    if not result:
+        return "目前抓不到今日即時戰況"
+    if query.lower() == "all":
+        return format_all_live(result, updated_at)
+
+    team_key = find_live_team(result, query or None)
+    if not team_key:
+        return f"找不到隊伍：{query}" if query else "找不到你的隊伍，請用 !live <隊名>"
+    return format_team_live(result, team_key, updated_at)
+
+
+@router.command("nba", timeout=30, max_concurrency=4)
+def _cmd_nba(ctx, argument):
+    try:
+        games = get_nba_today_games()
+        return format_nba_today(get_game_summaries(games))
+    except Exception as e:
+        return f"NBA 資料取得錯誤：{e}"
+
+
+# !fa [categories]（例如 !fa reb ast punt to）
+@router.command("fa", parser=lambda a: a.lower().split(), timeout=120, max_concurrency=2)
+def _cmd_fa(ctx, categories):
+    league_key = ctx.league_key
+    if not league_key:
+        return NO_LEAGUE_TEXT
+
+    # FA 名單 + 本季 / 最近一週 stats（兩次請求）
+    fa_raw = yahoo_get_fa_list(league_key, count=20, with_stats=True)
+
+    missing = [p for p in fa_raw if not (p["season"] and p["lastweek"])]
+
+    def fetch_fa_player(player):
+        # 名單已經帶 player_key，不用再搜尋名字
+        return dict(player, season=get_season_stats(player["player_key"]))
+
+    # 名單沒帶到 stats 的才個別補抓，逾時的先略過
+    fetched, skipped = collect_fa_stats(missing, fetch_fa_player)
+
+    # 最近 7 天：所有補抓的 FA 一起抓（每天一次請求）；
+    # 回傳的格式和 Yahoo lastweek 相同（出賽場數 + 命中 / 出手），z-score 可以放在一起比
+    if fetched:
+        recent = get_recent_stats_multi([f["player_key"] for f in fetched], days=7)
+        for f in fetched:
+            f["lastweek"] = recent.get(f["player_key"], {})
+
+    # 維持 Yahoo 原本的排序
+    fetched_by_key = {f["player_key"]: f for f in fetched}
+    fa_players = []
+    for p in fa_raw:
+        if p["season"] and p["lastweek"]:
+            fa_players.append(p)
+        elif p["player_key"] in fetched_by_key:
+            fa_players.append(fetched_by_key[p["player_key"]])
+
+    # 先用 z-score 排好名次，LLM 只負責解釋
+    focus, punt = parse_category_args(categories)
+    ranked = rank_fa(fa_players, focus, punt, league_key)
+
+    if not ranked:
+        reply_text = "目前抓不到自由球員數據"
+    else:
+        reply_text = "🔥 自由球員推薦（z-score 排名）\n" + format_fa_ranking(ranked)
+        if punt:
+            reply_text += f"\n（已放棄：{', '.join(punt)}）"
+
+        try:
+            analysis = llm_rank_fa(ranked, categories)
+            reply_text += f"\n\n💬 分析\n{analysis}"
         except Exception as e:
-            reply_text = f"NBA 資料取得錯誤：{e}"
+            print("❌ FA 分析失敗：", e)
 
+    if skipped:
+        reply_text += f"\n\n⚠️ 以下球員資料逾時，未納入排名：{', '.join(skipped)}"
+
+    return reply_text
 
-    elif command == "fa":
-    # 分析需求的 categories
-        categories = []
-        if argument:
-            categories = argument.lower().split(" ")
-    
-        # 抓 FA 列表
-        if not YAHOO_LEAGUE_KEY:
-            reply_text = "尚未設定 YAHOO_LEAGUE_KEY"
-        else:
-            fa_raw = yahoo_get_fa_list(YAHOO_LEAGUE_KEY, count=20)
-    
-            from modules.fantasy.player_stats import (
-                get_season_stats,
-                get_recent_stats,
-                format_stats_for_llm
-            )
-            from modules.fantasy.fa import llm_rank_fa
-    
-            fa_stats_list = []
-    
-            for player in fa_raw:
-                # 搜尋 player_key
-                p = yahoo_search_player_by_name(player["name"])
-                if not p:
-                    continue
-    
-                # 抓 stats
-                season = get_season_stats(p["player_key"])
-                last7 = get_recent_stats(p["player_key"], days=7)
-    
-                text = (
-                    "【本季】\n" +
-                    format_stats_for_llm(season) +
-                    "\n\n【最近 7 天】\n" +
-                    format_stats_for_llm(last7)
-                )
-    
-                fa_stats_list.append({
-                    "name": player["name"],
-                    "team": player["team"],
-                    "stats_text": text
-                })
-    
-            # 丟給 LLM 排名
-            analysis = llm_rank_fa(fa_stats_list, categories)
-    
-            reply_text = f"🔥 自由球員推薦\n{analysis}"
 
-    # ===== ChatGPT + 群組記憶 =====
-    elif command == "bot":
-        if not argument:
-            reply_text = "請輸入問題"
+# !league：這個群組用哪個聯盟 / 哪個 Yahoo 帳號
+@router.command("league", parser=str.split, timeout=30, max_concurrency=4)
+def _cmd_league(ctx, parts):
+    target = _push_target(ctx.event)
+    sub = parts[0].lower() if parts else ""
+
+    # 用預設 Yahoo 帳號的群組不能看 / 換成帳號裡的其他聯盟
+    if sub in ("list", "set") and not may_choose_league(target):
+        return "這個群組使用預設的 Yahoo 帳號，不能自行換聯盟；請先用 !league login 授權自己的 Yahoo 帳號"
+
+    if sub == "list":
+        leagues = yahoo_get_my_leagues()
+        if not leagues:
+            return "抓不到聯盟列表，請先用 !league login 授權 Yahoo 帳號"
+        lines = ["可選的聯盟："]
+        lines += [f"{i}. {lg['name']}（{lg['league_key']}）" for i, lg in enumerate(leagues, 1)]
+        lines.append("\n用 !league set <編號> 設定")
+        return "\n".join(lines)
+
+    if sub == "set" and len(parts) > 1:
+        # 只能選這個 Yahoo 帳號有參加的聯盟
+        leagues = yahoo_get_my_leagues()
+        if not leagues:
+            return "抓不到聯盟列表，請先用 !league login 授權 Yahoo 帳號"
+        choice = parts[1]
+        if choice.isdigit():
+            idx = int(choice) - 1
+            league = leagues[idx] if 0 <= idx < len(leagues) else None
         else:
-            try:
-                group_id = event.source.group_id if event.source.type == "group" else ""
-                memory = load_group_memory(group_id, limit=80)
-                reply_text = ask_bot_with_memory(argument, memory)
-            except Exception as e:
-                reply_text = f"ChatGPT 錯誤：{e}"
+            league = next((lg for lg in leagues if lg["league_key"] == choice), None)
+        if not league:
+            return "找不到這個聯盟（只能選 Yahoo 帳號有參加的聯盟），請先用 !league list 查看"
+        bind_league(target, league["league_key"])
+        return f"✅ 這個群組改用聯盟 {league['name']}（{league['league_key']}）"
+
+    if sub == "login":
+        # 群組設定要等 callback 存好 token 才會改，登入沒完成就照舊
+        state = create_login_state(target)
+        login_url = REDIRECT_URI.rsplit("/", 1)[0] + "/login"
+        return (
+            f"請在 {int(TENANT_LOGIN_TTL // 60)} 分鐘內用下面的連結登入要使用的 Yahoo 帳號，"
+            "完成後用 !league list 選聯盟（登入完成前還是用目前的聯盟）：\n"
+            f"{login_url}?state={urllib.parse.quote(state)}"
+        )
 
-    else:
-        # 未知指令 → 走 keyword_reply
-        cmds = load_sheet_commands()
-        reply_text = cmds.get(command, f"查無指令：{command}")
+    if sub == "reset":
+        unbind_tenant(target)
+        return f"✅ 已恢復預設聯盟（{YAHOO_LEAGUE_KEY or '未設定'}）"
+
+    tenant = get_tenant(target)
+    source = "群組設定" if is_tenant_bound(target) else "預設"
+    return (
+        f"目前聯盟：{tenant.league_key or '未設定'}（{source}）\n"
+        "!league list：列出 Yahoo 帳號的聯盟\n"
+        "!league set <編號或 league_key>：設定聯盟\n"
+        "!league login：改用自己的 Yahoo 帳號\n"
+        "!league reset：恢復預設"
+    )
+
+
+# !alerts on / off：傷病異動推播
+@router.command("alerts", parser=lambda a: a.strip().lower())
+def _cmd_alerts(ctx, arg):
+    target = _push_target(ctx.event)
+    if arg == "on":
+        subscribe_alerts(target)
+        return "🔔 已開啟傷病通知：聯盟內被選走的球員狀態有異動時會推播到這裡"
+    if arg == "off":
+        unsubscribe_alerts(target)
+        return "🔕 已關閉傷病通知"
+
+    state = "開啟" if is_alerts_subscribed(target) else "關閉"
+    return f"傷病通知目前：{state}\n用 !alerts on / !alerts off 切換"
+
+
+# ===== ChatGPT + 群組記憶 =====
+@router.command("bot", parser=required_argument("請輸入問題"), timeout=90, max_concurrency=3)
+def _cmd_bot(ctx, question):
+    try:
+        event = ctx.event
+        group_id = event.source.group_id if event.source.type == "group" else ""
+        memory = load_group_memory(group_id, limit=80)
+        early = EarlyReply(ctx.on_partial, "")
+        return early.finish(
+            ask_bot_with_memory(question, memory, on_section=early.on_section)
+        )
+    except Exception as e:
+        return f"ChatGPT 錯誤：{e}"
+
+
+# 未知指令 → 走 keyword_reply
+@router.fallback
+def _sheet_keyword_reply(ctx):
+    cmds = load_sheet_commands()
+    return cmds.get(ctx.command, f"查無指令：{ctx.command}")
 
-    # 統一回覆
+
+def send_reply(reply_token: str, text: str):
+    """用 reply token 回覆（token 只能用一次且很快就過期）"""
     with ApiClient(configuration) as api_client:
         MessagingApi(api_client).reply_message(
             ReplyMessageRequest(
-                reply_token=event.reply_token,
-                messages=[TextMessage(text=reply_text)],
+                reply_token=reply_token,
+                messages=[TextMessage(text=text)],
             )
         )
 
 
+def send_push(to: str, text: str):
+    """用 Messaging API push 主動送訊息（背景指令完成時使用）"""
+    with ApiClient(configuration) as api_client:
+        MessagingApi(api_client).push_message(
+            PushMessageRequest(
+                to=to,
+                messages=[TextMessage(text=text)],
+            )
+        )
+
+
+def _push_target(event):
+    """push 的對象：群組 / 聊天室 / 個人"""
+    source = event.source
+    if source.type == "group":
+        return source.group_id
+    if source.type == "room":
+        return source.room_id
+    return source.user_id
+
+
+
+
+# ==============================
+# 背景排程（每個 worker 都會啟動，同一工作只會有一個 worker 執行）
+# ==============================
+def _register_jobs():
+    from modules.fantasy.prefetch import (
+        prefetch_league_players,
+        finals_token,
+        PREFETCH_INTERVAL,
+        PREFETCH_MIN_GAP,
+    )
+    from modules.fantasy.injury_feed import poll_injuries, INJURY_POLL_INTERVAL
+
+    scheduler.register(Job(
+        "prefetch_players",
+        lambda: run_for_each_tenant(prefetch_league_players),
+        interval=PREFETCH_INTERVAL,
+        trigger=finals_token,
+        min_gap=PREFETCH_MIN_GAP,
+    ))
+
+    scheduler.register(Job(
+        "injury_feed",
+        lambda: run_for_each_tenant(poll_injuries),
+        interval=INJURY_POLL_INTERVAL,
+    ))
+
+
+if SCHEDULER_ENABLED:
+    _register_jobs()
+    scheduler.start()
+
+# 聊天記錄：本機資料庫第一次啟動時從 Sheet 匯入（背景執行，多個 worker 只會匯入一次）
+start_group_memory_import()
 
 
 # ==============================
@@ -0,0 +1,283 @@
+# asgi.py
+"""
+ASGI 模式（選用；Procfile 預設仍是 gunicorn app:app）：
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 2
+（每個 worker 各自有記憶體快取與排程 thread，和 gunicorn 多 worker 一樣靠 SQLite / 檔案鎖協調）
+
+- /callback、/yahoo/login、/yahoo/callback、/stats 和 Flask 版（app.py）行為相同
+- 非同步的只有 webhook 與 LINE I/O：webhook 接收、LINE reply / push，另外加上 Yahoo OAuth 換 token、
+  !nba 的 cdn.nba.com，等待時不佔 thread
+- 指令本身沒有改成非同步：Yahoo API、Google Sheets、OpenAI 都還是同步呼叫，一樣會佔住 thread；
+  router.dispatch_threaded 直接在這裡有上限的 thread pool 跑一次 handler（不再轉到 router 自己的 pool），
+  只是保證 event loop 不會被擋住
+- thread 數 = ASGI_MAX_INFLIGHT：同時處理中的指令最多這麼多個，不會在 pool 裡默默排隊；
+  滿了時慢指令直接回「指令太多」（和 Flask 版 job_queue 滿了一樣）
+- 群組綁定的 tenant（SQLite）也在 thread 裡查，webhook 驗完簽章馬上回 200，事件在背景處理
+"""
+import asyncio
+import contextlib
+import os
+
+from linebot.v3 import WebhookParser
+from linebot.v3.exceptions import InvalidSignatureError
+from linebot.v3.messaging import (
+    AsyncApiClient,
+    AsyncMessagingApi,
+    ReplyMessageRequest,
+    PushMessageRequest,
+    TextMessage,
+)
+from linebot.v3.webhooks import MessageEvent, TextMessageContent
+from starlette.applications import Starlette
+from starlette.responses import HTMLResponse, JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from app import (
+    CHANNEL_SECRET,
+    ASYNC_COMMANDS,
+    SLOW_COMMANDS,
+    NBA_SCOREBOARD_URL,
+    NBA_GAME_SCHEDULED,
+    YAHOO_TOKEN_URL,
+    configuration,
+    message_scope,
+    parse_command,
+    collect_stats,
+    yahoo_login_page,
+    yahoo_code_exchange,
+    yahoo_save_login,
+    _yahoo_token_headers,
+    _push_target,
+    _boxscore_url,
+    _boxscore_game,
+    game_summary,
+    unstarted_summary,
+    unavailable_summary,
+    format_nba_today,
+)
+from modules.async_http import async_http_post, close_async_client
+from modules.commands import router
+from modules.nba_cache import get_json_async
+from modules.tenants import TenantExecutor, get_tenant
+
+# 同時處理中的指令上限（超過時慢指令直接回「指令太多」）；也是執行同步指令（Yahoo / Sheets / OpenAI）的 thread 數
+ASGI_MAX_INFLIGHT = int(os.getenv("ASGI_MAX_INFLIGHT", "64"))
+
+parser = WebhookParser(CHANNEL_SECRET)
+
+_INFLIGHT = asyncio.Semaphore(ASGI_MAX_INFLIGHT)
+# 拿到 _INFLIGHT 名額的指令一定有 thread 可以馬上跑
+_COMMAND_POOL = TenantExecutor(max_workers=ASGI_MAX_INFLIGHT, thread_name_prefix="asgi-cmd")
+
+# 背景處理中的事件（保留 reference，避免 task 被 GC）
+_TASKS = set()
+
+_STATS = {"events": 0, "commands": 0, "rejected": 0, "errors": 0}
+
+_LINE_API = None
+
+
+# ==============================
+# LINE Messaging API（非同步）
+# ==============================
+def _line_api() -> AsyncMessagingApi:
+    global _LINE_API
+
+    if _LINE_API is None:
+        _LINE_API = AsyncMessagingApi(AsyncApiClient(configuration))
+    return _LINE_API
+
+
+async def send_reply(reply_token: str, text: str):
+    """用 reply token 回覆（token 只能用一次且很快就過期）"""
+    await _line_api().reply_message(
+        ReplyMessageRequest(
+            reply_token=reply_token,
+            messages=[TextMessage(text=text)],
+        )
+    )
+
+
+async def send_push(to: str, text: str):
+    """用 Messaging API push 主動送訊息（慢指令完成時使用）"""
+    await _line_api().push_message(
+        PushMessageRequest(
+            to=to,
+            messages=[TextMessage(text=text)],
+        )
+    )
+
+
+# ==============================
+# !nba（cdn.nba.com 全部非同步抓）
+# ==============================
+async def get_nba_today_games_async():
+    data, _ = await get_json_async(NBA_SCOREBOARD_URL)
+    return data["scoreboard"]["games"]
+
+
+async def get_game_summaries_async(games):
+    """同 app.get_game_summaries：每場比賽的摘要（維持原本順序），同時抓所有 boxscore"""
+    async def summarize(g):
+        if g.get("gameStatus") == NBA_GAME_SCHEDULED:
+            return unstarted_summary(g)
+        try:
+            url = _boxscore_url(g["gameId"])
+            data, version = await get_json_async(url)
+            return game_summary(g["gameId"], _boxscore_game(url, data), version)
+        except Exception as e:
+            print("❌ 抓取 boxscore 失敗：", g["gameId"], e)
+            return unavailable_summary(g)
+
+    return await asyncio.gather(*(summarize(g) for g in games))
+
+
+async def nba_today():
+    try:
+        games = await get_nba_today_games_async()
+        return format_nba_today(await get_game_summaries_async(games))
+    except Exception as e:
+        return f"NBA 資料取得錯誤：{e}"
+
+
+# ==============================
+# 指令執行
+# ==============================
+async def execute_command(event, command: str, argument: str, on_partial=None) -> str:
+    """
+    !nba 直接在 event loop 上跑（一樣套用 router 的上限 / timeout）；
+    其他指令的 handler（同步的 Yahoo / Sheets / OpenAI 呼叫）在 _COMMAND_POOL 裡跑一次。
+    on_partial 是 coroutine function，從 thread 裡呼叫時會等它送完再繼續。
+    """
+    if command == "nba":
+        return await router.dispatch_async("nba", nba_today)
+
+    partial = None
+    if on_partial:
+        loop = asyncio.get_running_loop()
+
+        def partial(text):
+            asyncio.run_coroutine_threadsafe(on_partial(text), loop).result()
+
+    return await router.dispatch_threaded(_COMMAND_POOL, event, command, argument, on_partial=partial)
+
+
+async def handle_message(event):
+    # 和 Flask 版一樣：Sheets 統計 scope、群組綁定的聯盟（tenant 在 thread 裡查）
+    tenant = await asyncio.to_thread(get_tenant, _push_target(event))
+    with message_scope(event, tenant):
+        parsed = await asyncio.to_thread(parse_command, event)
+        if parsed is None:
+            return
+        command, argument = parsed
+        _STATS["commands"] += 1
+
+        # 慢指令：先回覆「處理中」，跑完再用 push 送結果
+        if ASYNC_COMMANDS and command in SLOW_COMMANDS:
+            if _INFLIGHT.locked():
+                _STATS["rejected"] += 1
+                await send_reply(event.reply_token, "😵 目前指令太多，請稍後再試")
+                return
+
+            async with _INFLIGHT:
+                await send_reply(event.reply_token, f"⏳ 正在處理 !{command}，完成後會直接傳到這裡")
+
+                to = _push_target(event)
+                try:
+                    text = await execute_command(
+                        event, command, argument,
+                        on_partial=lambda text: send_push(to, text),
+                    )
+                except Exception as e:
+                    await send_push(to, f"指令執行失敗：{e}")
+                    return
+
+                # 串流時第一段已經先送出，剩下的部分可能是空的
+                if text:
+                    await send_push(to, text)
+            return
+
+        async with _INFLIGHT:
+            text = await execute_command(event, command, argument)
+        await send_reply(event.reply_token, text)
+
+
+async def _handle_event(event):
+    try:
+        await handle_message(event)
+    except Exception as e:
+        _STATS["errors"] += 1
+        print("❌ Webhook Error:", e)
+
+
+# ==============================
+# Routes
+# ==============================
+async def callback(request):
+    signature = request.headers.get("X-Line-Signature", "")
+    body = (await request.body()).decode("utf-8")
+    try:
+        events = parser.parse(body, signature)
+    except InvalidSignatureError as e:
+        print("❌ Webhook Error:", e)
+        return PlainTextResponse("Bad Request", status_code=400)
+
+    for event in events:
+        if not isinstance(event, MessageEvent) or not isinstance(event.message, TextMessageContent):
+            continue
+        _STATS["events"] += 1
+        task = asyncio.create_task(_handle_event(event))
+        _TASKS.add(task)
+        task.add_done_callback(_TASKS.discard)
+
+    return PlainTextResponse("OK")
+
+
+async def yahoo_login(request):
+    # 產生 / 核對 OAuth state 會讀寫 SQLite
+    return HTMLResponse(await asyncio.to_thread(yahoo_login_page, request.query_params.get("state")))
+
+
+async def yahoo_callback(request):
+    login, data, error = await asyncio.to_thread(
+        yahoo_code_exchange, request.query_params.get("code"), request.query_params.get("state")
+    )
+    if error:
+        return HTMLResponse(error)
+
+    response = await async_http_post(YAHOO_TOKEN_URL, headers=_yahoo_token_headers(), data=data)
+    # 存 token 會寫 Google Sheets、改群組設定（同步）
+    return HTMLResponse(await asyncio.to_thread(yahoo_save_login, response, login))
+
+
+async def stats(request):
+    result = await asyncio.to_thread(collect_stats)
+    result["asgi"] = {
+        **_STATS,
+        "in_flight_tasks": len(_TASKS),
+        "max_inflight": ASGI_MAX_INFLIGHT,
+    }
+    return JSONResponse(result)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+
+    global _LINE_API
+    if _LINE_API is not None:
+        await _LINE_API.api_client.close()
+        _LINE_API = None
+    await close_async_client()
+    _COMMAND_POOL.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route("/callback", callback, methods=["POST"]),
+        Route("/yahoo/login", yahoo_login),
+        Route("/yahoo/callback", yahoo_callback),
+        Route("/stats", stats),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,88 @@
+# modules/async_http.py
+"""
+ASGI 模式（asgi.py）用的非同步 HTTP client：
+- 整個 event loop 共用一個 httpx.AsyncClient（連線重用），asgi.py 關閉時一起關
+- timeout 和同步版（modules/http_client.py）相同，請求數 / 重試數也算在同一份統計裡
+- GET 遇到 429 / 5xx / 連線錯誤會重試（指數退避，會看 Retry-After）；POST 不重試
+"""
+import asyncio
+import os
+
+import httpx
+
+from modules.http_client import DEFAULT_TIMEOUT, HTTP_MAX_RETRIES, count_request
+
+# 同時最多幾條連線（一個 process 可能同時有很多指令在等）
+ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", "100"))
+
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_CLIENT = None
+
+
+def get_async_client() -> httpx.AsyncClient:
+    global _CLIENT
+
+    if _CLIENT is None or _CLIENT.is_closed:
+        connect, read = DEFAULT_TIMEOUT
+        _CLIENT = httpx.AsyncClient(
+            timeout=httpx.Timeout(read, connect=connect),
+            limits=httpx.Limits(
+                max_connections=ASYNC_MAX_CONNECTIONS,
+                max_keepalive_connections=20,
+            ),
+        )
+    return _CLIENT
+
+
+async def close_async_client():
+    global _CLIENT
+
+    if _CLIENT is not None:
+        await _CLIENT.aclose()
+        _CLIENT = None
+
+
+def _timeout(timeout):
+    if timeout is None:
+        return httpx.USE_CLIENT_DEFAULT
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return timeout
+
+
+def _retry_after(res, attempt: int) -> float:
+    try:
+        return min(float(res.headers.get("Retry-After")), 30.0)
+    except (TypeError, ValueError):
+        return 0.5 * (2 ** attempt)
+
+
+async def async_http_get(url: str, timeout=None, **kwargs):
+    """共用非同步 GET（連線池 + 重試 + timeout）"""
+    client = get_async_client()
+    count_request()
+
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        last = attempt == HTTP_MAX_RETRIES
+        try:
+            res = await client.get(url, timeout=_timeout(timeout), **kwargs)
+        except httpx.TransportError:
+            if last:
+                raise
+            count_request(retry=True)
+            await asyncio.sleep(0.5 * (2 ** attempt))
+            continue
+
+        if res.status_code not in _RETRY_STATUS or last:
+            return res
+
+        count_request(retry=True)
+        await asyncio.sleep(_retry_after(res, attempt))
+
+
+async def async_http_post(url: str, timeout=None, **kwargs):
+    """共用非同步 POST（連線池 + timeout；不會自動重試）"""
+    count_request()
+    return await get_async_client().post(url, timeout=_timeout(timeout), **kwargs)
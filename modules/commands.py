@@ -0,0 +1,346 @@
+# modules/commands.py
+"""
+指令路由：
+- 每個指令用 @router.command(...) 註冊，宣告自己的參數解析（parser）、時間上限（timeout）、
+  同時執行上限（max_concurrency）
+- parser(argument) 的回傳值交給 handler；格式不對就 raise UsageError(用法說明)，直接回覆給使用者
+- 同一個指令同時執行數滿了就直接回「稍後再試」（不排隊），貴的指令塞滿也不會拖慢 !player 這類便宜指令
+- 有 timeout 的指令丟到 thread pool 執行，超過時間先回覆「處理太久」；thread 真的跑完才釋放名額
+- handler 丟出例外時回覆「執行失敗」，不會讓例外傳到 webhook；每次執行只算一種結果
+- 每個指令記錄耗時分布（histogram）與結果計數（「稍後再試」也算，耗時就是被擋下前的時間），/stats 可以看
+"""
+import asyncio
+import os
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from modules.tenants import TenantExecutor, current_league_key
+
+# 執行有 timeout 指令的 thread 數
+COMMAND_THREADS = int(os.getenv("COMMAND_THREADS", "32"))
+
+# 耗時 histogram 的 bucket 上限（秒），最後還有一格 +inf
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+BUSY_TEXT = "😵 目前太多人在用 !{name}，請稍後再試"
+TIMEOUT_TEXT = "⌛ !{name} 處理超過 {timeout:g} 秒，請稍後再試"
+ERROR_TEXT = "❌ !{name} 執行失敗：{error}"
+
+# 沒註冊的指令（Sheet 關鍵字回覆）統計時用的名字
+FALLBACK_NAME = "*"
+
+
+class UsageError(Exception):
+    """參數格式不對；訊息就是要回覆給使用者的用法說明"""
+
+
+def required_argument(usage: str):
+    """parser：一定要有參數，沒有就回 usage"""
+    def parse(argument):
+        if not argument:
+            raise UsageError(usage)
+        return argument
+    return parse
+
+
+class CommandContext:
+    """handler 收到的執行環境"""
+    __slots__ = ("event", "command", "argument", "league_key", "_on_partial", "timed_out",
+                 "_settled", "_settle_lock")
+
+    def __init__(self, event, command: str, argument: str, on_partial=None):
+        self.event = event
+        self.command = command
+        self.argument = argument
+        self.league_key = current_league_key()
+        self._on_partial = on_partial
+        self.timed_out = False
+        self._settled = False
+        self._settle_lock = threading.Lock()
+
+    def settle(self) -> bool:
+        """handler 跑完和 dispatch 逾時，只有先呼叫的那一邊記結果"""
+        with self._settle_lock:
+            if self._settled:
+                return False
+            self._settled = True
+            return True
+
+    @property
+    def on_partial(self):
+        """長分析串流時先送出第一段；已經回覆逾時就不再送"""
+        if self._on_partial is None:
+            return None
+
+        def send(text):
+            if not self.timed_out:
+                self._on_partial(text)
+        return send
+
+
+class Histogram:
+    """固定 bucket 的耗時分布（不是 thread-safe，由 CommandRouter 的 lock 保護）"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def snapshot(self):
+        labels = [f"<={b:g}s" for b in self.buckets] + ["+inf"]
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 3) if self.count else None,
+            "max": round(self.max, 3),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class Command:
+    __slots__ = ("name", "handler", "parser", "timeout", "max_concurrency", "_slots")
+
+    def __init__(self, name, handler, parser=None, timeout=None, max_concurrency=None):
+        self.name = name
+        self.handler = handler
+        self.parser = parser
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+
+    def acquire(self) -> bool:
+        return self._slots is None or self._slots.acquire(blocking=False)
+
+    def release(self):
+        if self._slots is not None:
+            self._slots.release()
+
+
+class CommandRouter:
+    def __init__(self, threads: int = COMMAND_THREADS):
+        self._commands = {}
+        self._fallback = None
+        self._threads = threads
+        self._pool = None
+        self._lock = threading.Lock()
+        # {name: {"running": n, "ok": n, ..., "latency": Histogram}}
+        self._stats = {}
+
+    # ---------- 註冊 ----------
+    def command(self, name: str, parser=None, timeout=None, max_concurrency=None):
+        """
+        decorator：handler(ctx, args) 回傳要送出的文字。
+        parser(argument) → args；沒有 parser 時 args 就是原始參數字串。
+        """
+        def register(handler):
+            self._commands[name] = Command(name, handler, parser, timeout, max_concurrency)
+            return handler
+        return register
+
+    def fallback(self, handler):
+        """沒註冊的指令交給 handler(ctx)"""
+        self._fallback = handler
+        return handler
+
+    def get(self, name: str):
+        return self._commands.get(name)
+
+    # ---------- 執行 ----------
+    def dispatch(self, event, command: str, argument: str, on_partial=None) -> str:
+        ctx = CommandContext(event, command, argument, on_partial)
+        spec = self._commands.get(command)
+        started = time.monotonic()
+
+        if spec is None:
+            outcome = "error"
+            try:
+                result = self._fallback(ctx)
+                outcome = "ok"
+                return result
+            except Exception as e:
+                print(f"❌ 指令執行失敗：!{command}", e)
+                return ERROR_TEXT.format(name=command, error=e)
+            finally:
+                self._record(FALLBACK_NAME, time.monotonic() - started, outcome)
+
+        try:
+            args = spec.parser(argument) if spec.parser else argument
+        except UsageError as e:
+            self._count(command, "usage")
+            return str(e)
+
+        if not spec.acquire():
+            return self._busy(command, started)
+
+        try:
+            if not spec.timeout:
+                return self._run(spec, ctx, args)
+
+            future = self._executor().submit(self._run, spec, ctx, args)
+            try:
+                return future.result(timeout=spec.timeout)
+            except FutureTimeoutError:
+                if not ctx.settle():
+                    # 剛好在逾時的同時跑完
+                    return future.result()
+                return self._timed_out(spec, ctx, future, started)
+        except Exception as e:
+            # 結果已經在 _run 記成 error
+            print(f"❌ 指令執行失敗：!{command}", e)
+            return ERROR_TEXT.format(name=command, error=e)
+
+    async def dispatch_async(self, command: str, fn):
+        """
+        ASGI 模式用：已經有非同步實作的指令（例如 !nba）。
+        fn() 是 coroutine function；一樣套用同時執行上限、timeout 和耗時統計。
+        """
+        spec = self._commands[command]
+        started = time.monotonic()
+        if not spec.acquire():
+            return self._busy(command, started)
+
+        self._start(command)
+        outcome = "error"
+        try:
+            result = await asyncio.wait_for(fn(), spec.timeout)
+            outcome = "ok"
+            return result
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            print(f"⌛ !{command} 超過 {spec.timeout} 秒")
+            return TIMEOUT_TEXT.format(name=command, timeout=spec.timeout)
+        except Exception as e:
+            print(f"❌ 指令執行失敗：!{command}", e)
+            return ERROR_TEXT.format(name=command, error=e)
+        finally:
+            spec.release()
+            self._record(command, time.monotonic() - started, outcome, running=True)
+
+    async def dispatch_threaded(self, executor, event, command: str, argument: str, on_partial=None):
+        """
+        ASGI 模式用：同步指令直接丟到呼叫端的 executor 跑一次（不再經過 router 自己的 pool），
+        event loop 只等結果；一樣套用參數解析、同時執行上限、timeout 和統計。
+        """
+        spec = self._commands.get(command)
+        if spec is None or not spec.timeout:
+            # 沒有 timeout：dispatch 會在 executor 的 thread 裡直接執行
+            future = executor.submit(self.dispatch, event, command, argument, on_partial)
+            return await asyncio.wrap_future(future)
+
+        ctx = CommandContext(event, command, argument, on_partial)
+        started = time.monotonic()
+        try:
+            args = spec.parser(argument) if spec.parser else argument
+        except UsageError as e:
+            self._count(command, "usage")
+            return str(e)
+
+        if not spec.acquire():
+            return self._busy(command, started)
+
+        future = executor.submit(self._run, spec, ctx, args)
+        try:
+            try:
+                # shield：逾時時不要 cancel 掉還在跑的 thread，交給 _timed_out 判斷
+                return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), spec.timeout)
+            except asyncio.TimeoutError:
+                if not ctx.settle():
+                    return await asyncio.wrap_future(future)
+                return self._timed_out(spec, ctx, future, started)
+        except Exception as e:
+            print(f"❌ 指令執行失敗：!{command}", e)
+            return ERROR_TEXT.format(name=command, error=e)
+
+    def _timed_out(self, spec: Command, ctx: CommandContext, future, started: float) -> str:
+        """超過 timeout（ctx 已經 settle）：先回覆逾時，thread 繼續跑完才釋放名額"""
+        ctx.timed_out = True
+        # 還在 pool 裡排隊的就不用跑了（沒跑過，耗時記在這裡）
+        if future.cancel():
+            spec.release()
+            self._record(spec.name, time.monotonic() - started, "timeout")
+        else:
+            self._count(spec.name, "timeout")
+        print(f"⌛ !{spec.name} 超過 {spec.timeout} 秒")
+        return TIMEOUT_TEXT.format(name=spec.name, timeout=spec.timeout)
+
+    def _run(self, spec: Command, ctx: CommandContext, args):
+        self._start(spec.name)
+        started = time.monotonic()
+        outcome = "error"
+        try:
+            result = spec.handler(ctx, args)
+            outcome = "ok"
+            return result
+        finally:
+            spec.release()
+            # 逾時的那次在 dispatch 已經算過 timeout（之後成功或失敗都不再算），這裡只記耗時
+            if not ctx.settle():
+                outcome = None
+            self._record(spec.name, time.monotonic() - started, outcome, running=True)
+
+    def _busy(self, command: str, started: float) -> str:
+        """同時執行數滿了：sync / async 兩條路徑都記成 busy（含耗時）"""
+        self._record(command, time.monotonic() - started, "busy")
+        return BUSY_TEXT.format(name=command)
+
+    def _executor(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    # 沿用呼叫端的 tenant / Sheets 統計 scope
+                    self._pool = TenantExecutor(max_workers=self._threads, thread_name_prefix="cmd")
+        return self._pool
+
+    # ---------- 統計 ----------
+    def _entry(self, name: str):
+        entry = self._stats.get(name)
+        if entry is None:
+            entry = {
+                "running": 0, "ok": 0, "error": 0, "timeout": 0, "busy": 0, "usage": 0,
+                "latency": Histogram(),
+            }
+            self._stats[name] = entry
+        return entry
+
+    def _count(self, name: str, key: str):
+        with self._lock:
+            self._entry(name)[key] += 1
+
+    def _start(self, name: str):
+        with self._lock:
+            self._entry(name)["running"] += 1
+
+    def _record(self, name: str, seconds: float, outcome, running=False):
+        with self._lock:
+            entry = self._entry(name)
+            if running:
+                entry["running"] -= 1
+            if outcome:
+                entry[outcome] += 1
+            entry["latency"].observe(seconds)
+
+    def stats(self):
+        """各指令的執行中數量、結果計數（ok / error / timeout / busy / usage）與耗時分布"""
+        with self._lock:
+            result = {}
+            for name, entry in self._stats.items():
+                spec = self._commands.get(name)
+                result[name] = {
+                    **{k: v for k, v in entry.items() if k != "latency"},
+                    "max_concurrency": spec.max_concurrency if spec else None,
+                    "timeout_seconds": spec.timeout if spec else None,
+                    "latency": entry["latency"].snapshot(),
+                }
+            return result
+
+
+router = CommandRouter()
@@ -5,7 +5,8 @@
 功能：!last14, !value, !vs, !trade
 """
 
-from modules.llm import client
+from modules.llm import chat, stream_chat
+from modules.llm_cache import cached_analysis
 
 
 def analyze_last14(player_name, stats_14d_text):
@@ -25,11 +26,7 @@ def analyze_last14(player_name, stats_14d_text):
 - 是否建議 Buy / Hold / Sell？
 """
 
-    res = client.chat.completions.create(
-        model="gpt-4.1",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return res.choices[0].message.content
+    return chat("last14", [{"role": "user", "content": prompt}])
 
 
 
@@ -50,11 +47,7 @@ def analyze_value(player_name, season_text, last14_text, injury_text):
 請回答此球員目前的價值、強勢與弱點，以及是否 Buy low / Sell high。
 """
 
-    res = client.chat.completions.create(
-        model="gpt-4.1",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return res.choices[0].message.content
+    return chat("value", [{"role": "user", "content": prompt}])
 
 
 def compare_players(nameA, textA, nameB, textB):
@@ -78,11 +71,7 @@ def compare_players(nameA, textA, nameB, textB):
 給出結論。
 """
 
-    res = client.chat.completions.create(
-        model="gpt-4.1",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return res.choices[0].message.content
+    return chat("vs", [{"role": "user", "content": prompt}])
 
 
 def evaluate_trade(nameA, textA, nameB, textB):
@@ -107,11 +96,7 @@ def evaluate_trade(nameA, textA, nameB, textB):
 並標示：大賺 / 小賺 / 合理 / 小虧 / 大虧
 """
 
-    res = client.chat.completions.create(
-        model="gpt-4.1",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return res.choices[0].message.content
+    return chat("trade", [{"role": "user", "content": prompt}])
 
 def analyze_value(player_name, season_text, last14_text, injury_text):
     """LLM：球員價值分析（Buy / Sell / Hold）"""
@@ -140,14 +125,14 @@ def analyze_value(player_name, season_text, last14_text, injury_text):
 輸出格式請簡潔、有層次，並提供 Fantasy 玩家可直接採用的建議。
 """
 
-    res = client.chat.completions.create(
-        model="gpt-4.1",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return res.choices[0].message.content
+    return chat("value", [{"role": "user", "content": prompt}])
 
-def compare_players(nameA, textA, nameB, textB):
-    """LLM：比較兩位球員"""
+def compare_players(nameA, textA, nameB, textB, player_keys=None, on_section=None):
+    """
+    LLM：比較兩位球員
+    相同球員（player_keys=[keyA, keyB]，沒給就用名字）+ 相同數據會直接用快取的分析
+    on_section：串流時每完成一段就呼叫（可用來提早回覆第一段）
+    """
 
     prompt = f"""
 你是一位 Yahoo Fantasy 專業分析師，請比較兩位球員：
@@ -172,29 +157,50 @@ def compare_players(nameA, textA, nameB, textB):
 請用條列式、清楚分段的方式回答。
 """
 
-    res = client.chat.completions.create(
-        model="gpt-4.1",
-        messages=[{"role": "user", "content": prompt}]
-    )
+    state = {"truncated": False}
 
-    return res.choices[0].message.content
+    def run_llm():
+        # 串流生成：每完成一段就交給 on_section，超過時間上限就截斷
+        text, state["truncated"] = stream_chat(
+            "vs",
+            [{"role": "user", "content": prompt}],
+            on_section=on_section,
+        )
+        return text
 
-def evaluate_trade(nameA, textA, nameB, textB):
-    """LLM：判斷 Fantasy 交易好壞（A 換 B）"""
+    return cached_analysis(
+        "vs", player_keys or [nameA, nameB], [textA, textB], run_llm,
+        should_cache=lambda _: not state["truncated"],
+    )
+
+def evaluate_trade(nameA, textA, nameB, textB, player_keys=None, on_section=None, delta_text=""):
+    """
+    LLM：判斷 Fantasy 交易好壞（送出 A 換回 B，兩邊都可以是多位球員）
+    相同球員（player_keys=(送出的 key tuple, 換回的 key tuple)，沒給就用名字）+ 相同數據會直接用快取的分析
+    on_section：串流時每完成一段就呼叫（可用來提早回覆第一段）
+    delta_text：trade.py 算好的兩隊交易前後各項變化
+    """
+
+    delta_block = ""
+    if delta_text:
+        delta_block = f"""
+【交易前後兩隊各項每場合計（已計算好，請以此為準）】
+{delta_text}
+"""
 
     prompt = f"""
-你是一位 Yahoo Fantasy 專業分析師，請分析以下 1-for-1 交易是否合理：
+你是一位 Yahoo Fantasy 專業分析師，請分析以下交易是否合理：
 
-【玩家 A】
+【送出】
 {nameA}
 數據：
 {textA}
 
-【玩家 B】
+【換回】
 {nameB}
 數據：
 {textB}
-
+{delta_block}
 請從以下面向評估：
 1. 類別價值變化（PTS / REB / AST / STL / BLK / 3PM / FG% / FT% / TO）
 2. 本季 baseline 與 role 穩定性
@@ -212,10 +218,19 @@ def evaluate_trade(nameA, textA, nameB, textB):
 請清楚分段，產出專業 Fantasy 結論。
 """
 
-    res = client.chat.completions.create(
-        model="gpt-4.1",
-        messages=[{"role": "user", "content": prompt}]
-    )
+    state = {"truncated": False}
 
-    return res.choices[0].message.content
+    def run_llm():
+        # 串流生成：每完成一段就交給 on_section，超過時間上限就截斷
+        text, state["truncated"] = stream_chat(
+            "trade",
+            [{"role": "user", "content": prompt}],
+            on_section=on_section,
+        )
+        return text
+
+    return cached_analysis(
+        "trade", player_keys or [nameA, nameB], [textA, textB, delta_text], run_llm,
+        should_cache=lambda _: not state["truncated"],
+    )
 
@@ -4,42 +4,137 @@
 FA 推薦模組：
 1. 從 Yahoo Fantasy API 抓取 FA 清單。
 2. 計算本季 / 近 7 天的 stats。
-3. 排序後送給 LLM 做自然語言分析。
+3. 用 z-score 引擎（ranking.py）排好順序，再送給 LLM 解釋。
 """
 
-from modules.llm import client
+import os
+from concurrent.futures import wait
 
+from modules.llm import chat
+from modules.tenants import TenantExecutor
+from modules.fantasy.ranking import rank_players, format_z_line
 
-def llm_rank_fa(fa_list, categories=None):
+# FA 並行抓取的 worker 數與整體時間上限（秒）
+FA_MAX_WORKERS = int(os.getenv("FA_MAX_WORKERS", "6"))
+FA_FETCH_TIMEOUT = float(os.getenv("FA_FETCH_TIMEOUT", "20"))
+
+# 排名時近 7 天價值所佔的比重（其餘為本季）
+FA_RECENT_WEIGHT = float(os.getenv("FA_RECENT_WEIGHT", "0.3"))
+
+# 回覆中列出前幾名
+FA_RANK_TOP = int(os.getenv("FA_RANK_TOP", "10"))
+
+
+def collect_fa_stats(fa_players, fetch_one, max_workers=None, timeout=None):
+    """
+    並行對每位 FA 執行 fetch_one(player)，最多同時 max_workers 個。
+    超過 timeout 還沒回來的球員直接放棄，不會拖住整個 !fa。
+
+    回傳 (results, skipped)：
+    - results：fetch_one 的結果（維持原本 FA 排序，None 會被略過）
+    - skipped：逾時或失敗的球員名字
+    """
+    max_workers = max_workers or FA_MAX_WORKERS
+    timeout = timeout or FA_FETCH_TIMEOUT
+
+    if not fa_players:
+        return [], []
+
+    pool = TenantExecutor(max_workers=max_workers)
+    futures = [pool.submit(fetch_one, p) for p in fa_players]
+
+    done, _ = wait(futures, timeout=timeout)
+
+    # 不等還沒跑完的工作，排隊中的直接取消
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    results = []
+    skipped = []
+    for player, future in zip(fa_players, futures):
+        if future not in done:
+            skipped.append(player["name"])
+            continue
+
+        try:
+            r = future.result()
+        except Exception as e:
+            print("❌ FA 抓取失敗：", player["name"], e)
+            skipped.append(player["name"])
+            continue
+
+        if r is not None:
+            results.append(r)
+
+    return results, skipped
+
+
+def rank_fa(fa_players, focus=(), punt=(), league_key=None):
     """
-    categories = ['reb', 'ast', '3pm'] 等 → 用來客製排序重點
-    fa_list = [
-       {'name': 'XX', 'team': 'YYY', 'stats_text': 'PTS:...' },
-       {...}
-    ]
+    fa_players = [{player_key, name, team, positions, status, season, lastweek}, ...]
+    本季與近 7 天各自對聯盟母體算 z-score，依加權後的總值排序。
+    每位球員多帶 value（本季）、recent（近 7 天，沒有就是 None）、score、z。
     """
+    season = rank_players(
+        [(p, p["season"]) for p in fa_players], "season", focus, punt, league_key
+    )
+    recent = rank_players(
+        [(p, p["lastweek"]) for p in fa_players], "lastweek", focus, punt, league_key
+    )
+    recent_by_key = {r["player_key"]: r["value"] for r in recent}
+
+    for r in season:
+        r["recent"] = recent_by_key.get(r["player_key"])
+        if r["recent"] is None:
+            r["score"] = r["value"]
+        else:
+            r["score"] = (1 - FA_RECENT_WEIGHT) * r["value"] + FA_RECENT_WEIGHT * r["recent"]
+
+    season.sort(key=lambda r: -r["score"])
+    return season
+
+
+def format_fa_ranking(ranked, top=None):
+    """排好的 FA 轉成回覆文字（每人兩行：總值、最突出的項目）"""
+    lines = []
+    for i, r in enumerate(ranked[:top or FA_RANK_TOP], 1):
+        pos = "/".join(r.get("positions") or [])
+        status = f" {r['status']}" if r.get("status") else ""
+        recent = f"｜近 7 天 {r['recent']:+.1f}" if r["recent"] is not None else ""
+        lines.append(f"{i}. {r['name']}（{r['team']} {pos}{status}）總值 {r['value']:+.1f}{recent}")
+        lines.append(f"   {format_z_line(r, limit=4)}")
+    return "\n".join(lines)
 
-    cat_text = ", ".join(categories) if categories else "all categories"
+
+def llm_rank_fa(ranked, categories=None):
+    """
+    ranked：rank_fa() 排好的清單（順序已固定）
+    categories = ['reb', 'ast', 'punt', 'to'] 等 → 使用者指定的排序重點
+    LLM 只負責用一句話解釋每位球員，不再自己排名。
+    """
+
+    cat_text = " ".join(categories) if categories else "全類別綜合"
+
+    ranking_text = "\n".join(
+        f"{i}. {r['name']}（{r['team']}）總值 {r['value']:+.2f}"
+        + (f"，近 7 天 {r['recent']:+.2f}" if r["recent"] is not None else "")
+        + f"\n   各項 z-score：{format_z_line(r)}"
+        for i, r in enumerate(ranked[:FA_RANK_TOP], 1)
+    )
 
     prompt = f"""
 你是一位 Yahoo Fantasy 的 FA 推薦專家。
 
-以下是自由球員的統計資料（本季 + 最近 7 天）：
+以下自由球員已依 z-score 排好名次（排序重點：{cat_text}）：
 
-{fa_list}
+{ranking_text}
 
-請根據以下需求排序（若無指定，就是全類別綜合排序）：
-{cat_text}
+請「不要更改順序」，針對每位球員用一句話說明推薦理由（例如：三分爆量 / 助攻穩定 / 近況升溫），
+並點出要注意的弱項。
 
 輸出格式請如下：
 
-1. <球員> — 最重要的理由（例如：三分爆量 / 助攻穩定）
+1. <球員> — 理由
 2. <球員> — 理由
-3. <球員> — 理由
 """
 
-    res = client.chat.completions.create(
-        model="gpt-4.1",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return res.choices[0].message.content
+    return chat("fa", [{"role": "user", "content": prompt}], max_tokens=500)
@@ -0,0 +1,255 @@
+# modules/fantasy/injury_feed.py
+
+"""
+傷病 / 新聞異動通知：
+1. 背景排程每 INJURY_POLL_INTERVAL 秒抓一次聯盟名單，
+   再用 players;player_keys= 批次抓所有被選走球員的 status、injury_note、最新 note 時間
+   （整個聯盟只要幾次請求）。
+2. 和 SQLite 裡上一次的 snapshot 比對；只有 note 時間變了的球員才另外抓 notes 內容。
+3. 有異動（例如 GTD → O）就 push 給這個聯盟裡有開啟通知（!alerts on）的群組。
+第一次執行只建立 snapshot，不會通知。
+"""
+
+import os
+import time
+
+from modules.sqlite_utils import get_sqlite, sqlite_lock
+from modules.tenants import current_league_key, groups_for_league
+
+INJURY_POLL_INTERVAL = int(os.getenv("INJURY_POLL_INTERVAL", "600"))
+
+# 一則 push 最多列出幾筆異動
+INJURY_ALERT_MAX_ITEMS = 15
+
+_TABLES_READY = False
+
+
+def _ensure_tables():
+    global _TABLES_READY
+    if _TABLES_READY:
+        return
+
+    with sqlite_lock():
+        conn = get_sqlite()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS injury_snapshots (
+                league_key TEXT NOT NULL,
+                player_key TEXT NOT NULL,
+                name       TEXT,
+                team       TEXT,
+                status     TEXT,
+                injury     TEXT,
+                notes_ts   TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (league_key, player_key)
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS alert_subscriptions (
+                group_id   TEXT PRIMARY KEY,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        conn.commit()
+        _TABLES_READY = True
+
+
+# ==============================
+# 訂閱（!alerts on / off）
+# ==============================
+def subscribe(group_id: str):
+    _ensure_tables()
+    with sqlite_lock():
+        conn = get_sqlite()
+        conn.execute(
+            "INSERT OR IGNORE INTO alert_subscriptions (group_id, created_at) VALUES (?, ?)",
+            (group_id, time.time()),
+        )
+        conn.commit()
+
+
+def unsubscribe(group_id: str):
+    _ensure_tables()
+    with sqlite_lock():
+        conn = get_sqlite()
+        conn.execute("DELETE FROM alert_subscriptions WHERE group_id = ?", (group_id,))
+        conn.commit()
+
+
+def is_subscribed(group_id: str) -> bool:
+    _ensure_tables()
+    with sqlite_lock():
+        row = get_sqlite().execute(
+            "SELECT 1 FROM alert_subscriptions WHERE group_id = ?", (group_id,)
+        ).fetchone()
+    return row is not None
+
+
+def subscribed_groups():
+    _ensure_tables()
+    with sqlite_lock():
+        rows = get_sqlite().execute("SELECT group_id FROM alert_subscriptions").fetchall()
+    return [r[0] for r in rows]
+
+
+# ==============================
+# Snapshot 與比對
+# ==============================
+def load_snapshots(league_key: str):
+    """{player_key: {name, team, status, injury, notes_ts}}"""
+    _ensure_tables()
+    with sqlite_lock():
+        rows = get_sqlite().execute(
+            "SELECT player_key, name, team, status, injury, notes_ts FROM injury_snapshots "
+            "WHERE league_key = ?",
+            (league_key,),
+        ).fetchall()
+    return {
+        k: {"name": n, "team": t, "status": s, "injury": i, "notes_ts": ts}
+        for k, n, t, s, i, ts in rows
+    }
+
+
+def save_snapshots(league_key: str, snapshots: dict):
+    if not snapshots:
+        return
+
+    _ensure_tables()
+    now = time.time()
+    with sqlite_lock():
+        conn = get_sqlite()
+        conn.executemany(
+            "INSERT OR REPLACE INTO injury_snapshots "
+            "(league_key, player_key, name, team, status, injury, notes_ts, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (league_key, k, s["name"], s["team"], s["status"], s["injury"], s["notes_ts"], now)
+                for k, s in snapshots.items()
+            ],
+        )
+        conn.commit()
+
+
+def diff_snapshots(old: dict, new: dict):
+    """
+    回傳有異動的球員：[(player_key, 舊 snapshot, 新 snapshot), ...]
+    之前沒有紀錄的球員（新加入名單）不算異動。
+    """
+    changes = []
+    for key, cur in new.items():
+        prev = old.get(key)
+        if prev is None:
+            continue
+        if (
+            (prev["status"] or "") != (cur["status"] or "")
+            or (prev["injury"] or "") != (cur["injury"] or "")
+            or (prev["notes_ts"] or "") != (cur["notes_ts"] or "")
+        ):
+            changes.append((key, prev, cur))
+    return changes
+
+
+def format_alert(changes, notes_by_key, owners):
+    """changes 轉成一則 push 訊息"""
+    lines = ["🚨 傷病 / 新聞更新"]
+
+    for key, prev, cur in changes[:INJURY_ALERT_MAX_ITEMS]:
+        owner = owners.get(key)
+        owner_text = f"，{owner}" if owner else ""
+        lines.append("")
+
+        before = prev["status"] or "健康"
+        after = cur["status"] or "健康"
+        if before != after:
+            lines.append(f"🩺 {cur['name']}（{cur['team']}{owner_text}）：{before} → {after}")
+        else:
+            lines.append(f"🩺 {cur['name']}（{cur['team']}{owner_text}）")
+
+        if cur["injury"] and cur["injury"] != prev["injury"]:
+            lines.append(f"傷勢：{cur['injury']}")
+
+        note = notes_by_key.get(key)
+        if note and note.get("content"):
+            lines.append(f"📘 {note['content']}")
+
+    if len(changes) > INJURY_ALERT_MAX_ITEMS:
+        lines.append(f"\n…還有 {len(changes) - INJURY_ALERT_MAX_ITEMS} 位球員有更新")
+
+    return "\n".join(lines)
+
+
+def poll_injuries(league_key=None):
+    """
+    抓一次聯盟（預設為目前 tenant 的聯盟）被選走球員的傷病狀態，和上次比對，有異動就推播。
+    回傳異動筆數。
+    """
+    from app import (
+        yahoo_get_league_rosters,
+        yahoo_get_players_detail,
+        yahoo_get_player_update,
+        send_push,
+    )
+
+    league_key = league_key or current_league_key()
+    if not league_key:
+        return 0
+
+    teams = yahoo_get_league_rosters(league_key)
+    players = {}
+    owners = {}
+    for team in teams.values():
+        for p in team["players"]:
+            players[p["player_key"]] = p
+            owners[p["player_key"]] = team["name"]
+
+    if not players:
+        return 0
+
+    # 批次抓 status / injury_note / note 時間（同時更新 player_cache）
+    details = yahoo_get_players_detail(list(players), refresh=True)
+
+    new = {}
+    for key, d in details.items():
+        p = players.get(key)
+        if not p:
+            continue
+        new[key] = {
+            "name": p["name"],
+            "team": p["team"],
+            "status": d.get("status"),
+            "injury": d.get("injury"),
+            "notes_ts": d.get("notes_ts"),
+        }
+
+    old = load_snapshots(league_key)
+    changes = diff_snapshots(old, new)
+    save_snapshots(league_key, new)
+
+    if not old:
+        print(f"✅ 傷病 snapshot 建立完成：{len(new)} 位球員")
+        return 0
+
+    if not changes:
+        return 0
+
+    # 只有 note 時間變了的球員才抓 notes 內容
+    notes_by_key = {}
+    for key, prev, cur in changes[:INJURY_ALERT_MAX_ITEMS]:
+        if (prev["notes_ts"] or "") != (cur["notes_ts"] or ""):
+            update = yahoo_get_player_update(key)
+            if update and update.get("notes"):
+                notes_by_key[key] = update["notes"]
+
+    message = format_alert(changes, notes_by_key, owners)
+    for group_id in groups_for_league(league_key, subscribed_groups()):
+        try:
+            send_push(group_id, message)
+        except Exception as e:
+            print("❌ 傷病通知推播失敗：", group_id, e)
+
+    print(f"🚨 傷病異動 {len(changes)} 筆")
+    return len(changes)
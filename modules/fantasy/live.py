@@ -0,0 +1,405 @@
+# modules/fantasy/live.py
+
+"""
+今日即時戰況（!live）：
+1. 背景 thread 定期讀 NBA 今日賽程，並行抓進行中 / 已結束比賽的 boxscore（走 nba_cache，沒變就是 304）。
+2. 只有 boxscore 版本變了（或聯盟名單 snapshot 更新）的比賽才重新解析。
+3. NBA 球員用「球隊 + 正規化名字」對到 Yahoo 被選走的球員，累加成每隊今天的各項數據。
+!live 直接讀記憶體裡的結果，不用等任何請求。
+
+每個聯盟一個 tracker，每個 gunicorn worker 各自維護一份（資料在記憶體裡），
+NBA 端靠條件式請求（多個聯盟共用同一份 boxscore 快取），成本很低。
+最多保留 TENANT_MAX_LEAGUES 個聯盟的 tracker；超過 LIVE_IDLE_STOP 秒沒人用 !live（或被擠出快取）
+背景 thread 就停掉，下次 !live 再啟動。
+"""
+
+import datetime
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from modules.fantasy.matchup import nba_team_code
+from modules.fantasy.player_index import normalize_name, name_parts
+from modules.fantasy.ranking import scoring_columns
+from modules.fantasy.stat_schema import KIND_PERCENT
+from modules.fantasy.stats_cache import NBA_TZ
+from modules.fantasy.trade import get_roster_snapshot
+from modules.tenants import LeagueCache, tenant_scope
+
+# 背景定期更新（聯盟第一次 !live 時才啟動）；關掉時每次 !live 只在沒有結果時同步抓一次
+LIVE_TRACKER_ENABLED = os.getenv("LIVE_TRACKER_ENABLED", "1") == "1"
+
+# 有比賽進行中時多久更新一次（秒）；沒有時放慢
+LIVE_POLL_INTERVAL = float(os.getenv("LIVE_POLL_INTERVAL", "30"))
+LIVE_IDLE_INTERVAL = float(os.getenv("LIVE_IDLE_INTERVAL", "300"))
+
+# 多久沒人用 !live 就停掉背景更新（秒）
+LIVE_IDLE_STOP = float(os.getenv("LIVE_IDLE_STOP", str(30 * 60)))
+
+# NBA boxscore 的欄位（順序固定，每位球員一列）
+RAW_FIELDS = [
+    "points",
+    "reboundsTotal",
+    "assists",
+    "steals",
+    "blocks",
+    "turnovers",
+    "threePointersMade",
+    "threePointersAttempted",
+    "fieldGoalsMade",
+    "fieldGoalsAttempted",
+    "freeThrowsMade",
+    "freeThrowsAttempted",
+]
+_FIELD = {name: i for i, name in enumerate(RAW_FIELDS)}
+
+# 聯盟項目 → boxscore 欄位；百分比是 (命中, 出手)
+LIVE_COUNTING = {
+    "PTS": "points",
+    "REB": "reboundsTotal",
+    "AST": "assists",
+    "STL": "steals",
+    "BLK": "blocks",
+    "TO": "turnovers",
+    "3PTM": "threePointersMade",
+}
+LIVE_PERCENT = {
+    "FG%": ("fieldGoalsMade", "fieldGoalsAttempted"),
+    "FT%": ("freeThrowsMade", "freeThrowsAttempted"),
+    "3PT%": ("threePointersMade", "threePointersAttempted"),
+}
+
+# NBA gameStatus：1 = 尚未開打，2 = 進行中，3 = 已結束
+GAME_SCHEDULED = 1
+GAME_LIVE = 2
+GAME_FINAL = 3
+
+
+def _match_name(name: str) -> str:
+    """'Jaren Jackson Jr.' 和 'Jaren Jackson' 都 → 'jaren jackson'"""
+    return " ".join(name_parts(normalize_name(name or "")))
+
+
+class RosterMap:
+    """NBA boxscore 球員 → Yahoo 被選走的球員（player_key, team_key）"""
+
+    def __init__(self, snapshot):
+        self.built_at = snapshot.built_at
+        self.teams = snapshot.teams
+        self.by_team_name = {}
+        by_name = {}
+
+        for team_key, team in snapshot.teams.items():
+            for info in team["players"]:
+                name = _match_name(info["name"])
+                entry = (info["player_key"], team_key)
+                self.by_team_name[(nba_team_code(info["team"]), name)] = entry
+                by_name.setdefault(name, []).append(entry)
+
+        # 剛被交易（Yahoo 球隊還沒更新）的球員只用名字比對，同名的就不猜
+        self.by_name = {n: v[0] for n, v in by_name.items() if len(v) == 1}
+
+    def lookup(self, tricode: str, player: dict):
+        name = player.get("name") or f"{player.get('firstName', '')} {player.get('familyName', '')}"
+        name = _match_name(name)
+        return self.by_team_name.get((tricode, name)) or self.by_name.get(name)
+
+
+def parse_boxscore(game, roster_map):
+    """回傳 {player_key: (team_key, 名字, boxscore 欄位 array)}，只含有上場的被選走球員"""
+    lines = {}
+    for side in ("homeTeam", "awayTeam"):
+        team = game.get(side) or {}
+        tricode = team.get("teamTricode", "")
+        for p in team.get("players", []):
+            if str(p.get("played", "0")) != "1":
+                continue
+            match = roster_map.lookup(tricode, p)
+            if not match:
+                continue
+            s = p.get("statistics") or {}
+            raw = np.array([float(s.get(f) or 0) for f in RAW_FIELDS])
+            lines[match[0]] = (match[1], p.get("name", ""), raw)
+    return lines
+
+
+class LiveTracker:
+    """單一聯盟（tenant）的即時戰況"""
+
+    def __init__(self, tenant):
+        self.tenant = tenant
+        # {game_id: {"version", "roster_at", "status", "text", "lines"}}
+        self.games = {}
+        self.date = None
+        self.updated_at = None
+        # 算好的各隊結果（!live 直接讀）
+        self.result = None
+        self._roster_map = None
+        # 同一時間只有一個 poll（背景 thread 和第一次 !live 可能同時觸發）
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        # 最後一次 !live 的時間（閒置太久背景 thread 就停掉）
+        self.last_used = time.time()
+        # 背景 thread 和 !live 的同步 poll 都會更新，/stats 會讀
+        self._stats = {"polls": 0, "parsed": 0, "skipped": 0, "failures": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def _fetch(self, game_ids):
+        from app import _get_boxscore, NBA_MAX_WORKERS
+
+        def fetch(game_id):
+            try:
+                return game_id, _get_boxscore(game_id)
+            except Exception as e:
+                print("❌ 即時戰況抓取 boxscore 失敗：", game_id, e)
+                return game_id, None
+
+        if not game_ids:
+            return []
+        workers = max(1, min(NBA_MAX_WORKERS, len(game_ids)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(fetch, game_ids))
+
+    def poll(self):
+        """更新一次；回傳是否有比賽進行中"""
+        with self._lock, tenant_scope(self.tenant):
+            return self._poll()
+
+    def _poll(self):
+        from app import get_nba_today_games
+
+        league_key = self.tenant.league_key
+        snapshot = get_roster_snapshot(league_key) if league_key else None
+        if not snapshot:
+            return False
+
+        games = get_nba_today_games()
+        started = [g for g in games if g.get("gameStatus") != GAME_SCHEDULED]
+        today = datetime.datetime.now(NBA_TZ).date()
+
+        # 換日：舊比賽全部清掉；名單更新：重建對照表（版本檢查會讓每場比賽重新解析）
+        if self.date != today:
+            self.games = {}
+            self.date = today
+        if self._roster_map is None or self._roster_map.built_at != snapshot.built_at:
+            self._roster_map = RosterMap(snapshot)
+        roster_map = self._roster_map
+
+        changed = False
+        for game_id, fetched in self._fetch([g["gameId"] for g in started]):
+            if fetched is None:
+                self._count("failures")
+                continue
+            game, version = fetched
+
+            old = self.games.get(game_id)
+            if old and old["version"] == version and old["roster_at"] == roster_map.built_at:
+                self._count("skipped")
+                continue
+
+            self.games[game_id] = {
+                "version": version,
+                "roster_at": roster_map.built_at,
+                "status": game.get("gameStatus"),
+                "text": (
+                    f"{game['awayTeam']['teamTricode']} {game['awayTeam'].get('score', 0)} – "
+                    f"{game['homeTeam'].get('score', 0)} {game['homeTeam']['teamTricode']}"
+                    f"（{(game.get('gameStatusText') or '').strip()}）"
+                ),
+                "lines": parse_boxscore(game, roster_map),
+            }
+            self._count("parsed")
+            changed = True
+
+        # 今天賽程裡已經沒有的比賽（例如延賽）拿掉
+        ids = {g["gameId"] for g in started}
+        for game_id in [k for k in self.games if k not in ids]:
+            del self.games[game_id]
+            changed = True
+
+        if changed or self.result is None:
+            self.result = self._totals(roster_map, len(games))
+        self.updated_at = time.time()
+        self._count("polls")
+
+        return any(g.get("gameStatus") == GAME_LIVE for g in games)
+
+    def _totals(self, roster_map, total_games):
+        """所有比賽的球員數據加總成每隊今天的各項數據"""
+        columns = [
+            c for c in scoring_columns()
+            if c.label in LIVE_COUNTING or c.label in LIVE_PERCENT
+        ]
+
+        teams = {
+            team_key: {"name": team["name"], "is_mine": team["is_mine"],
+                       "raw": np.zeros(len(RAW_FIELDS)), "players": []}
+            for team_key, team in roster_map.teams.items()
+        }
+        for g in self.games.values():
+            for team_key, name, raw in g["lines"].values():
+                team = teams.get(team_key)
+                if team is None:
+                    continue
+                team["raw"] += raw
+                team["players"].append((name, raw))
+
+        for team in teams.values():
+            team["values"] = [_column_value(c, team["raw"]) for c in columns]
+            team["players"].sort(key=lambda p: -p[1][_FIELD["points"]])
+
+        return {
+            "labels": [c.label for c in columns],
+            "is_pct": [c.kind == KIND_PERCENT for c in columns],
+            "teams": teams,
+            "games": [g["text"] for g in self.games.values()],
+            "live": sum(1 for g in self.games.values() if g["status"] == GAME_LIVE),
+            "final": sum(1 for g in self.games.values() if g["status"] == GAME_FINAL),
+            "scheduled": total_games - len(self.games),
+        }
+
+    def _idle(self) -> bool:
+        return time.time() - self.last_used > LIVE_IDLE_STOP
+
+    def _loop(self):
+        while True:
+            # 和 start() 用同一把 lock：剛好有人 !live 時不會停掉後又沒人重新啟動
+            with self._start_lock:
+                if self._stop.is_set() or self._idle():
+                    self._thread = None
+                    print(f"💤 即時戰況停止更新：{self.tenant.league_key}")
+                    return
+
+            try:
+                live = self.poll()
+            except Exception as e:
+                live = False
+                self._count("failures")
+                print("❌ 即時戰況更新失敗：", e)
+            self._stop.wait(LIVE_POLL_INTERVAL if live else LIVE_IDLE_INTERVAL)
+
+    def start(self):
+        """!live 用到時呼叫：記下使用時間，背景 thread 沒在跑就啟動"""
+        with self._start_lock:
+            self.last_used = time.time()
+            if self._thread is not None or self._stop.is_set():
+                return
+            self._thread = threading.Thread(
+                target=self._loop, name=f"live-{self.tenant.league_key}", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """被擠出快取時呼叫：背景 thread 在下一輪結束"""
+        self._stop.set()
+
+    def snapshot(self):
+        """!live 用：目前的結果；還沒更新過就先同步抓一次"""
+        if self.result is None:
+            self.poll()
+        return self.result, self.updated_at
+
+    def stats(self):
+        with self._stats_lock:
+            counts = dict(self._stats)
+        return dict(
+            counts,
+            running=self._thread is not None,
+            games=len(self.games),
+            updated_at=self.updated_at,
+        )
+
+
+def _column_value(col, raw):
+    if col.label in LIVE_PERCENT:
+        made, att = LIVE_PERCENT[col.label]
+        a = raw[_FIELD[att]]
+        return (raw[_FIELD[made]] / a) if a > 0 else None
+    return raw[_FIELD[LIVE_COUNTING[col.label]]]
+
+
+def _fmt(v, is_pct):
+    if v is None:
+        return "-"
+    return f"{v:.3f}" if is_pct else f"{v:.0f}"
+
+
+def format_team_live(result, team_key, updated_at=None):
+    """單一隊伍今天的各項數據 + 有上場的球員"""
+    team = result["teams"][team_key]
+    lines = [f"📡 {team['name']} 今日即時戰況", _status_line(result, updated_at), ""]
+
+    lines.append("  ".join(
+        f"{label} {_fmt(v, pct)}"
+        for label, v, pct in zip(result["labels"], team["values"], result["is_pct"])
+    ))
+
+    if team["players"]:
+        lines.append("")
+        for name, raw in team["players"]:
+            lines.append(
+                f"• {name}：{raw[_FIELD['points']]:.0f} 分 {raw[_FIELD['reboundsTotal']]:.0f} 板 "
+                f"{raw[_FIELD['assists']]:.0f} 助 {raw[_FIELD['steals']]:.0f} 抄 "
+                f"{raw[_FIELD['blocks']]:.0f} 帽 {raw[_FIELD['threePointersMade']]:.0f} 三分 "
+                f"{raw[_FIELD['turnovers']]:.0f} 失誤"
+            )
+    else:
+        lines.append("今天還沒有球員上場")
+
+    return "\n".join(lines)
+
+
+def format_all_live(result, updated_at=None):
+    """全聯盟每隊今天的各項數據"""
+    lines = ["📡 全聯盟今日即時戰況", _status_line(result, updated_at)]
+    for team in sorted(result["teams"].values(), key=lambda t: t["name"]):
+        lines.append("")
+        lines.append(f"{team['name']}（{len(team['players'])} 人上場）")
+        lines.append("  ".join(
+            f"{label} {_fmt(v, pct)}"
+            for label, v, pct in zip(result["labels"], team["values"], result["is_pct"])
+        ))
+    return "\n".join(lines)
+
+
+def _status_line(result, updated_at):
+    text = f"進行中 {result['live']} 場｜已結束 {result['final']} 場｜未開打 {result['scheduled']} 場"
+    if updated_at:
+        text += f"｜{max(0, int(time.time() - updated_at))} 秒前更新"
+    return text
+
+
+def find_team(result, query=None):
+    """依隊名（部分符合）找隊伍；沒給就找自己的隊伍"""
+    for team_key, team in result["teams"].items():
+        if query:
+            if query.lower() in team["name"].lower():
+                return team_key
+        elif team["is_mine"]:
+            return team_key
+    return None
+
+
+# {league_key: LiveTracker}（同一個聯盟的群組共用；擠出快取的 tracker 停掉背景 thread）
+_TRACKERS = LeagueCache(on_evict=LiveTracker.stop)
+
+
+def get_live_tracker(tenant):
+    """取得聯盟的 tracker；用到時（背景 thread 沒在跑）就啟動背景更新"""
+    tracker = _TRACKERS.get_or_create(tenant.league_key, lambda: LiveTracker(tenant))
+    if LIVE_TRACKER_ENABLED:
+        tracker.start()
+    return tracker
+
+
+def get_live_stats():
+    return {t.tenant.league_key: t.stats() for t in _TRACKERS.values()}
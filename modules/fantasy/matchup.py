@@ -0,0 +1,389 @@
+# modules/fantasy/matchup.py
+
+"""
+每週對戰預測（!matchup）：
+1. Yahoo scoreboard：本週所有對戰與各隊目前累積 stats。
+2. NBA 賽程：每支 NBA 球隊從今天到週末還有幾場（尚未開打的場次）。
+3. 每位被選走球員的場均 × 剩餘場次 = 預測量；用「隊伍 × 球員」矩陣一次算出全聯盟每隊的預測總和。
+4. 各項目用常態近似算勝率，再用 Poisson-binomial 算整場對戰的勝率。
+
+全聯盟所有對戰一次算完，結果快取到「今天又有比賽打完」或名單 snapshot 更新為止。
+"""
+
+import datetime
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from modules.fantasy.stat_schema import parse_ratio, KIND_PERCENT
+from modules.fantasy.stats_cache import NBA_TZ
+from modules.fantasy.trade import get_roster_snapshot
+from modules.tenants import LeagueCache
+
+# NBA 賽程多久重新抓一次（秒）
+SCHEDULE_TTL = int(os.getenv("NBA_SCHEDULE_TTL", str(12 * 3600)))
+
+# 計數項目單場變異數 ≈ 場均 × 這個倍數（1 = Poisson）
+MATCHUP_VARIANCE_FACTOR = float(os.getenv("MATCHUP_VARIANCE_FACTOR", "1.5"))
+
+# 這些狀態的球員不預測剩餘場次
+INACTIVE_STATUS = {"O", "OUT", "INJ", "IL", "IL+", "NA", "SUSP"}
+
+# Yahoo 球隊縮寫 → NBA 賽程的 teamTricode
+YAHOO_TO_NBA_TEAM = {
+    "GS": "GSW",
+    "NY": "NYK",
+    "NO": "NOP",
+    "NOR": "NOP",
+    "SA": "SAS",
+    "PHO": "PHX",
+    "UTAH": "UTA",
+    "WSH": "WAS",
+    "BKN": "BKN",
+}
+
+# NBA gameStatus：1 = 尚未開打，2 = 進行中，3 = 已結束
+GAME_SCHEDULED = 1
+GAME_FINAL = 3
+
+_SCHEDULE = {"loaded_at": 0.0, "games": []}
+_SCHEDULE_LOCK = threading.Lock()
+
+class _LeagueProjection:
+    """單一聯盟的本週預測；鎖只擋同一個聯盟的重算"""
+
+    def __init__(self):
+        self.key = None
+        self.result = None
+        self.lock = threading.Lock()
+
+
+# {league_key: _LeagueProjection}
+_PROJECTIONS = LeagueCache()
+
+
+def nba_team_code(yahoo_abbr: str) -> str:
+    code = (yahoo_abbr or "").upper()
+    return YAHOO_TO_NBA_TEAM.get(code, code)
+
+
+def _parse_game_date(text: str):
+    """'10/21/2025 00:00:00' → date"""
+    return datetime.datetime.strptime(text.split(" ")[0], "%m/%d/%Y").date()
+
+
+def get_schedule():
+    """
+    整季賽程：[(日期, 主隊, 客隊, gameId), ...]
+    SCHEDULE_TTL 內用記憶體裡的；重抓失敗就沿用舊的。
+    """
+    if _SCHEDULE["games"] and time.time() - _SCHEDULE["loaded_at"] < SCHEDULE_TTL:
+        return _SCHEDULE["games"]
+
+    with _SCHEDULE_LOCK:
+        if _SCHEDULE["games"] and time.time() - _SCHEDULE["loaded_at"] < SCHEDULE_TTL:
+            return _SCHEDULE["games"]
+
+        try:
+            from app import get_nba_schedule
+
+            games = []
+            for day in get_nba_schedule():
+                date = _parse_game_date(day["gameDate"])
+                for g in day["games"]:
+                    games.append((
+                        date,
+                        g["homeTeam"]["teamTricode"],
+                        g["awayTeam"]["teamTricode"],
+                        g["gameId"],
+                    ))
+
+            _SCHEDULE["games"] = games
+            _SCHEDULE["loaded_at"] = time.time()
+            print(f"✅ NBA 賽程載入完成，共 {len(games)} 場")
+
+        except Exception as e:
+            print("❌ 讀取 NBA 賽程失敗：", e)
+
+        return _SCHEDULE["games"]
+
+
+def games_remaining(week_end, today=None, today_status=None):
+    """
+    從今天到 week_end（含）每支 NBA 球隊還沒開打的場數：{tricode: n}
+    today_status = {gameId: gameStatus}（今天的即時狀態；已開打的不算剩餘）
+    """
+    today = today or datetime.datetime.now(NBA_TZ).date()
+    today_status = today_status or {}
+
+    counts = {}
+    for date, home, away, game_id in get_schedule():
+        if date < today or date > week_end:
+            continue
+        if date == today and today_status.get(game_id, GAME_SCHEDULED) != GAME_SCHEDULED:
+            continue
+        counts[home] = counts.get(home, 0) + 1
+        counts[away] = counts.get(away, 0) + 1
+    return counts
+
+
+def _today_status():
+    """今天每場比賽的狀態 {gameId: gameStatus}（抓不到就回傳空 dict）"""
+    try:
+        from app import get_nba_today_games
+        return {g["gameId"]: g["gameStatus"] for g in get_nba_today_games()}
+    except Exception as e:
+        print("❌ 讀取今日比賽狀態失敗：", e)
+        return {}
+
+
+def _normal_cdf(x):
+    return 0.5 * (1.0 + np.vectorize(math.erf)(x / math.sqrt(2.0)))
+
+
+def _win_distribution(p):
+    """
+    p：(對戰數, 項目數) 各項目勝率
+    回傳 (對戰數, 項目數 + 1)：贏下 0..k 個項目的機率（Poisson-binomial）
+    """
+    m, k = p.shape
+    dist = np.zeros((m, k + 1))
+    dist[:, 0] = 1.0
+    for j in range(k):
+        pj = p[:, j:j + 1]
+        shifted = np.zeros_like(dist)
+        shifted[:, 1:] = dist[:, :-1]
+        dist = dist * (1 - pj) + shifted * pj
+    return dist
+
+
+def _current_totals(team_stats, columns):
+    """scoreboard 目前累積：(數值, 命中, 出手)；百分比項目的數值是命中率"""
+    k = len(columns)
+    value = np.zeros(k)
+    made = np.zeros(k)
+    att = np.zeros(k)
+
+    for j, col in enumerate(columns):
+        raw = team_stats.get(col.stat_id)
+        if col.kind == KIND_PERCENT:
+            ratio = parse_ratio(team_stats.get(col.ratio_id)) if col.ratio_id else None
+            if ratio:
+                made[j], att[j] = ratio
+            try:
+                value[j] = float(raw)
+            except (TypeError, ValueError):
+                value[j] = made[j] / att[j] if att[j] else 0.0
+        else:
+            try:
+                value[j] = float(raw)
+            except (TypeError, ValueError):
+                value[j] = 0.0
+
+    return value, made, att
+
+
+def project_week(league_key, scoreboard, today_status=None):
+    """
+    一次算完全聯盟所有對戰的預測。
+    today_status：今天各場比賽狀態（沒給就即時抓）
+    回傳 {"week", "labels", "matchups": [...]}，每個對戰：
+    {teams: [A, B], current, projected, final (2 × k), cat_prob (k), win, tie, expected_cats}
+    """
+    snapshot = get_roster_snapshot(league_key)
+    if not snapshot:
+        return None
+
+    columns = snapshot.columns
+    labels = snapshot.labels
+    k = len(columns)
+    is_pct = snapshot.is_pct
+    sign = np.array([-1.0 if c.negative else 1.0 for c in columns])
+
+    week_end = datetime.date.fromisoformat(scoreboard["week_end"])
+    if today_status is None:
+        today_status = _today_status()
+    remaining = games_remaining(week_end, today_status=today_status)
+
+    # 每位球員剩餘場次（受傷 / 停賽的不算）
+    infos = snapshot.matrix.infos
+    games = np.array([
+        0 if (info.get("status") or "").upper() in INACTIVE_STATUS
+        else remaining.get(nba_team_code(info.get("team")), 0)
+        for info in infos
+    ], dtype=float)
+
+    X = np.nan_to_num(snapshot.matrix.values)
+    A = snapshot.matrix.attempts
+
+    # 球員預測量：計數項目 = 場均 × 場次；百分比項目 = 命中 / 出手數
+    proj_count = X * games[:, None]
+    proj_att = A * games[:, None]
+    proj_made = X * proj_att
+
+    # 隊伍 × 球員 的歸屬矩陣，一次加總全聯盟
+    team_keys = list(snapshot.teams)
+    team_index = {t: i for i, t in enumerate(team_keys)}
+    membership = np.zeros((len(team_keys), len(infos)))
+    for i, info in enumerate(infos):
+        membership[team_index[snapshot.owner[info["player_key"]]], i] = 1.0
+
+    team_count = membership @ proj_count
+    team_att = membership @ proj_att
+    team_made = membership @ proj_made
+    team_games = membership @ games
+
+    matchups = []
+    cat_probs = []
+
+    for pair in scoreboard["matchups"]:
+        sides = []
+        for team in pair:
+            t = team_index.get(team["team_key"])
+            value, made, att = _current_totals(team["stats"], columns)
+
+            if t is None:
+                p_count = np.zeros(k)
+                p_made = np.zeros(k)
+                p_att = np.zeros(k)
+                n_games = 0
+            else:
+                p_count, p_made, p_att = team_count[t], team_made[t], team_att[t]
+                n_games = int(team_games[t])
+
+            total_att = att + p_att
+            final_pct = np.divide(made + p_made, total_att, out=value.copy(), where=total_att > 0)
+            final = np.where(is_pct, final_pct, value + p_count)
+
+            # 只有剩餘場次是隨機的
+            var_count = MATCHUP_VARIANCE_FACTOR * p_count
+            var_pct = np.divide(
+                final_pct * (1 - final_pct) * p_att, total_att ** 2,
+                out=np.zeros(k), where=total_att > 0,
+            )
+            var = np.where(is_pct, var_pct, var_count)
+
+            sides.append({
+                "team_key": team["team_key"],
+                "name": team["name"],
+                "current": value,
+                "final": final,
+                "var": var,
+                "games": n_games,
+            })
+
+        diff = (sides[0]["final"] - sides[1]["final"]) * sign
+        sd = np.sqrt(sides[0]["var"] + sides[1]["var"])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = np.where(sd > 0, diff / np.where(sd > 0, sd, 1.0), np.sign(diff) * np.inf)
+        prob = np.where(np.isfinite(z), _normal_cdf(np.nan_to_num(z)),
+                        np.where(z > 0, 1.0, np.where(z < 0, 0.0, 0.5)))
+
+        matchups.append({"teams": sides, "cat_prob": prob})
+        cat_probs.append(prob)
+
+    if matchups:
+        dist = _win_distribution(np.array(cat_probs))
+        wins = np.arange(k + 1)
+        for m, d in zip(matchups, dist):
+            m["win"] = float(d[wins * 2 > k].sum())
+            m["tie"] = float(d[wins * 2 == k].sum())
+            m["expected_cats"] = float((d * wins).sum())
+
+    return {
+        "week": scoreboard["week"],
+        "week_end": scoreboard["week_end"],
+        "labels": labels,
+        "is_pct": is_pct,
+        "matchups": matchups,
+    }
+
+
+def get_week_projection(league_key):
+    """
+    取得全聯盟本週預測（快取）。
+    快取 key：週次、今天日期、今天已結束的比賽數、名單 snapshot 時間
+    → 有比賽打完或名單更新才重算。
+    """
+    from app import yahoo_get_scoreboard
+
+    status = _today_status()
+    finals = sum(1 for s in status.values() if s == GAME_FINAL)
+    today = datetime.datetime.now(NBA_TZ).date()
+
+    snapshot = get_roster_snapshot(league_key)
+    snap_at = snapshot.built_at if snapshot else None
+
+    state = _PROJECTIONS.get_or_create(league_key, _LeagueProjection)
+    with state.lock:
+        if state.key and state.key[1:] == (today, finals, snap_at):
+            return state.result
+
+        scoreboard = yahoo_get_scoreboard(league_key)
+        if not scoreboard or not scoreboard["matchups"]:
+            return state.result
+
+        started = time.monotonic()
+        result = project_week(league_key, scoreboard, status)
+        if result:
+            state.key = (scoreboard["week"], today, finals, snap_at)
+            state.result = result
+            print(f"✅ 對戰預測完成：{len(result['matchups'])} 組，"
+                  f"{(time.monotonic() - started) * 1000:.1f} ms")
+        return result
+
+
+def find_matchup(projection, team_query=None, my_team_keys=()):
+    """依隊名（部分符合）找對戰；沒給就找自己的隊伍"""
+    for m in projection["matchups"]:
+        for i, side in enumerate(m["teams"]):
+            if team_query:
+                if team_query.lower() in side["name"].lower():
+                    return m, i
+            elif side["team_key"] in my_team_keys:
+                return m, i
+    return None, None
+
+
+def _fmt(v, is_pct):
+    return f"{v:.3f}" if is_pct else f"{v:.0f}"
+
+
+def format_matchup(projection, matchup, side=0):
+    """單一對戰的各項預測（side = 要當「我方」的那一隊）"""
+    a = matchup["teams"][side]
+    b = matchup["teams"][1 - side]
+    prob = matchup["cat_prob"] if side == 0 else 1 - matchup["cat_prob"]
+    win = matchup["win"] if side == 0 else 1 - matchup["win"] - matchup["tie"]
+    k = len(projection["labels"])
+    expected = matchup["expected_cats"] if side == 0 else k - matchup["expected_cats"]
+
+    lines = [
+        f"📅 第 {projection['week']} 週對戰預測（到 {projection['week_end']}）",
+        f"{a['name']}（剩 {a['games']} 場） vs {b['name']}（剩 {b['games']} 場）",
+        "",
+    ]
+    for j, label in enumerate(projection["labels"]):
+        is_pct = projection["is_pct"][j]
+        mark = "✅" if prob[j] >= 0.6 else ("❌" if prob[j] <= 0.4 else "⚖️")
+        lines.append(
+            f"{label:<4} {_fmt(a['final'][j], is_pct)} vs {_fmt(b['final'][j], is_pct)}"
+            f"  {mark} {prob[j]:.0%}"
+        )
+
+    lines.append("")
+    lines.append(f"🏆 勝率 {win:.0%}（平手 {matchup['tie']:.0%}），預期贏 {expected:.1f} / {k} 項")
+    return "\n".join(lines)
+
+
+def format_all_matchups(projection):
+    """全聯盟每組對戰的勝率一覽"""
+    lines = [f"📅 第 {projection['week']} 週全聯盟對戰預測"]
+    for m in projection["matchups"]:
+        a, b = m["teams"]
+        lose = 1 - m["win"] - m["tie"]
+        lines.append(f"{a['name']} {m['win']:.0%} vs {lose:.0%} {b['name']}")
+    return "\n".join(lines)
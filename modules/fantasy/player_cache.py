@@ -0,0 +1,99 @@
+# modules/fantasy/player_cache.py
+
+"""
+球員資料的 TTL 快取（SQLite，key = (kind, player_key)），所有 gunicorn worker 共用。
+- kind = "season"：本季 stats（{stat_id: value}）
+- kind = "detail"：傷病狀態（{status, injury, notes_ts}）
+背景排程（modules/scheduler.py）會預先填好，指令查詢時大多直接命中。
+"""
+
+import json
+import os
+import time
+
+from modules.sqlite_utils import get_sqlite, sqlite_lock
+
+# 各類資料的有效時間（秒）
+PLAYER_CACHE_TTL = {
+    "season": int(os.getenv("PLAYER_SEASON_TTL", str(6 * 3600))),
+    "detail": int(os.getenv("PLAYER_DETAIL_TTL", "1800")),
+}
+
+_TABLE_READY = False
+
+
+def _ensure_table():
+    global _TABLE_READY
+    if _TABLE_READY:
+        return
+
+    with sqlite_lock():
+        conn = get_sqlite()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS player_cache (
+                kind       TEXT NOT NULL,
+                player_key TEXT NOT NULL,
+                data       TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (kind, player_key)
+            )
+            """
+        )
+        conn.commit()
+        _TABLE_READY = True
+
+
+def get_cached_players(kind: str, player_keys):
+    """
+    讀取還沒過期的快取。
+    回傳 {player_key: data}，沒有快取或已過期的球員不會出現。
+    """
+    player_keys = list(player_keys)
+    if not player_keys:
+        return {}
+
+    try:
+        _ensure_table()
+
+        marks = ",".join("?" * len(player_keys))
+        sql = (
+            "SELECT player_key, data FROM player_cache "
+            f"WHERE kind = ? AND fetched_at >= ? AND player_key IN ({marks})"
+        )
+        min_fetched_at = time.time() - PLAYER_CACHE_TTL[kind]
+
+        with sqlite_lock():
+            rows = get_sqlite().execute(sql, [kind, min_fetched_at] + player_keys).fetchall()
+
+        return {k: json.loads(d) for k, d in rows}
+
+    except Exception as e:
+        print("❌ 讀取球員快取失敗：", e)
+        return {}
+
+
+def get_cached_player(kind: str, player_key: str):
+    return get_cached_players(kind, [player_key]).get(player_key)
+
+
+def save_players(kind: str, data_by_key: dict):
+    """寫入快取：data_by_key = {player_key: data}"""
+    if not data_by_key:
+        return
+
+    try:
+        _ensure_table()
+        now = time.time()
+
+        with sqlite_lock():
+            conn = get_sqlite()
+            conn.executemany(
+                "INSERT OR REPLACE INTO player_cache "
+                "(kind, player_key, data, fetched_at) VALUES (?, ?, ?, ?)",
+                [(kind, k, json.dumps(d), now) for k, d in data_by_key.items()],
+            )
+            conn.commit()
+
+    except Exception as e:
+        print("❌ 寫入球員快取失敗：", e)
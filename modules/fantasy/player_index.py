@@ -0,0 +1,289 @@
+# modules/fantasy/player_index.py
+
+"""
+本機球員名字索引：
+1. 每天從 Yahoo 聯盟球員清單建一次索引（背景執行，不擋指令）。
+2. 查詢順序：全名 → 綽號 / 縮寫（SGA、KD、字母哥…）→ 唯一的姓或名 → 編輯距離模糊比對
+   （只比對開頭字母相同、長度相近的候選，而且要明顯比第二接近的球員更接近才算數）。
+3. 都找不到才回頭用 Yahoo players;search= 查詢（結果會記起來）。
+"""
+
+import contextvars
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from modules.tenants import TENANT_MAX_ENTRIES, LeagueCache
+
+# 索引多久重建一次（秒）
+PLAYER_INDEX_TTL = int(os.getenv("PLAYER_INDEX_TTL", str(24 * 3600)))
+
+# 建立失敗後至少隔多久才再試（秒）
+PLAYER_INDEX_RETRY = 300
+
+# 模糊比對：最接近的球員至少要比第二接近的少幾個編輯距離，才不會把錯字對到別人
+PLAYER_FUZZY_MARGIN = int(os.getenv("PLAYER_FUZZY_MARGIN", "2"))
+
+# 常見綽號 → 正式全名（key 會先經過 normalize_name）
+NICKNAMES = {
+    "sga": "Shai Gilgeous-Alexander",
+    "shai": "Shai Gilgeous-Alexander",
+    "giannis": "Giannis Antetokounmpo",
+    "greek freak": "Giannis Antetokounmpo",
+    "字母哥": "Giannis Antetokounmpo",
+    "kd": "Kevin Durant",
+    "lbj": "LeBron James",
+    "bron": "LeBron James",
+    "詹皇": "LeBron James",
+    "steph": "Stephen Curry",
+    "柯瑞": "Stephen Curry",
+    "咖哩": "Stephen Curry",
+    "joker": "Nikola Jokic",
+    "約基奇": "Nikola Jokic",
+    "luka": "Luka Doncic",
+    "東契奇": "Luka Doncic",
+    "dame": "Damian Lillard",
+    "ad": "Anthony Davis",
+    "ant": "Anthony Edwards",
+    "kat": "Karl-Anthony Towns",
+    "cp3": "Chris Paul",
+    "pg13": "Paul George",
+    "jjj": "Jaren Jackson Jr.",
+    "wemby": "Victor Wembanyama",
+    "溫班亞馬": "Victor Wembanyama",
+    "jimmy buckets": "Jimmy Butler III",
+    "spida": "Donovan Mitchell",
+    "trae": "Trae Young",
+    "ja": "Ja Morant",
+    "zion": "Zion Williamson",
+    "kawhi": "Kawhi Leonard",
+    "embiid": "Joel Embiid",
+    "tatum": "Jayson Tatum",
+}
+
+# 全名常見的尾碼，產生姓 / 縮寫時略過
+_SUFFIXES = {"jr", "sr", "ii", "iii", "iv"}
+
+
+def normalize_name(name: str) -> str:
+    """小寫、去掉重音符號與標點，例如 'Nikola Jokić' → 'nikola jokic'"""
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    name = name.lower().replace("-", " ")
+    name = re.sub(r"[.'’`]", "", name)
+    return " ".join(name.split())
+
+
+def edit_distance(a: str, b: str, max_dist: int) -> int:
+    """Levenshtein 距離；超過 max_dist 就提早結束並回傳 max_dist + 1"""
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(
+                prev[j] + 1,
+                cur[j - 1] + 1,
+                prev[j - 1] + (ca != cb),
+            ))
+        if min(cur) > max_dist:
+            return max_dist + 1
+        prev = cur
+
+    return prev[-1]
+
+
+def name_parts(norm: str):
+    """normalize 後的名字拆成姓 / 名（去掉 Jr.、III 等尾碼）"""
+    return [t for t in norm.split() if t not in _SUFFIXES]
+
+
+def fuzzy_match(q: str, candidates, margin: int = None):
+    """
+    candidates = [(候選字串, player)]（已經先用開頭字母篩過）。
+    容許約每 4 個字元 1 個錯字；最接近的球員要比第二接近的（不同球員）
+    至少少 margin 個編輯距離，否則視為不確定，回傳 None。
+    """
+    margin = PLAYER_FUZZY_MARGIN if margin is None else margin
+    max_dist = max(1, len(q) // 4)
+    # 第二名只需要算到 max_dist + margin 就知道差距夠不夠
+    cap = max_dist + margin
+
+    # id(player) → (最小距離, player)
+    dists = {}
+    for cand, p in candidates:
+        if abs(len(cand) - len(q)) > cap:
+            continue
+        d = edit_distance(q, cand, cap)
+        prev = dists.get(id(p))
+        if prev is None or d < prev[0]:
+            dists[id(p)] = (d, p)
+
+    ranked = sorted(dists.values(), key=lambda dp: dp[0])
+    if not ranked or ranked[0][0] > max_dist:
+        return None
+    if len(ranked) > 1 and ranked[1][0] - ranked[0][0] < margin:
+        return None
+    return ranked[0][1]
+
+
+class PlayerIndex:
+    """單一聯盟的球員名字索引"""
+
+    def __init__(self, league_key: str):
+        self.league_key = league_key
+        self.built_at = 0.0
+        self._last_attempt = 0.0
+        self._lock = threading.Lock()
+        self._building = False
+        # normalize 後的全名 → player
+        self._by_name = {}
+        # 綽號 / 縮寫 / 唯一的姓或名 → player
+        self._aliases = {}
+        # Yahoo 搜尋找到的查詢 → player（最多 TENANT_MAX_ENTRIES 筆，重建索引時清掉）
+        self._remembered = OrderedDict()
+        # 模糊比對的候選：開頭字母 → [(全名或姓 / 名, player)]
+        self._fuzzy_buckets = {}
+
+    def is_ready(self) -> bool:
+        return self.built_at > 0
+
+    def build(self, players):
+        """players = [{player_key, name, team, ...}, ...]"""
+        by_name = {}
+        token_owners = {}
+        buckets = {}
+
+        for p in players:
+            norm = normalize_name(p["name"])
+            if not norm:
+                continue
+            by_name[norm] = p
+
+            parts = name_parts(norm)
+            keys = set(parts)
+            if len(parts) >= 2:
+                # 縮寫：Shai Gilgeous-Alexander → sga
+                keys.add("".join(t[0] for t in parts))
+            for k in keys:
+                token_owners.setdefault(k, []).append(p)
+
+            for cand in {norm, *parts}:
+                buckets.setdefault(cand[0], []).append((cand, p))
+
+        # 只有唯一對應一位球員的姓 / 名 / 縮寫才當 alias
+        aliases = {k: ps[0] for k, ps in token_owners.items() if len(ps) == 1}
+
+        for nick, full in NICKNAMES.items():
+            p = by_name.get(normalize_name(full))
+            if p:
+                aliases[normalize_name(nick)] = p
+
+        with self._lock:
+            self._by_name = by_name
+            self._aliases = aliases
+            self._remembered = OrderedDict()
+            self._fuzzy_buckets = buckets
+            self.built_at = time.time()
+
+        print(f"✅ 球員索引建立完成：{self.league_key}，共 {len(by_name)} 位")
+
+    def remember(self, query: str, player):
+        """把 Yahoo 搜尋找到的結果記下來，下次同樣的查詢直接命中"""
+        key = normalize_name(query)
+        with self._lock:
+            self._remembered[key] = player
+            self._remembered.move_to_end(key)
+            while len(self._remembered) > TENANT_MAX_ENTRIES:
+                self._remembered.popitem(last=False)
+
+    def lookup(self, query: str):
+        """找不到回傳 None"""
+        q = normalize_name(query)
+        if not q:
+            return None
+
+        with self._lock:
+            by_name = self._by_name
+            aliases = self._aliases
+            remembered = self._remembered.get(q)
+            buckets = self._fuzzy_buckets
+
+        if q in by_name:
+            return by_name[q]
+        if q in aliases:
+            return aliases[q]
+        if remembered:
+            return remembered
+
+        return fuzzy_match(q, buckets.get(q[0], ()))
+
+    def needs_refresh(self) -> bool:
+        now = time.time()
+        if now - self._last_attempt < PLAYER_INDEX_RETRY:
+            return False
+        return now - self.built_at > PLAYER_INDEX_TTL
+
+    def refresh_in_background(self, load_players):
+        """背景重建索引；load_players() 回傳球員 list"""
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+            self._last_attempt = time.time()
+
+        def run():
+            try:
+                players = load_players()
+                if players:
+                    self.build(players)
+            except Exception as e:
+                print("❌ 建立球員索引失敗：", e)
+            finally:
+                with self._lock:
+                    self._building = False
+
+        # 沿用目前的 tenant（Yahoo token 依它選）
+        ctx = contextvars.copy_context()
+        threading.Thread(target=ctx.run, args=(run,), name="player-index", daemon=True).start()
+
+
+# 每個聯盟一份索引（最多 TENANT_MAX_LEAGUES 個）
+_INDEXES = LeagueCache()
+
+
+def get_player_index(league_key: str) -> PlayerIndex:
+    return _INDEXES.get_or_create(league_key, lambda: PlayerIndex(league_key))
+
+
+def _load_league_players(league_key: str):
+    """從 app.py 的 yahoo_get_league_players 呼叫"""
+    from app import yahoo_get_league_players
+    return [info for info, _ in yahoo_get_league_players(league_key)]
+
+
+def lookup_player(league_key: str, name: str):
+    """
+    用本機索引找球員，回傳 {player_key, name, team, ...} 或 None。
+    索引過期（或還沒建立）時會在背景重建，這次查詢先用舊索引。
+    """
+    index = get_player_index(league_key)
+
+    if index.needs_refresh():
+        index.refresh_in_background(lambda: _load_league_players(league_key))
+
+    if not index.is_ready():
+        return None
+
+    return index.lookup(name)
+
+
+def remember_player(league_key: str, query: str, player):
+    index = get_player_index(league_key)
+    if index.is_ready():
+        index.remember(query, player)
@@ -6,6 +6,15 @@
 統一格式化 stat。
 """
 
+from modules.fantasy.stat_schema import get_stat_schema, GP_STAT_ID
+
+
+def search_player(name):
+    """從 app.py 的 yahoo_search_player_by_name 呼叫"""
+    from app import yahoo_search_player_by_name
+    return yahoo_search_player_by_name(name)
+
+
 def get_season_stats(player_key):
     """從 app.py 的 yahoo_get_player_season_avg 呼叫"""
     from app import yahoo_get_player_season_avg
@@ -18,6 +27,12 @@ def get_recent_stats(player_key, days):
     return yahoo_get_player_stats_by_date_range(player_key, days)
 
 
+def get_recent_stats_multi(player_keys, days):
+    """從 app.py 的 yahoo_get_players_stats_by_date_range 呼叫（多位球員一起抓）"""
+    from app import yahoo_get_players_stats_by_date_range
+    return yahoo_get_players_stats_by_date_range(player_keys, days)
+
+
 # modules/fantasy/player_stats.py
 
 def format_stats_for_llm(stats_dict):
@@ -33,6 +48,28 @@ def format_stats_for_llm(stats_dict):
 
     return "\n".join(lines)
 
+def summarize_stats(stats: dict):
+    """
+    {stat_id: 值} 的 stats（本季或 N 天區間）→ 精簡的場均 summary（避免 LLM timeout）
+    依聯盟 stat schema 的順序與名稱輸出，例如：
+    出賽: 7 場
+    PTS: 25.3
+    FG%: 0.512
+    """
+    if not stats:
+        return ""
+
+    try:
+        games = float(stats.get(GP_STAT_ID)) or None
+    except (TypeError, ValueError):
+        games = None
+
+    lines = get_stat_schema().format_lines(stats, games)
+    if games:
+        lines.insert(0, f"出賽: {games:g} 場")
+    return "\n".join(lines)
+
+
 def format_injury_status(raw_detail):
     """
     將 Yahoo API 回傳的傷病資料格式化成固定模板。
@@ -0,0 +1,62 @@
+# modules/fantasy/prefetch.py
+
+"""
+背景預先抓取（由 modules/scheduler.py 排程執行）：
+聯盟內所有被選走的球員 + 前 PREFETCH_FA_COUNT 名自由球員的
+1. 本季 stats、傷病狀態 → player_cache（SQLite，TTL）
+2. 最近 PREFETCH_DAYS 天的每日 stats → stats_cache（已打完的日期永久保存）
+使用者下指令時大多直接讀到熱資料，不用等 Yahoo。
+"""
+
+import datetime
+import os
+
+from modules.fantasy.stats_cache import NBA_TZ
+from modules.tenants import current_league_key
+
+# 固定多久跑一次（秒）；另外每當今天又有比賽打完也會提早跑（至少隔 PREFETCH_MIN_GAP 秒）
+PREFETCH_INTERVAL = int(os.getenv("PREFETCH_INTERVAL", str(3 * 3600)))
+PREFETCH_MIN_GAP = int(os.getenv("PREFETCH_MIN_GAP", "900"))
+
+PREFETCH_FA_COUNT = int(os.getenv("PREFETCH_FA_COUNT", "25"))
+PREFETCH_DAYS = int(os.getenv("PREFETCH_DAYS", "14"))
+
+
+def finals_token():
+    """'日期:今天已結束的比賽數'，有比賽打完就會變（排程 trigger 用）"""
+    from app import get_nba_today_games, NBA_GAME_FINAL
+
+    finals = sum(1 for g in get_nba_today_games() if g.get("gameStatus") == NBA_GAME_FINAL)
+    return f"{datetime.datetime.now(NBA_TZ).date()}:{finals}"
+
+
+def prefetch_league_players(league_key=None):
+    """抓聯盟內被選走的球員 + 前幾名 FA 的 stats 與傷病，寫進本機快取"""
+    from app import (
+        yahoo_get_league_rosters,
+        yahoo_get_fa_list,
+        yahoo_get_players_season_stats,
+        yahoo_get_players_detail,
+        yahoo_get_players_stats_by_date_range,
+    )
+
+    league_key = league_key or current_league_key()
+    if not league_key:
+        return
+
+    keys = []
+    for team in yahoo_get_league_rosters(league_key).values():
+        keys.extend(p["player_key"] for p in team["players"])
+    keys.extend(p["player_key"] for p in yahoo_get_fa_list(league_key, count=PREFETCH_FA_COUNT))
+    keys = list(dict.fromkeys(keys))
+
+    if not keys:
+        print("⚠️ 預先抓取：沒有任何球員")
+        return
+
+    # refresh=True：不管快取，重抓最新的並寫回快取；每日 stats 只補抓今天與還沒存過的日期
+    season = yahoo_get_players_season_stats(keys, refresh=True)
+    detail = yahoo_get_players_detail(keys, refresh=True)
+    yahoo_get_players_stats_by_date_range(keys, days=PREFETCH_DAYS)
+
+    print(f"✅ 預先抓取完成：{len(keys)} 位球員（season {len(season)}、detail {len(detail)}）")
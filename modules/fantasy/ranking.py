@@ -0,0 +1,365 @@
+# modules/fantasy/ranking.py
+
+"""
+聯盟 z-score 排名引擎：
+1. 抓聯盟前 RANKING_POOL_SIZE 位球員的本季 / 最近一週 stats，轉成 NumPy 欄位陣列（球員 × 項目）。
+2. 計數項目直接算 z-score；FG% / FT% 依出手數加權（(命中率 - 聯盟命中率) × 出手數 再標準化）；TO 反向。
+3. 一次矩陣乘法同時算出總價值與各種 punt（放棄某一項）版本。
+排名是固定、可重現的，LLM 只負責解釋排好的結果。
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+from modules.tenants import LeagueCache, current_league_key
+from modules.fantasy.stat_schema import (
+    get_stat_schema,
+    parse_ratio,
+    GP_STAT_ID,
+    KIND_PERCENT,
+    KIND_RATIO,
+)
+
+# 每個時段抓聯盟前幾名球員當母體
+RANKING_POOL_SIZE = int(os.getenv("RANKING_POOL_SIZE", "300"))
+
+# 平均 / 標準差只用前幾名計算（大約是全聯盟會被選走的人數，例如 12 隊 × 13 人）
+RANKING_BASELINE_SIZE = int(os.getenv("RANKING_BASELINE_SIZE", "156"))
+
+# 母體多久重新抓一次（秒）
+RANKING_TTL = int(os.getenv("RANKING_TTL", str(6 * 3600)))
+
+# 抓取失敗後多久再試（秒）
+RANKING_RETRY = 300
+
+# 使用者輸入的項目名稱 → 顯示名稱
+CATEGORY_ALIASES = {
+    "pts": "PTS",
+    "reb": "REB",
+    "ast": "AST",
+    "stl": "STL",
+    "st": "STL",
+    "blk": "BLK",
+    "fg": "FG%",
+    "fg%": "FG%",
+    "ft": "FT%",
+    "ft%": "FT%",
+    "3pm": "3PTM",
+    "3ptm": "3PTM",
+    "3pt": "3PTM",
+    "3": "3PTM",
+    "3pt%": "3PT%",
+    "to": "TO",
+    "tov": "TO",
+}
+
+# 指定重點項目時的權重
+FOCUS_WEIGHT = 2.0
+
+
+def _to_float(raw):
+    try:
+        return float(str(raw).replace("%", ""))
+    except (TypeError, ValueError):
+        return None
+
+
+def scoring_columns(schema=None):
+    """參與排名的項目（比值欄位只用來加權，不單獨計分）"""
+    schema = schema or get_stat_schema()
+    return [c for c in schema.columns if c.kind != KIND_RATIO]
+
+
+class StatMatrix:
+    """
+    球員 × 項目的欄位陣列
+    - values：計數項目為場均（沒有出賽場數就是總和），百分比項目為命中率；缺值為 nan
+    - attempts：百分比項目的場均出手數（沒有比值欄位就是 0）
+    """
+
+    def __init__(self, infos, values, attempts):
+        self.infos = infos
+        self.values = values
+        self.attempts = attempts
+
+    def __len__(self):
+        return len(self.infos)
+
+    @classmethod
+    def build(cls, rows, columns):
+        """rows = [(info, {stat_id: value}), ...]；沒有 stats 或出賽 0 場的球員略過"""
+        infos = []
+        values = []
+        attempts = []
+
+        for info, stats in rows:
+            if not stats:
+                continue
+
+            gp = _to_float(stats.get(GP_STAT_ID))
+            if gp == 0:
+                continue
+            scale = gp or 1.0
+
+            row_v = []
+            row_a = []
+            for col in columns:
+                v = np.nan
+                a = 0.0
+
+                if col.kind == KIND_PERCENT:
+                    ratio = parse_ratio(stats.get(col.ratio_id)) if col.ratio_id else None
+                    if ratio and ratio[1] > 0:
+                        v = ratio[0] / ratio[1]
+                        a = ratio[1] / scale
+                    elif not col.ratio_id:
+                        pct = _to_float(stats.get(col.stat_id))
+                        if pct is not None:
+                            v = pct / 100 if pct > 1 else pct
+                else:
+                    x = _to_float(stats.get(col.stat_id))
+                    if x is not None:
+                        v = x / scale
+
+                row_v.append(v)
+                row_a.append(a)
+
+            if all(np.isnan(v) for v in row_v):
+                continue
+
+            infos.append(info)
+            values.append(row_v)
+            attempts.append(row_a)
+
+        k = len(columns)
+        return cls(
+            infos,
+            np.array(values, dtype=float).reshape(-1, k),
+            np.array(attempts, dtype=float).reshape(-1, k),
+        )
+
+
+class Baseline:
+    """母體的平均、標準差與聯盟命中率；用來把任何球員的 stats 換算成 z-score"""
+
+    def __init__(self, columns, mean, std, league_pct):
+        self.columns = columns
+        self.labels = [c.label for c in columns]
+        self.mean = mean
+        self.std = std
+        self.league_pct = league_pct
+        # 有比值欄位的百分比項目才依出手數加權
+        self.weighted = np.array(
+            [c.kind == KIND_PERCENT and c.ratio_id is not None for c in columns]
+        )
+        self.sign = np.array([-1.0 if c.negative else 1.0 for c in columns])
+
+    def _impact(self, X, A, league_pct):
+        return np.where(self.weighted, A * (X - league_pct), X)
+
+    @classmethod
+    def _fit_rows(cls, columns, X, A):
+        k = len(columns)
+        if len(X) == 0:
+            return cls(columns, np.zeros(k), np.ones(k), np.zeros(k))
+
+        valid = ~np.isnan(X)
+        made = np.where(valid, X * A, 0.0).sum(axis=0)
+        att = np.where(valid, A, 0.0).sum(axis=0)
+        league_pct = np.divide(made, att, out=np.zeros(k), where=att > 0)
+
+        base = cls(columns, np.zeros(k), np.ones(k), league_pct)
+        impact = np.where(valid, base._impact(X, A, league_pct), 0.0)
+
+        n = np.maximum(valid.sum(axis=0), 1)
+        mean = impact.sum(axis=0) / n
+        var = (np.where(valid, impact - mean, 0.0) ** 2).sum(axis=0) / n
+        std = np.sqrt(var)
+        std[std == 0] = 1.0
+
+        base.mean = mean
+        base.std = std
+        return base
+
+    @classmethod
+    def fit(cls, matrix: StatMatrix, columns, size=RANKING_BASELINE_SIZE):
+        """先用全部球員算一次，取總價值前 size 名再算一次（避免被板凳球員拉低平均）"""
+        X, A = matrix.values, matrix.attempts
+        first = cls._fit_rows(columns, X, A)
+        if len(X) <= size:
+            return first
+
+        top = np.argsort(-first.zscores(matrix).sum(axis=1))[:size]
+        return cls._fit_rows(columns, X[top], A[top])
+
+    def zscores(self, matrix: StatMatrix):
+        """回傳 (球員數, 項目數) 的 z-score；TO 已反向，缺值視為 0"""
+        impact = self._impact(matrix.values, matrix.attempts, self.league_pct)
+        Z = (impact - self.mean) / self.std * self.sign
+        return np.nan_to_num(Z)
+
+
+def variant_weights(labels, focus=(), punt=()):
+    """
+    回傳 (版本名稱 list, 權重矩陣 (版本數 × 項目數))：
+    第一列是依 focus / punt 調整後的主要版本，接著是「全項目」與每一項的 punt 版本。
+    """
+    k = len(labels)
+    main = np.ones(k)
+    for i, label in enumerate(labels):
+        if label in focus:
+            main[i] = FOCUS_WEIGHT
+        if label in punt:
+            main[i] = 0.0
+
+    punts = np.ones((k, k)) - np.eye(k)
+
+    names = ["main", "all"] + [f"punt {label}" for label in labels]
+    return names, np.vstack([main, np.ones(k), punts])
+
+
+def parse_category_args(tokens, labels=None):
+    """
+    使用者輸入的項目，例如 ['reb', 'ast', 'punt', 'to']
+    回傳 (focus, punt)：重點項目與放棄項目的顯示名稱
+    """
+    labels = set(labels or [c.label for c in scoring_columns()])
+    focus = []
+    punt = []
+
+    punting = False
+    for t in tokens:
+        t = t.strip().lower()
+        if t in ("punt", "放棄"):
+            punting = True
+            continue
+        label = CATEGORY_ALIASES.get(t)
+        if label and label in labels:
+            (punt if punting else focus).append(label)
+        punting = False
+
+    return focus, punt
+
+
+class _LeaguePools:
+    """單一聯盟各 period 的母體；鎖只擋同一個聯盟的重抓"""
+
+    def __init__(self):
+        # {period: {"baseline", "matrix", "built_at"}}
+        self.pools = {}
+        self.last_attempt = {}
+        self.lock = threading.Lock()
+
+
+# {league_key: _LeaguePools}
+_POOLS = LeagueCache()
+
+
+def _load_pool_rows(league_key, period):
+    """從 app.py 的 yahoo_get_top_players 呼叫"""
+    from app import yahoo_get_top_players
+    return yahoo_get_top_players(league_key, RANKING_POOL_SIZE, stats_type=period)
+
+
+def get_pool(league_key, period="season"):
+    """
+    取得聯盟母體（StatMatrix + Baseline），RANKING_TTL 內直接用記憶體裡的。
+    抓不到就回傳舊的（或 None，呼叫端再改用自己的球員當母體）。
+    """
+    columns = scoring_columns(get_stat_schema(league_key))
+    labels = [c.label for c in columns]
+
+    def usable(pool):
+        return (
+            pool is not None
+            and pool["baseline"].labels == labels
+            and time.time() - pool["built_at"] < RANKING_TTL
+        )
+
+    state = _POOLS.get_or_create(league_key, _LeaguePools)
+    pool = state.pools.get(period)
+    if usable(pool):
+        return pool
+
+    with state.lock:
+        pool = state.pools.get(period)
+        if usable(pool):
+            return pool
+        if time.time() - state.last_attempt.get(period, 0) < RANKING_RETRY:
+            return pool
+
+        state.last_attempt[period] = time.time()
+        try:
+            rows = _load_pool_rows(league_key, period)
+        except Exception as e:
+            print("❌ 抓取排名母體失敗：", e)
+            rows = []
+
+        matrix = StatMatrix.build(rows, columns)
+        if len(matrix) == 0:
+            return pool
+
+        started = time.monotonic()
+        pool = {
+            "matrix": matrix,
+            "baseline": Baseline.fit(matrix, columns),
+            "built_at": time.time(),
+        }
+        state.pools[period] = pool
+        print(f"✅ 排名母體建立完成：{league_key} {period}，{len(matrix)} 位，"
+              f"{(time.monotonic() - started) * 1000:.1f} ms")
+        return pool
+
+
+def rank_players(rows, period="season", focus=(), punt=(), league_key=None):
+    """
+    依聯盟母體把 rows = [(info, stats), ...] 換算成 z-score 並排名（由高到低）。
+    每位球員回傳 {**info, "value", "values": {版本: 總值}, "z": {項目: z}}
+    """
+    league_key = league_key or current_league_key()
+    columns = scoring_columns(get_stat_schema(league_key))
+    labels = [c.label for c in columns]
+
+    matrix = StatMatrix.build(rows, columns)
+    if len(matrix) == 0:
+        return []
+
+    pool = get_pool(league_key, period) if league_key else None
+    baseline = pool["baseline"] if pool else Baseline.fit(matrix, columns)
+
+    Z = baseline.zscores(matrix)
+    names, W = variant_weights(labels, focus, punt)
+    totals = Z @ W.T
+
+    order = np.argsort(-totals[:, 0], kind="stable")
+
+    result = []
+    for i in order:
+        result.append(dict(
+            matrix.infos[i],
+            value=round(float(totals[i, 0]), 2),
+            values={name: round(float(totals[i, j]), 2) for j, name in enumerate(names)},
+            z={label: round(float(Z[i, j]), 2) for j, label in enumerate(labels)},
+        ))
+    return result
+
+
+def pool_rank(value, league_key=None, period="season"):
+    """總價值 value 在聯盟母體中相當於第幾名（母體抓不到回傳 None）"""
+    pool = get_pool(league_key or current_league_key(), period)
+    if not pool:
+        return None
+
+    totals = pool["baseline"].zscores(pool["matrix"]).sum(axis=1)
+    return int((totals > value).sum()) + 1
+
+
+def format_z_line(entry, limit=None):
+    """'PTS +1.2 / REB -0.3 / ...'；limit 只列出絕對值最大的幾項"""
+    items = list(entry["z"].items())
+    if limit:
+        items = sorted(items, key=lambda kv: -abs(kv[1]))[:limit]
+    return " / ".join(f"{label} {z:+.1f}" for label, z in items)
@@ -0,0 +1,297 @@
+# modules/fantasy/stat_schema.py
+
+"""
+聯盟 stat 設定編譯成的 schema：
+1. 從 league settings 建一次：依顯示順序排好的 stat_id、類型（計數 / 百分比 / 比值）、顯示名稱。
+2. 所有格式化（!player、!last14 / !value 的 summary 等）都用同一份 schema，一次掃過就輸出。
+3. 每 STAT_SCHEMA_TTL 秒重新讀一次聯盟設定；讀取失敗時沿用舊的 schema，
+   還沒成功讀過就先用 Yahoo NBA 預設 stat_id，過 STAT_SCHEMA_RETRY 秒再試。
+4. 每個聯盟各一份（多聯盟時依目前 tenant 的聯盟取用）。
+"""
+
+import os
+import threading
+import time
+
+from modules.tenants import LeagueCache, current_league_key
+
+# 多久重新讀一次 league settings（秒）
+STAT_SCHEMA_TTL = int(os.getenv("STAT_SCHEMA_TTL", str(6 * 3600)))
+
+# 讀取失敗後多久再試（秒）
+STAT_SCHEMA_RETRY = 60
+
+KIND_COUNTING = "counting"
+KIND_PERCENT = "percent"
+KIND_RATIO = "ratio"
+
+# 想要顯示的欄位（用來排順序）
+DESIRED_LABELS = [
+    "PTS",   # 得分
+    "REB",   # 籃板
+    "AST",   # 助攻
+    "STL",   # 抄截
+    "BLK",   # 火鍋
+    "FG%",   # 命中率
+    "FT%",   # 罰球命中率
+    "3PTM",  # 場均三分命中數
+    "3PT%",  # 三分命中率
+    "TO",    # 失誤
+]
+
+# 各項目可能在 Yahoo 裡的名稱（有些聯盟會用 ST / STL 或 3PTM / 3PM 等）
+LABEL_CANDIDATES = {
+    "PTS":  ["PTS"],
+    "REB":  ["REB"],
+    "AST":  ["AST"],
+    "STL":  ["ST", "STL"],
+    "BLK":  ["BLK"],
+    "FG%":  ["FG%", "FG PCT"],
+    "FT%":  ["FT%", "FT PCT"],
+    "3PTM": ["3PTM", "3PM", "3-PTM"],
+    "3PT%": ["3PT%", "3P%", "3-PT%"],
+    "TO":   ["TO", "TOV", "TURNOVERS"],
+}
+
+# 讀不到聯盟設定時使用的 Yahoo NBA 預設 stat_id
+DEFAULT_STAT_IDS = {
+    "PTS": "12",
+    "REB": "15",
+    "AST": "16",
+    "STL": "17",
+    "BLK": "18",
+    "FG%": "5",
+    "FT%": "8",
+    "3PTM": "10",
+    "3PT%": "11",
+    "TO": "19",
+    "FGM/FGA": "9004003",
+    "FTM/FTA": "9007006",
+}
+
+# 百分比項目對應的「命中 / 出手」比值欄位（算命中率時用來依出手數加權）
+RATIO_CANDIDATES = {
+    "FG%":  ["FGM/FGA"],
+    "FT%":  ["FTM/FTA"],
+    "3PT%": ["3PTM/3PTA", "3PM/3PA"],
+}
+
+# 數值越低越好的項目
+NEGATIVE_LABELS = {"TO"}
+
+# 出賽場數
+GP_STAT_ID = "0"
+
+
+def stat_kind(label: str) -> str:
+    """由顯示名稱判斷類型：FG% → 百分比、FGM/FGA → 比值、其他 → 計數"""
+    if label.endswith("%") or label.endswith("PCT"):
+        return KIND_PERCENT
+    if "/" in label:
+        return KIND_RATIO
+    return KIND_COUNTING
+
+
+def parse_ratio(raw):
+    """'312/650' → (312.0, 650.0)；格式不對回傳 None"""
+    try:
+        made, att = str(raw).split("/")
+        return float(made), float(att)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(raw):
+    if isinstance(raw, str):
+        raw = raw.replace("%", "")
+    return float(raw)
+
+
+class StatColumn:
+    __slots__ = ("label", "stat_id", "kind", "ratio_id", "negative")
+
+    def __init__(self, label: str, stat_id: str, kind: str, ratio_id=None):
+        self.label = label
+        self.stat_id = stat_id
+        self.kind = kind
+        # 百分比項目的「命中 / 出手」欄位（聯盟沒有就是 None）
+        self.ratio_id = ratio_id
+        self.negative = label in NEGATIVE_LABELS
+
+    def format_value(self, raw, games=None) -> str:
+        """計數型有 games 就換算成場均；百分比一律用 0.XXX 顯示"""
+        if self.kind == KIND_RATIO:
+            return str(raw)
+
+        v = _to_float(raw)
+
+        if self.kind == KIND_PERCENT:
+            # 如果 Yahoo 給的是 47.1 就除以 100；如果本來就是 0.471 就直接用
+            if v > 1:
+                v = v / 100
+            return f"{v:.3f}"
+
+        if games and games > 0:
+            v = v / games
+        return f"{v:.1f}"
+
+    def __repr__(self):
+        return f"StatColumn({self.label!r}, {self.stat_id!r}, {self.kind!r})"
+
+
+class StatSchema:
+    """依顯示順序排好的 stat 欄位"""
+
+    def __init__(self, columns, label_map=None):
+        self.columns = list(columns)
+        # 聯盟設定原始的 display_name -> stat_id（給其他模組查詢用）
+        self.label_map = dict(label_map or {})
+        self.by_label = {c.label: c for c in self.columns}
+
+    @classmethod
+    def compile(cls, label_map: dict):
+        """label_map = {display_name: stat_id}，依 DESIRED_LABELS 排好順序"""
+        def find(candidates):
+            for cand in candidates:
+                if cand in label_map:
+                    return str(label_map[cand])
+            return None
+
+        columns = []
+        for label in DESIRED_LABELS:
+            stat_id = find(LABEL_CANDIDATES.get(label, [label]))
+            if stat_id:
+                ratio_id = find(RATIO_CANDIDATES.get(label, []))
+                columns.append(StatColumn(label, stat_id, stat_kind(label), ratio_id))
+        return cls(columns, label_map)
+
+    @classmethod
+    def default(cls):
+        return cls.compile(DEFAULT_STAT_IDS)
+
+    def stat_id(self, label: str):
+        col = self.by_label.get(label)
+        return col.stat_id if col else None
+
+    def format_lines(self, stats: dict, games=None):
+        """stats = {stat_id: 值}；回傳 ["PTS: 25.3", ...]，缺的欄位略過"""
+        lines = []
+        for col in self.columns:
+            raw = stats.get(col.stat_id)
+            if raw is None or raw == "":
+                continue
+            try:
+                lines.append(f"{col.label}: {col.format_value(raw, games)}")
+            except (TypeError, ValueError):
+                # 偶爾會是字串，直接顯示
+                lines.append(f"{col.label}: {raw}")
+        return lines
+
+    def combine_days(self, days):
+        """
+        多天的單日 stats（[{stat_id: 值}, ...]）合成和 Yahoo 本季 / lastweek 同格式的區間 stats：
+        - 計數項目相加，出賽天數記在 GP_STAT_ID（單日有數據就算出賽一場），之後依場數換算場均
+        - 比值欄位（"FGM/FGA"）分子分母各自相加；百分比項目用加總後的比值重算。
+          聯盟沒有比值欄位時單日命中率無法正確合併，直接略過
+        整段都沒出賽回傳 {}
+        """
+        percent_ids = {c.stat_id: c.ratio_id for c in self.columns if c.kind == KIND_PERCENT}
+
+        total = {}
+        ratios = {}
+        games = 0.0
+
+        for day in days:
+            if not day:
+                continue
+
+            try:
+                games += float(day.get(GP_STAT_ID, 1))
+            except (TypeError, ValueError):
+                games += 1
+
+            for stat_id, raw in day.items():
+                if stat_id == GP_STAT_ID or stat_id in percent_ids:
+                    continue
+                ratio = parse_ratio(raw) if isinstance(raw, str) and "/" in raw else None
+                if ratio:
+                    made, att = ratios.get(stat_id, (0.0, 0.0))
+                    ratios[stat_id] = (made + ratio[0], att + ratio[1])
+                    continue
+                try:
+                    total[stat_id] = total.get(stat_id, 0) + _to_float(raw)
+                except (TypeError, ValueError):
+                    continue
+
+        if not games:
+            return {}
+
+        for stat_id, (made, att) in ratios.items():
+            total[stat_id] = f"{made:g}/{att:g}"
+        for stat_id, ratio_id in percent_ids.items():
+            made, att = ratios.get(ratio_id, (0.0, 0.0))
+            if att > 0:
+                total[stat_id] = round(made / att, 3)
+
+        total[GP_STAT_ID] = games
+        return total
+
+
+class _LeagueSchema:
+    """單一聯盟的 schema 與讀取時間"""
+
+    def __init__(self):
+        self.schema = None
+        self.loaded_at = 0.0
+        self.last_attempt = 0.0
+        self.lock = threading.Lock()
+
+
+# {league_key: _LeagueSchema}（每個聯盟的 stat 設定可能不同）
+_SCHEMAS = LeagueCache()
+
+
+def _load_label_map(league_key):
+    """從 app.py 的 yahoo_get_league_stat_categories 呼叫"""
+    from app import yahoo_get_league_stat_categories
+    return yahoo_get_league_stat_categories(league_key)
+
+
+def get_stat_schema(league_key=None) -> StatSchema:
+    """
+    取得聯盟（預設為目前 tenant 的聯盟）的 stat schema。
+    過期就重新讀 league settings；失敗時回傳舊的（或預設的）schema，稍後再試。
+    """
+    league_key = league_key or current_league_key()
+    if not league_key:
+        return StatSchema.default()
+
+    state = _SCHEMAS.get_or_create(league_key, _LeagueSchema)
+
+    now = time.time()
+    schema = state.schema
+    if schema is not None and now - state.loaded_at < STAT_SCHEMA_TTL:
+        return schema
+
+    with state.lock:
+        now = time.time()
+        if state.schema is not None and now - state.loaded_at < STAT_SCHEMA_TTL:
+            return state.schema
+        if now - state.last_attempt < STAT_SCHEMA_RETRY:
+            return state.schema or StatSchema.default()
+
+        state.last_attempt = now
+        try:
+            label_map = _load_label_map(league_key)
+        except Exception as e:
+            print("❌ 讀取 league stat 設定失敗：", e)
+            label_map = None
+
+        if not label_map:
+            return state.schema or StatSchema.default()
+
+        if state.schema is None or state.schema.label_map != label_map:
+            state.schema = StatSchema.compile(label_map)
+            print(f"✅ 已載入 league stat 設定（{league_key}）：", state.schema.columns)
+        state.loaded_at = now
+        return state.schema
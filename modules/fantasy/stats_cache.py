@@ -0,0 +1,104 @@
+# modules/fantasy/stats_cache.py
+
+"""
+球員每日 stats 的本機快取（SQLite，key = (player_key, date)）。
+已經打完的日期數據不會再變，存起來之後 7 / 14 天的區間
+只需要向 Yahoo 補抓今天和還沒看過的日期。
+"""
+
+import datetime
+import json
+import time
+from zoneinfo import ZoneInfo
+
+from modules.sqlite_utils import get_sqlite, sqlite_lock
+
+# Yahoo 的比賽日期以美東時間為準
+NBA_TZ = ZoneInfo("America/New_York")
+
+# 美東隔天早上 6 點之後，前一天的比賽才視為全部結束
+FINAL_AFTER_HOURS = 6
+
+_TABLE_READY = False
+
+
+def _ensure_table():
+    global _TABLE_READY
+    if _TABLE_READY:
+        return
+
+    with sqlite_lock():
+        conn = get_sqlite()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS player_daily_stats (
+                player_key TEXT NOT NULL,
+                date       TEXT NOT NULL,
+                stats      TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (player_key, date)
+            )
+            """
+        )
+        conn.commit()
+        _TABLE_READY = True
+
+
+def is_final_date(date_str: str) -> bool:
+    """該日期的比賽是否都已結束（結束後的數據才可以永久快取）"""
+    now = datetime.datetime.now(NBA_TZ) - datetime.timedelta(hours=FINAL_AFTER_HOURS)
+    return date_str < now.date().strftime("%Y-%m-%d")
+
+
+def get_cached_days(player_keys, dates):
+    """
+    讀取快取中的每日 stats。
+    回傳 {(player_key, date): {stat_id: value}}，沒有快取的組合不會出現。
+    """
+    if not player_keys or not dates:
+        return {}
+
+    try:
+        _ensure_table()
+
+        key_marks = ",".join("?" * len(player_keys))
+        date_marks = ",".join("?" * len(dates))
+        sql = (
+            "SELECT player_key, date, stats FROM player_daily_stats "
+            f"WHERE player_key IN ({key_marks}) AND date IN ({date_marks})"
+        )
+
+        with sqlite_lock():
+            rows = get_sqlite().execute(sql, list(player_keys) + list(dates)).fetchall()
+
+        return {(k, d): json.loads(s) for k, d, s in rows}
+
+    except Exception as e:
+        print("❌ 讀取 stats 快取失敗：", e)
+        return {}
+
+
+def save_days(rows):
+    """
+    寫入每日 stats。rows = [(player_key, date, {stat_id: value}), ...]
+    沒有比賽的日子也要存（空 dict），下次才不會再抓一次。
+    """
+    rows = list(rows)
+    if not rows:
+        return
+
+    try:
+        _ensure_table()
+        now = time.time()
+
+        with sqlite_lock():
+            conn = get_sqlite()
+            conn.executemany(
+                "INSERT OR REPLACE INTO player_daily_stats "
+                "(player_key, date, stats, fetched_at) VALUES (?, ?, ?, ?)",
+                [(k, d, json.dumps(stats), now) for k, d, stats in rows],
+            )
+            conn.commit()
+
+    except Exception as e:
+        print("❌ 寫入 stats 快取失敗：", e)
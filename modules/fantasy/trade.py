@@ -0,0 +1,246 @@
+# modules/fantasy/trade.py
+
+"""
+N-for-M 交易引擎：
+1. 抓整個聯盟的隊伍名單與所有被選走球員的本季 stats（roster snapshot，快取 TRADE_SNAPSHOT_TTL 秒）。
+2. 依聯盟的 stat 項目算出兩隊交易前 / 後的「每場合計」（百分比依出手數加權）。
+3. 回傳各項數值變化與 z-score 總值變化，再交給 LLM 評論。
+同一份 snapshot 內試不同交易組合只需要重新加總，不用再打 Yahoo。
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from modules.fantasy.ranking import Baseline, StatMatrix, scoring_columns
+from modules.fantasy.stat_schema import KIND_PERCENT, get_stat_schema
+from modules.tenants import TENANT_MAX_ENTRIES, LeagueCache
+
+# roster snapshot 多久重新抓一次（秒）
+TRADE_SNAPSHOT_TTL = int(os.getenv("TRADE_SNAPSHOT_TTL", "600"))
+
+# 交易雙方的分隔，例如 "Curry, Green for Tatum" / "Curry + Green ↔ Tatum"
+# 分隔字在最後（'Curry for'）也算，換回的那邊是空的 → 格式不對
+_SIDES = re.compile(r"\s+(?:for|換)(?:\s+|$)|\s*(?:<->|<>|↔|=>|->)\s*", re.IGNORECASE)
+
+# 同一邊多位球員的分隔
+_PLAYERS = re.compile(r"\s*[,，、+]\s*")
+
+
+class TradeError(ValueError):
+    """交易組合不合法（球員不在名單上、同一隊互換等），訊息可直接回覆給使用者"""
+
+
+def parse_trade_argument(argument: str):
+    """
+    'Curry, Green for Tatum' → (['Curry', 'Green'], ['Tatum'])
+    沒有分隔字就沿用舊格式 'Curry Lillard'（1 換 1）；格式不對回傳 None
+    """
+    argument = (argument or "").strip()
+    if not argument:
+        return None
+
+    sides = _SIDES.split(argument, maxsplit=1)
+    if len(sides) == 2:
+        give = [n for n in _PLAYERS.split(sides[0]) if n]
+        get = [n for n in _PLAYERS.split(sides[1]) if n]
+    else:
+        parts = argument.split(" ", 1)
+        if len(parts) != 2:
+            return None
+        give, get = [parts[0]], [parts[1]]
+
+    if not give or not get:
+        return None
+    return give, get
+
+
+class RosterSnapshot:
+    """某個時間點的全聯盟名單 + 球員 stats 陣列"""
+
+    def __init__(self, league_key, teams, stats):
+        self.league_key = league_key
+        self.teams = teams
+        # {player_key: 本季 stats}（!trade 給 LLM 的數據直接用這份，不用再逐一抓）
+        self.stats = stats
+        self.built_at = time.time()
+        self.columns = scoring_columns(get_stat_schema(league_key))
+        self.labels = [c.label for c in self.columns]
+
+        self.owner = {}
+        rows = []
+        for team_key, team in teams.items():
+            for info in team["players"]:
+                self.owner[info["player_key"]] = team_key
+                rows.append((info, stats.get(info["player_key"])))
+
+        self.matrix = StatMatrix.build(rows, self.columns)
+        self.row_of = {info["player_key"]: i for i, info in enumerate(self.matrix.infos)}
+
+        # 被選走的球員本身就是最適合的 z-score 母體
+        self.baseline = Baseline.fit(self.matrix, self.columns, size=len(self.matrix))
+        self.player_values = self.baseline.zscores(self.matrix).sum(axis=1)
+
+        self.is_pct = np.array([c.kind == KIND_PERCENT for c in self.columns])
+
+        # 同一份 snapshot 內的試算結果：{(give, get): result}，最多 TENANT_MAX_ENTRIES 筆
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def team_totals(self, player_keys):
+        """每場合計：計數項目相加，百分比 = 總命中 / 總出手（沒有出手數就取平均）"""
+        idx = [self.row_of[k] for k in player_keys if k in self.row_of]
+        k = len(self.columns)
+        if not idx:
+            return np.zeros(k)
+
+        X = self.matrix.values[idx]
+        A = self.matrix.attempts[idx]
+        valid = ~np.isnan(X)
+
+        counting = np.where(valid, X, 0.0).sum(axis=0)
+        made = np.where(valid, X * A, 0.0).sum(axis=0)
+        att = np.where(valid, A, 0.0).sum(axis=0)
+        n = np.maximum(valid.sum(axis=0), 1)
+        pct = np.where(att > 0, made / np.where(att > 0, att, 1.0), counting / n)
+
+        return np.where(self.is_pct, pct, counting)
+
+    def _value(self, player_keys):
+        return float(sum(self.player_values[self.row_of[k]] for k in player_keys if k in self.row_of))
+
+    def evaluate(self, give_keys, get_keys):
+        """
+        give_keys：A 隊送出的球員；get_keys：從 B 隊換回的球員
+        回傳 {"teams": [A 隊結果, B 隊結果], "labels": [...]}，
+        每隊結果 = {team_key, name, before, after, delta, value_out, value_in}
+        """
+        cache_key = (tuple(sorted(give_keys)), tuple(sorted(get_keys)))
+        with self._lock:
+            if cache_key in self._results:
+                self._results.move_to_end(cache_key)
+                return self._results[cache_key]
+
+        if set(give_keys) & set(get_keys):
+            raise TradeError("同一位球員不能同時出現在交易兩邊")
+
+        for k in list(give_keys) + list(get_keys):
+            if k not in self.owner:
+                raise TradeError("有球員不在任何隊伍名單中（自由球員請用 !fa）")
+
+        team_a = {self.owner[k] for k in give_keys}
+        team_b = {self.owner[k] for k in get_keys}
+        if len(team_a) != 1 or len(team_b) != 1:
+            raise TradeError("同一邊的球員必須來自同一隊")
+        team_a, team_b = team_a.pop(), team_b.pop()
+        if team_a == team_b:
+            raise TradeError("交易雙方是同一隊")
+
+        sides = []
+        for team_key, out_keys, in_keys in (
+            (team_a, give_keys, get_keys),
+            (team_b, get_keys, give_keys),
+        ):
+            roster = [p["player_key"] for p in self.teams[team_key]["players"]]
+            after_roster = [k for k in roster if k not in out_keys] + list(in_keys)
+
+            before = self.team_totals(roster)
+            after = self.team_totals(after_roster)
+            sides.append({
+                "team_key": team_key,
+                "name": self.teams[team_key]["name"],
+                "before": before,
+                "after": after,
+                "delta": after - before,
+                "value_out": self._value(out_keys),
+                "value_in": self._value(in_keys),
+            })
+
+        result = {"teams": sides, "labels": self.labels, "is_pct": self.is_pct}
+        with self._lock:
+            self._results[cache_key] = result
+            while len(self._results) > TENANT_MAX_ENTRIES:
+                self._results.popitem(last=False)
+        return result
+
+
+class _LeagueSnapshot:
+    """單一聯盟的 roster snapshot；鎖只擋同一個聯盟的重抓"""
+
+    def __init__(self):
+        self.snapshot = None
+        self.lock = threading.Lock()
+
+
+# {league_key: _LeagueSnapshot}
+_SNAPSHOTS = LeagueCache()
+
+
+def _load_snapshot(league_key):
+    """從 app.py 的 yahoo_get_league_rosters / yahoo_get_players_stats 呼叫"""
+    from app import yahoo_get_league_rosters, yahoo_get_players_stats
+
+    teams = yahoo_get_league_rosters(league_key)
+    if not teams:
+        return None
+
+    keys = [p["player_key"] for team in teams.values() for p in team["players"]]
+    stats = yahoo_get_players_stats(league_key, keys, "season")
+    return RosterSnapshot(league_key, teams, stats)
+
+
+def get_roster_snapshot(league_key):
+    """取得聯盟 roster snapshot；過期才重抓，抓不到就沿用舊的"""
+    state = _SNAPSHOTS.get_or_create(league_key, _LeagueSnapshot)
+    snap = state.snapshot
+    if snap and time.time() - snap.built_at < TRADE_SNAPSHOT_TTL:
+        return snap
+
+    with state.lock:
+        snap = state.snapshot
+        if snap and time.time() - snap.built_at < TRADE_SNAPSHOT_TTL:
+            return snap
+
+        try:
+            fresh = _load_snapshot(league_key)
+        except Exception as e:
+            print("❌ 抓取聯盟名單失敗：", e)
+            fresh = None
+
+        if fresh:
+            state.snapshot = fresh
+            return fresh
+        return snap
+
+
+def _fmt(v, is_pct):
+    return f"{v:.3f}" if is_pct else f"{v:.1f}"
+
+
+def _fmt_delta(v, is_pct):
+    return f"{v:+.3f}" if is_pct else f"{v:+.1f}"
+
+
+def format_trade_result(result):
+    """兩隊各項每場合計的變化表"""
+    blocks = []
+    for side in result["teams"]:
+        lines = [f"📊 {side['name']}（每場合計：交易前 → 交易後）"]
+        for i, label in enumerate(result["labels"]):
+            is_pct = result["is_pct"][i]
+            before = side["before"][i]
+            after = side["after"][i]
+            lines.append(
+                f"{label:<4} {_fmt(before, is_pct)} → {_fmt(after, is_pct)} "
+                f"({_fmt_delta(after - before, is_pct)})"
+            )
+        net = side["value_in"] - side["value_out"]
+        lines.append(
+            f"z 總值：送出 {side['value_out']:+.1f}、換回 {side['value_in']:+.1f}（淨 {net:+.1f}）"
+        )
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
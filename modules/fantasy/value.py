@@ -1,51 +1,31 @@
 # modules/fantasy/value.py
-from modules.fantasy.yahoo_api import (
-    yahoo_search_player_by_name,
-    yahoo_get_player_season_avg
-)
-from openai import OpenAI
-import os
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-def summarize_season_stats(stats: dict):
-    """
-    將 Yahoo season stats → 精簡 summary
-    """
-    label_map = {
-        "points": "得分",
-        "reboundsTotal": "籃板",
-        "assists": "助攻",
-        "steals": "抄截",
-        "blocks": "火鍋",
-        "fgPct": "命中率",
-        "ftPct": "罰球命中率",
-        "threePct": "三分命中率",
-        "turnovers": "失誤",
-    }
-
-    lines = []
-    for k, label in label_map.items():
-        if k in stats:
-            v = stats[k]
-            if isinstance(v, float) and v <= 1:
-                v = round(v * 100, 1)
-                lines.append(f"{label}: {v}%")
-            else:
-                lines.append(f"{label}: {v}")
-    return "\n".join(lines)
+from modules.llm_cache import cached_analysis
+from modules.llm import chat
+from modules.fantasy.player_stats import search_player, get_season_stats, summarize_stats
+from modules.fantasy.ranking import rank_players, pool_rank, format_z_line
 
 
 def analyze_value(player_name: str):
-    p = yahoo_search_player_by_name(player_name)
+    p = search_player(player_name)
     if not p:
         return f"找不到球員：{player_name}"
 
-    stats = yahoo_get_player_season_avg(p["player_key"])
+    stats = get_season_stats(p["player_key"])
     if not stats:
         return "查無球季數據"
 
-    summary = summarize_season_stats(stats)
+    summary = summarize_stats(stats)
+
+    # z-score：和聯盟前段班球員比較（TO 已反向，越高越好）
+    ranked = rank_players([(p, stats)], "season")
+    z_text = ""
+    if ranked:
+        z = ranked[0]
+        rank = pool_rank(z["value"])
+        z_text = f"總值 {z['value']:+.2f}"
+        if rank:
+            z_text += f"（約聯盟第 {rank} 名）"
+        z_text += f"\n各項 z-score：{format_z_line(z)}"
 
     prompt = f"""
 你是 Yahoo Fantasy 的專家。
@@ -55,6 +35,9 @@ def analyze_value(player_name: str):
 球季 summary：
 {summary}
 
+聯盟 z-score（已計算好，請直接引用）：
+{z_text or "無"}
+
 請分析：
 - 該球員在 Yahoo Fantasy 中屬於哪一型（高 usage、大防守、全能型…）
 - 他最強的項目、明顯弱點
@@ -63,14 +46,17 @@ def analyze_value(player_name: str):
 - 用 5 行左右講完即可
 """
 
-    res = client.chat.completions.create(
-        model="gpt-4.1",
-        max_tokens=350,
-        messages=[
-            {"role": "user", "content": prompt}
-        ]
-    )
+    def run_llm():
+        return chat(
+            "value",
+            [{"role": "user", "content": prompt}],
+            max_tokens=350,
+        )
 
-    analysis = res.choices[0].message.content
+    # 同一位球員、數據沒變 → 直接用上次的分析
+    analysis = cached_analysis("value", [p["player_key"]], [stats, z_text], run_llm)
 
-    return f"📈 {p['name']} — Fantasy 價值分析\n{analysis}"
+    header = f"📈 {p['name']} — Fantasy 價值分析\n"
+    if z_text:
+        header += f"📐 {z_text}\n\n"
+    return header + analysis
@@ -0,0 +1,154 @@
+# modules/http_client.py
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+# (connect timeout, read timeout) 秒；每個請求都一定會帶 timeout
+DEFAULT_TIMEOUT = (
+    float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05")),
+    float(os.getenv("HTTP_READ_TIMEOUT", "15")),
+)
+
+# 每個 host 的連線池上限（pool_block=True：滿了就排隊，不會多開連線）
+HOST_POOL_SIZES = {
+    "https://fantasysports.yahooapis.com": int(os.getenv("YAHOO_POOL_SIZE", "16")),
+    "https://api.login.yahoo.com": 2,
+    "https://cdn.nba.com": int(os.getenv("NBA_POOL_SIZE", "8")),
+}
+DEFAULT_POOL_SIZE = 4
+
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+# connections：實際建立的連線；sent：在連線上送出的 HTTP 請求（含重試）
+_COUNTERS = {"requests": 0, "retries": 0, "connections": 0, "sent": 0}
+_COUNTER_LOCK = threading.Lock()
+
+
+def _count(name: str, n: int = 1):
+    with _COUNTER_LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + n
+
+
+def count_request(retry: bool = False):
+    """其他 client（modules/async_http.py）送出的請求也記進同一份統計"""
+    _count("retries" if retry else "requests")
+
+
+class _CountingRetry(Retry):
+    """每次觸發重試就記一筆（429 / 5xx / 連線錯誤）"""
+
+    def increment(self, *args, **kwargs):
+        new_retry = super().increment(*args, **kwargs)
+        _count("retries")
+        return new_retry
+
+
+class _CountingConnectionMixin:
+    """建立連線、送出請求各記一筆（reuse 的連線不會再 connect）"""
+
+    def connect(self):
+        _count("connections")
+        return super().connect()
+
+    def request(self, *args, **kwargs):
+        _count("sent")
+        return super().request(*args, **kwargs)
+
+
+class _CountingHTTPConnection(_CountingConnectionMixin, HTTPConnection):
+    pass
+
+
+class _CountingHTTPSConnection(_CountingConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+
+class _CountingAdapter(HTTPAdapter):
+    """連線池改用會計數的 connection，get_http_stats 不用去翻 urllib3 的內部結構"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+
+def _make_adapter(pool_size: int):
+    retry = _CountingRetry(
+        total=HTTP_MAX_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    return _CountingAdapter(
+        pool_connections=1,
+        pool_maxsize=pool_size,
+        pool_block=True,
+        max_retries=retry,
+    )
+
+
+def get_session():
+    """取得共用的 keep-alive Session（整個 process 共用一個）"""
+    global _SESSION
+
+    if _SESSION is not None:
+        return _SESSION
+
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            session = requests.Session()
+            session.mount("https://", _make_adapter(DEFAULT_POOL_SIZE))
+            session.mount("http://", _make_adapter(DEFAULT_POOL_SIZE))
+            for prefix, size in HOST_POOL_SIZES.items():
+                session.mount(prefix, _make_adapter(size))
+            _SESSION = session
+
+    return _SESSION
+
+
+def http_get(url: str, timeout=DEFAULT_TIMEOUT, **kwargs):
+    """共用 GET（連線池 + 重試 + timeout）"""
+    _count("requests")
+    return get_session().get(url, timeout=timeout, **kwargs)
+
+
+def http_post(url: str, timeout=DEFAULT_TIMEOUT, **kwargs):
+    """共用 POST（連線池 + timeout；POST 不會自動重試 429/5xx）"""
+    _count("requests")
+    return get_session().post(url, timeout=timeout, **kwargs)
+
+
+def get_http_stats():
+    """
+    回傳連線統計：
+    - requests：送出的請求數
+    - retries：重試次數
+    - connections：實際建立的連線數（共用 Session；非同步 client 的連線不算）
+    - pool_hits：重用既有連線的次數
+    """
+    with _COUNTER_LOCK:
+        stats = dict(_COUNTERS)
+
+    sent = stats.pop("sent", 0)
+    stats["pool_hits"] = max(0, sent - stats["connections"])
+    return stats
@@ -0,0 +1,108 @@
+# modules/jobs.py
+"""
+背景指令執行：webhook 先回覆「處理中」，指令丟到 worker pool 執行，
+完成後由呼叫端提供的 on_done（例如 LINE push message）送出結果。
+"""
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+
+# 排隊中的工作上限，超過就直接拒絕（避免無限堆積）
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "20"))
+
+# 每個指令保留最近幾筆耗時紀錄
+LATENCY_SAMPLES = 200
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return round(values[idx], 3)
+
+
+class JobQueue:
+    def __init__(self, workers: int = JOB_WORKERS, max_pending: int = JOB_MAX_PENDING):
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._counts = {"submitted": 0, "rejected": 0, "succeeded": 0, "failed": 0}
+        # {name: deque[(排隊秒數, 執行秒數)]}
+        self._latency = {}
+
+    def submit(self, name: str, fn, on_done, on_error=None):
+        """
+        排入一個工作：fn() 的回傳值交給 on_done，例外交給 on_error。
+        排隊已滿回傳 False（呼叫端應該回覆忙碌訊息）。
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._counts["rejected"] += 1
+                return False
+            self._pending += 1
+            self._counts["submitted"] += 1
+
+        enqueued_at = time.monotonic()
+        # 讓背景 thread 沿用目前的 contextvars（例如 Sheets 統計 scope）
+        ctx = contextvars.copy_context()
+
+        def run():
+            started_at = time.monotonic()
+            with self._lock:
+                self._pending -= 1
+                self._running += 1
+
+            ok = True
+            try:
+                result = fn()
+                on_done(result)
+            except Exception as e:
+                ok = False
+                print(f"❌ 背景指令 {name} 失敗：", e)
+                if on_error:
+                    try:
+                        on_error(e)
+                    except Exception as e2:
+                        print("❌ 錯誤通知失敗：", e2)
+            finally:
+                finished_at = time.monotonic()
+                with self._lock:
+                    self._running -= 1
+                    self._counts["succeeded" if ok else "failed"] += 1
+                    samples = self._latency.setdefault(name, deque(maxlen=LATENCY_SAMPLES))
+                    samples.append((started_at - enqueued_at, finished_at - started_at))
+
+        self._pool.submit(ctx.run, run)
+        return True
+
+    def stats(self):
+        """排隊深度、執行中數量，以及各指令排隊 / 執行耗時的 p50 / p95（秒）"""
+        with self._lock:
+            result = {
+                "pending": self._pending,
+                "running": self._running,
+                **self._counts,
+                "commands": {},
+            }
+            for name, samples in self._latency.items():
+                waits = [w for w, _ in samples]
+                runs = [r for _, r in samples]
+                result["commands"][name] = {
+                    "samples": len(samples),
+                    "wait_p50": _percentile(waits, 50),
+                    "wait_p95": _percentile(waits, 95),
+                    "run_p50": _percentile(runs, 50),
+                    "run_p95": _percentile(runs, 95),
+                }
+            return result
+
+
+job_queue = JobQueue()
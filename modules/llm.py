@@ -1,5 +1,17 @@
 # modules/llm.py
+"""
+LLM gateway：所有指令呼叫 OpenAI 都經過這裡。
+- 整個 process 共用同一個 OpenAI client（連線重用）
+- 依指令選模型（短摘要用較便宜的模型），可用 LLM_MODEL_<COMMAND> 覆寫
+- 每次呼叫都有 timeout
+- 記錄每個指令的 prompt / completion tokens 與耗時
+"""
 import os
+import re
+import threading
+import time
+from collections import deque
+
 from openai import OpenAI
 
 # 這裡不需要再 load_dotenv，app.py 啟動時已經載入環境變數
@@ -7,12 +19,203 @@ OPENAI_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_KEY:
     raise Exception("缺少 OPENAI_API_KEY")
 
-client = OpenAI(api_key=OPENAI_KEY)
+DEFAULT_MODEL = os.getenv("LLM_DEFAULT_MODEL", "gpt-4.1")
+
+# 各指令使用的模型（沒列出的用 DEFAULT_MODEL）
+LLM_MODELS = {
+    "last14": "gpt-4.1-mini",
+    "value": "gpt-4.1-mini",
+    # FA 排名已由 z-score 引擎算好，模型只需要解釋
+    "fa": "gpt-4.1-mini",
+}
+
+# 各指令 LLM 生成的時間上限（秒），超過就截斷，避免整個指令拖過期限
+LLM_LATENCY_BUDGET = {
+    "bot": 30,
+    "vs": 40,
+    "trade": 50,
+}
+DEFAULT_LATENCY_BUDGET = float(os.getenv("LLM_LATENCY_BUDGET", "45"))
+
+TRUNCATED_NOTICE = "⏱️（超過時間上限，分析已截斷）"
+
+# 段落分界：空行後接標題 / 粗體 / 編號（例如 "\n\n2. 健康風險"）
+SECTION_BREAK = re.compile(r"\n\s*\n(?=\s*(?:#{1,6}\s|\*\*|\d+[.、)）]))")
+
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+# 用量統計：{command: {calls, errors, prompt_tokens, completion_tokens, seconds}}
+_USAGE = {}
+# 最近幾筆呼叫明細
+_RECENT_CALLS = deque(maxlen=100)
+_USAGE_LOCK = threading.Lock()
+
+
+def get_client():
+    """取得共用的 OpenAI client（第一次用到才建立）"""
+    global _CLIENT
+
+    if _CLIENT is not None:
+        return _CLIENT
+
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = OpenAI(api_key=OPENAI_KEY, max_retries=2)
+
+    return _CLIENT
+
+
+def get_model(command: str) -> str:
+    """指令使用的模型；可用 LLM_MODEL_<COMMAND> 環境變數覆寫"""
+    env = os.getenv(f"LLM_MODEL_{command.upper()}")
+    if env:
+        return env
+    return LLM_MODELS.get(command, DEFAULT_MODEL)
+
+
+def get_latency_budget(command: str) -> float:
+    """指令的 LLM 時間上限；可用 LLM_BUDGET_<COMMAND> 環境變數覆寫"""
+    env = os.getenv(f"LLM_BUDGET_{command.upper()}")
+    if env:
+        return float(env)
+    return LLM_LATENCY_BUDGET.get(command, DEFAULT_LATENCY_BUDGET)
+
+
+def _record_usage(command, model, usage, seconds, error=False):
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+
+    with _USAGE_LOCK:
+        u = _USAGE.setdefault(command, {
+            "calls": 0,
+            "errors": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "seconds": 0.0,
+        })
+        u["calls"] += 1
+        u["errors"] += int(error)
+        u["prompt_tokens"] += prompt_tokens
+        u["completion_tokens"] += completion_tokens
+        u["seconds"] += seconds
+
+        _RECENT_CALLS.append({
+            "command": command,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "seconds": round(seconds, 3),
+            "error": error,
+        })
+
 
+def get_llm_stats():
+    """各指令的 LLM 用量（tokens、平均耗時）與最近幾筆呼叫"""
+    with _USAGE_LOCK:
+        commands = {}
+        for command, u in _USAGE.items():
+            commands[command] = dict(
+                u,
+                seconds=round(u["seconds"], 3),
+                avg_seconds=round(u["seconds"] / u["calls"], 3) if u["calls"] else None,
+            )
+        return {"commands": commands, "recent": list(_RECENT_CALLS)[-20:]}
 
-def ask_bot_with_memory(user_question: str, memory_text: str) -> str:
+
+def chat(command: str, messages, max_tokens=None, timeout=None) -> str:
+    """
+    一般（非串流）呼叫，回傳回答文字。
+    command 決定模型與 timeout，並用來分開統計用量。
+    """
+    model = get_model(command)
+    kwargs = {}
+    if max_tokens:
+        kwargs["max_tokens"] = max_tokens
+
+    started = time.monotonic()
+    try:
+        res = get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            timeout=timeout or get_latency_budget(command),
+            **kwargs,
+        )
+    except Exception:
+        _record_usage(command, model, None, time.monotonic() - started, error=True)
+        raise
+
+    _record_usage(command, model, res.usage, time.monotonic() - started)
+    return res.choices[0].message.content
+
+
+def stream_chat(command: str, messages, on_section=None, budget=None, **kwargs):
+    """
+    串流呼叫 chat completion，邊收 token 邊切段落。
+    - on_section(text)：每完成一個段落就呼叫一次（最後一段在結束時呼叫）
+    - budget：總時間上限（秒，預設為指令的上限），超過就中斷串流，回傳已產生的部分
+    回傳 (全文, 是否被截斷)
+    """
+    model = get_model(command)
+    budget = budget or get_latency_budget(command)
+    started = time.monotonic()
+    deadline = started + budget
+
+    try:
+        stream = get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            timeout=budget,
+            **kwargs,
+        )
+    except Exception:
+        _record_usage(command, model, None, time.monotonic() - started, error=True)
+        raise
+
+    text = ""
+    emitted = 0
+    truncated = False
+    usage = None
+
+    try:
+        for chunk in stream:
+            if chunk.choices:
+                text += chunk.choices[0].delta.content or ""
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+
+            # 有完整段落就先交出去
+            while on_section:
+                m = SECTION_BREAK.search(text, emitted)
+                if not m:
+                    break
+                section = text[emitted:m.start()].strip()
+                emitted = m.end()
+                if section:
+                    on_section(section)
+
+            if time.monotonic() > deadline:
+                truncated = True
+                break
+    finally:
+        stream.close()
+        _record_usage(command, model, usage, time.monotonic() - started)
+
+    if truncated:
+        print("⏱️ LLM 生成超過時間上限，已截斷")
+        text = text.rstrip() + "\n\n" + TRUNCATED_NOTICE
+    elif on_section and text[emitted:].strip():
+        on_section(text[emitted:].strip())
+
+    return text, truncated
+
+
+def ask_bot_with_memory(user_question: str, memory_text: str, on_section=None) -> str:
     """
     使用群組記憶 + 使用者問題，向 OpenAI 發問並回傳回答文字。
+    on_section：串流時每完成一段就呼叫（可用來提早回覆第一段）
     """
     system_prompt = (
         "你是一個友善的 LINE 群組助理。\n"
@@ -22,13 +225,13 @@ def ask_bot_with_memory(user_question: str, memory_text: str) -> str:
         "若背景與問題無關，可以只根據問題本身回答。"
     )
 
-    res = client.chat.completions.create(
-        model="gpt-4.1",
-        messages=[
+    text, _ = stream_chat(
+        "bot",
+        [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_question},
         ],
+        on_section=on_section,
     )
 
-    return res.choices[0].message.content
-
+    return text
@@ -0,0 +1,157 @@
+# modules/llm_cache.py
+"""
+LLM 分析結果快取（TTL + LRU）。
+
+key = (聯盟, 指令, 球員 player_key, 送給模型的 stats 內容 hash)，
+同一位球員、數據沒變時，幾分鐘內重複問就直接回傳上一次的分析，
+不再呼叫 gpt。
+每個聯盟最多佔 LLM_CACHE_TENANT_SIZE 筆，一個很活躍的群組不會把其他聯盟的快取擠掉。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from modules.tenants import current_league_key
+
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "900"))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "256"))
+LLM_CACHE_TENANT_SIZE = int(os.getenv("LLM_CACHE_TENANT_SIZE", "96"))
+
+
+class TTLCache:
+    """
+    thread-safe 的 LRU 快取，每筆資料超過 ttl 秒就失效。
+    有 partition_size 時 key 必須是 tuple，key[0] 相同的（例如同一個聯盟）最多 partition_size 筆。
+    """
+
+    def __init__(self, maxsize: int, ttl: float, partition_size=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.partition_size = partition_size
+        self._data = OrderedDict()
+        self._partitions = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = item
+            if time.monotonic() > expires_at:
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _remove(self, key):
+        del self._data[key]
+        if self.partition_size:
+            part = key[0]
+            self._partitions[part] -= 1
+            if not self._partitions[part]:
+                del self._partitions[part]
+
+    def set(self, key, value):
+        with self._lock:
+            if key not in self._data and self.partition_size:
+                part = key[0]
+                count = self._partitions.get(part, 0)
+                if count >= self.partition_size:
+                    # 丟掉同一個 partition 裡最久沒用的
+                    oldest = next(k for k in self._data if k[0] == part)
+                    self._remove(oldest)
+                    count -= 1
+                self._partitions[part] = count + 1
+
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "partitions": len(self._partitions),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+llm_cache = TTLCache(LLM_CACHE_SIZE, LLM_CACHE_TTL, partition_size=LLM_CACHE_TENANT_SIZE)
+
+# 正在計算中的 key（避免同時重複呼叫 gpt）
+_INFLIGHT = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+# 等待同 key 計算結果的最長秒數，超過就自己算
+LLM_INFLIGHT_WAIT = float(os.getenv("LLM_INFLIGHT_WAIT", "60"))
+
+
+def stats_fingerprint(*payloads) -> str:
+    """
+    把分析用的 stats 做 hash（數據一變，key 就不同）。
+    payload 可以是文字或 {stat_id: 值} 這類 dict / list（依 key 排序後序列化，順序不影響結果）。
+    """
+    h = hashlib.sha256()
+    for p in payloads:
+        if not isinstance(p, str):
+            p = json.dumps(p, sort_keys=True, ensure_ascii=False, default=str)
+        h.update(p.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def analysis_key(command: str, player_keys, stats_payloads):
+    """快取 key：(目前的聯盟, 指令, 球員, stats hash)"""
+    return (current_league_key(), command, tuple(player_keys), stats_fingerprint(*stats_payloads))
+
+
+def cached_analysis(command: str, player_keys, stats_payloads, compute, should_cache=None):
+    """
+    有快取就直接回傳；沒有才呼叫 compute() 並存起來。
+    同一個 key 同時有多個請求時，只有第一個會呼叫 compute()，其他的等它完成。
+    player_keys：這次分析涉及的球員（順序有意義，A vs B ≠ B vs A；元素可以是 tuple，例如交易的兩邊）
+    stats_payloads：分析用的 stats（list；原始 {stat_id: 值} 或送給模型的文字）
+    should_cache(result)：回傳 False 就不存（例如被截斷的分析）
+    """
+    key = analysis_key(command, player_keys, stats_payloads)
+
+    with _INFLIGHT_LOCK:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return cached
+
+        event = _INFLIGHT.get(key)
+        owner = event is None
+        if owner:
+            event = threading.Event()
+            _INFLIGHT[key] = event
+
+    if not owner:
+        event.wait(timeout=LLM_INFLIGHT_WAIT)
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return cached
+
+    try:
+        result = compute()
+        if result and (should_cache is None or should_cache(result)):
+            llm_cache.set(key, result)
+        return result
+    finally:
+        if owner:
+            with _INFLIGHT_LOCK:
+                _INFLIGHT.pop(key, None)
+            event.set()
@@ -1,25 +1,437 @@
 # modules/memory.py
+"""
+群組聊天記錄。
+
+主要存放在本機 SQLite（group_messages，(group_id, ts) 索引），
+每個群組在記憶體再保留一份最新訊息的 ring buffer，
+!bot 讀取 context 只需要 O(limit)，不會隨著歷史訊息總量變慢。
+
+Google Sheet（group_memory 分頁）只當選用的匯出備份
+（GROUP_MEMORY_SHEET_EXPORT=0 可關閉）。第一次啟動（本機資料庫是空的，
+例如重新部署後）由 start_group_memory_import() 在背景從 Sheet 匯入一次歷史記錄；
+store_meta 的 flag row 確保多個 worker 只會匯入一次。
+
+寫入採 write-behind：webhook 只把訊息丟進記憶體 queue 就返回，
+背景 thread 馬上寫進 SQLite，Sheet 匯出則累積到 GROUP_LOG_BATCH_SIZE 筆
+或每 GROUP_LOG_FLUSH_SECONDS 秒用一次 append_rows 寫入，
+process 結束時（atexit）會再 flush 一次。
+
+Queue 上限 GROUP_LOG_QUEUE_SIZE；滿了就丟掉「新進來」的訊息並計數，
+絕不讓 webhook 因為 SQLite / Sheets 變慢而卡住。
+"""
+import atexit
 import datetime
-from modules.sheet_utils import get_gsheet
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from modules.sheet_utils import get_worksheet, sheet_metrics_scope
+from modules.sqlite_utils import get_sqlite, sqlite_lock
+
+GROUP_MEMORY_SHEET_EXPORT = os.getenv("GROUP_MEMORY_SHEET_EXPORT", "1") == "1"
+
+# 每個群組在記憶體保留的最新訊息數
+GROUP_MEMORY_RING_SIZE = int(os.getenv("GROUP_MEMORY_RING_SIZE", "200"))
+
+GROUP_LOG_QUEUE_SIZE = int(os.getenv("GROUP_LOG_QUEUE_SIZE", "1000"))
+GROUP_LOG_BATCH_SIZE = int(os.getenv("GROUP_LOG_BATCH_SIZE", "50"))
+GROUP_LOG_FLUSH_SECONDS = float(os.getenv("GROUP_LOG_FLUSH_SECONDS", "10"))
+
+# Sheet 匯入做到一半 process 就掛掉時，多久後讓別的 worker 接手（秒）
+GROUP_MEMORY_IMPORT_STALE = float(os.getenv("GROUP_MEMORY_IMPORT_STALE", "600"))
+
+_QUEUE = queue.Queue(maxsize=GROUP_LOG_QUEUE_SIZE)
+
+# 已存進 SQLite、等著匯出到 Sheet 的資料
+_EXPORT_BUFFER = []
+
+# 寫入失敗的資料留到下次 flush 再試（最多保留 GROUP_LOG_QUEUE_SIZE 筆）
+_PENDING = []
+_FLUSH_LOCK = threading.Lock()
+
+_WORKER = None
+_WORKER_LOCK = threading.Lock()
+
+_STATS = {"queued": 0, "stored": 0, "written": 0, "dropped": 0, "failed_flushes": 0}
+_STATS_LOCK = threading.Lock()
+
+
+def _count(name: str, n: int = 1):
+    with _STATS_LOCK:
+        _STATS[name] += n
+
+
+def _write_rows(rows):
+    """把 rows 連同之前失敗的資料一起 append_rows；失敗就留到下次"""
+    global _PENDING
+
+    with _FLUSH_LOCK:
+        batch = _PENDING + rows
+        if not batch:
+            return
+
+        try:
+            with sheet_metrics_scope("group_memory_flush"):
+                get_worksheet("group_memory").append_rows(batch)
+            _PENDING = []
+            _count("written", len(batch))
+
+        except Exception as e:
+            print("❌ 無法寫入聊天記錄:", e)
+            _count("failed_flushes")
+
+            overflow = len(batch) - GROUP_LOG_QUEUE_SIZE
+            if overflow > 0:
+                _count("dropped", overflow)
+                batch = batch[overflow:]
+            _PENDING = batch
+
+
+def _drain(max_rows=None):
+    rows = []
+    while max_rows is None or len(rows) < max_rows:
+        try:
+            rows.append(_QUEUE.get_nowait())
+        except queue.Empty:
+            break
+    return rows
+
+
+def _take_export_buffer():
+    global _EXPORT_BUFFER
+
+    with _FLUSH_LOCK:
+        rows, _EXPORT_BUFFER = _EXPORT_BUFFER, []
+    return rows
+
+
+def _handle_messages(msgs):
+    """msgs = [(group_id, ts, user, text)]：寫進 SQLite，再排進 Sheet 匯出"""
+    try:
+        _store_messages(msgs)
+        _count("stored", len(msgs))
+    except Exception as e:
+        print("❌ 無法寫入聊天記錄:", e)
+
+    if GROUP_MEMORY_SHEET_EXPORT:
+        with _FLUSH_LOCK:
+            _EXPORT_BUFFER.extend([ts, group_id, user, text] for group_id, ts, user, text in msgs)
+
+
+def _writer_loop():
+    export_deadline = None
+
+    while True:
+        # 有資料等著匯出時，最多等到匯出時間；否則一直等下一則訊息
+        timeout = None
+        if export_deadline is not None:
+            timeout = max(0.0, export_deadline - time.monotonic())
+
+        try:
+            msgs = [_QUEUE.get(timeout=timeout)]
+        except queue.Empty:
+            msgs = []
+        # SQLite 馬上寫（!bot 要讀得到），同時進來的一起寫
+        msgs += _drain(GROUP_LOG_BATCH_SIZE)
+
+        if msgs:
+            _handle_messages(msgs)
+            if GROUP_MEMORY_SHEET_EXPORT and export_deadline is None:
+                export_deadline = time.monotonic() + GROUP_LOG_FLUSH_SECONDS
+
+        if export_deadline is None:
+            continue
+        with _FLUSH_LOCK:
+            buffered = len(_EXPORT_BUFFER)
+        if buffered >= GROUP_LOG_BATCH_SIZE or time.monotonic() >= export_deadline:
+            _write_rows(_take_export_buffer())
+            export_deadline = None
+
+
+def _ensure_worker():
+    global _WORKER
+
+    if _WORKER is not None:
+        return
+
+    with _WORKER_LOCK:
+        if _WORKER is None:
+            _WORKER = threading.Thread(
+                target=_writer_loop, name="group-memory-writer", daemon=True
+            )
+            _WORKER.start()
+
+
+def flush_group_messages():
+    """把 queue 中所有訊息立刻寫入（shutdown 時呼叫）"""
+    msgs = _drain()
+    if msgs:
+        _handle_messages(msgs)
+
+    rows = _take_export_buffer()
+    if rows or _PENDING:
+        _write_rows(rows)
+
+
+atexit.register(flush_group_messages)
+
+
+def get_group_log_stats():
+    """write-behind 狀態：目前排隊數、已寫入、丟棄、失敗次數"""
+    with _STATS_LOCK:
+        stats = dict(_STATS)
+    stats["queue_depth"] = _QUEUE.qsize()
+    stats["export_buffer"] = len(_EXPORT_BUFFER)
+    stats["pending_retry"] = len(_PENDING)
+    return stats
+
+
+# ==============================
+# 本機訊息庫（SQLite + 每群組 ring buffer）
+# ==============================
+# {group_id: deque[(id, ts, user, text)]}
+_RINGS = {}
+# {group_id: 已從 SQLite 同步到的最大 id}
+_SYNCED_IDS = {}
+_RING_LOCK = threading.Lock()
+
+_STORE_READY = False
+_STORE_LOCK = threading.Lock()
+
+
+def _ensure_store():
+    """建表（group_messages + 記錄一次性工作狀態的 store_meta）"""
+    global _STORE_READY
+
+    if _STORE_READY:
+        return
+
+    with _STORE_LOCK:
+        if _STORE_READY:
+            return
+
+        with sqlite_lock():
+            conn = get_sqlite()
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS group_messages (
+                    id       INTEGER PRIMARY KEY AUTOINCREMENT,
+                    group_id TEXT NOT NULL,
+                    ts       TEXT NOT NULL,
+                    user     TEXT,
+                    text     TEXT
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_group_messages_group_ts "
+                "ON group_messages (group_id, ts)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_group_messages_group_id "
+                "ON group_messages (group_id, id)"
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS store_meta (
+                    key        TEXT PRIMARY KEY,
+                    value      TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.commit()
+
+        _STORE_READY = True
+
+
+# store_meta 裡記錄 Sheet 匯入狀態的 key：pending（有 worker 在匯入）/ done
+_IMPORT_KEY = "group_memory_sheet_import"
+
+
+def _claim_import() -> bool:
+    """
+    決定這個 worker 要不要從 Sheet 匯入（多個 worker 只有一個會拿到）：
+    - 還沒有紀錄：資料庫是空的才匯入；已經有資料就直接記成 done
+    - pending 太久沒完成（之前的 worker 中途掛掉）：接手重做
+    """
+    with sqlite_lock():
+        conn = get_sqlite()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value, updated_at FROM store_meta WHERE key = ?", (_IMPORT_KEY,)
+            ).fetchone()
+
+            if row is None:
+                empty = conn.execute("SELECT 1 FROM group_messages LIMIT 1").fetchone() is None
+                value = "pending" if empty else "done"
+            elif row[0] == "pending" and time.time() - row[1] > GROUP_MEMORY_IMPORT_STALE:
+                value = "pending"
+            else:
+                conn.rollback()
+                return False
+
+            conn.execute(
+                "INSERT OR REPLACE INTO store_meta (key, value, updated_at) VALUES (?, ?, ?)",
+                (_IMPORT_KEY, value, time.time()),
+            )
+            conn.commit()
+            return value == "pending"
+
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def _import_from_sheet():
+    try:
+        with sheet_metrics_scope("group_memory_import"):
+            rows = get_worksheet("group_memory").get_all_records()
+
+        # 寫入和標記 done 在同一個 transaction：中途掛掉不會留下一半的資料，
+        # 兩個 worker 都做了也只有先 commit 的那個會寫入
+        with sqlite_lock():
+            conn = get_sqlite()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                state = conn.execute(
+                    "SELECT value FROM store_meta WHERE key = ?", (_IMPORT_KEY,)
+                ).fetchone()
+                if state and state[0] == "done":
+                    conn.rollback()
+                    return
+
+                conn.executemany(
+                    "INSERT INTO group_messages (group_id, ts, user, text) VALUES (?, ?, ?, ?)",
+                    [(str(r["group_id"]), str(r["ts"]), str(r["user"]), str(r["text"])) for r in rows],
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO store_meta (key, value, updated_at) VALUES (?, ?, ?)",
+                    (_IMPORT_KEY, "done", time.time()),
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        print(f"✅ 已從 Sheet 匯入 {len(rows)} 則聊天記錄")
+
+    except Exception as e:
+        print("❌ 從 Sheet 匯入聊天記錄失敗:", e)
+
+
+def start_group_memory_import():
+    """啟動時呼叫：需要的話在背景從 Sheet 匯入一次歷史記錄（不擋 webhook）"""
+    if not GROUP_MEMORY_SHEET_EXPORT:
+        return
+
+    try:
+        _ensure_store()
+        if not _claim_import():
+            return
+    except Exception as e:
+        print("❌ 檢查聊天記錄匯入狀態失敗:", e)
+        return
+
+    threading.Thread(
+        target=_import_from_sheet, name="group-memory-import", daemon=True
+    ).start()
+
+
+def _fetch_latest(group_id: str, limit: int):
+    """從 SQLite 取某群組最新 limit 則（由舊到新）"""
+    with sqlite_lock():
+        rows = get_sqlite().execute(
+            "SELECT id, ts, user, text FROM group_messages "
+            "WHERE group_id = ? ORDER BY ts DESC, id DESC LIMIT ?",
+            (group_id, limit),
+        ).fetchall()
+    rows.reverse()
+    return rows
+
+
+def _fetch_since(group_id: str, last_id: int):
+    """從 SQLite 取某群組 id > last_id 的訊息（包含其他 worker 寫入的）"""
+    with sqlite_lock():
+        return get_sqlite().execute(
+            "SELECT id, ts, user, text FROM group_messages "
+            "WHERE group_id = ? AND id > ? ORDER BY id",
+            (group_id, last_id),
+        ).fetchall()
+
+
+def _get_ring(group_id: str):
+    """取得群組 ring buffer，並補上其他 worker 之後寫入的訊息"""
+    with _RING_LOCK:
+        ring = _RINGS.get(group_id)
+
+        if ring is None:
+            rows = _fetch_latest(group_id, GROUP_MEMORY_RING_SIZE)
+            ring = deque(rows, maxlen=GROUP_MEMORY_RING_SIZE)
+            _RINGS[group_id] = ring
+            _SYNCED_IDS[group_id] = max((r[0] for r in rows), default=0)
+            return ring
+
+        new_rows = _fetch_since(group_id, _SYNCED_IDS.get(group_id, 0))
+        if new_rows:
+            _SYNCED_IDS[group_id] = new_rows[-1][0]
+
+            seen = {row[0] for row in ring}
+            merged = list(ring) + [row for row in new_rows if row[0] not in seen]
+            # 不同 worker 寫入的順序可能交錯，依時間重新排序
+            merged.sort(key=lambda row: (row[1], row[0]))
+            ring.clear()
+            ring.extend(merged[-GROUP_MEMORY_RING_SIZE:])
+
+        return ring
+
+
+def _store_messages(msgs):
+    """msgs = [(group_id, ts, user, text)]，一個 transaction 寫完（writer thread 呼叫）"""
+    _ensure_store()
+
+    stored = []
+    with sqlite_lock():
+        conn = get_sqlite()
+        for group_id, ts, user, text in msgs:
+            cur = conn.execute(
+                "INSERT INTO group_messages (group_id, ts, user, text) VALUES (?, ?, ?, ?)",
+                (group_id, ts, user, text),
+            )
+            stored.append((group_id, (cur.lastrowid, ts, user, text)))
+        conn.commit()
+
+    with _RING_LOCK:
+        for group_id, row in stored:
+            ring = _RINGS.get(group_id)
+            if ring is not None:
+                ring.append(row)
 
 
 def save_group_message(event, text: str):
     """
-    將群組訊息寫入 group_memory 分頁。
+    把群組訊息排進寫入佇列就返回（SQLite / Sheet 都由背景 thread 寫）。
     只記錄 group 訊息，一般 1:1 聊天不記錄。
     """
     try:
         if event.source.type != "group":
             return
 
-        sheet = get_gsheet().worksheet("group_memory")
-
         ts = datetime.datetime.now().isoformat()
         group_id = event.source.group_id
         # 目前寫入的是 user_id，如未來想要顯示暱稱可再加一層 mapping
         user = event.source.user_id
 
-        sheet.append_row([ts, group_id, user, text])
+        _ensure_worker()
+        _QUEUE.put_nowait((group_id, ts, user, text))
+        _count("queued")
+
+    except queue.Full:
+        _count("dropped")
+        print("⚠️ 聊天記錄佇列已滿，丟棄一則訊息")
 
     except Exception as e:
         print("❌ 無法寫入聊天記錄:", e)
@@ -27,23 +439,25 @@ def save_group_message(event, text: str):
 
 def load_group_memory(group_id: str, limit: int = 80) -> str:
     """
-    從 group_memory 分頁讀取指定 group_id 的最新 N 則訊息，
+    讀取指定 group_id 的最新 N 則訊息，
     並組成文字給 LLM 當作 context 使用。
+    優先用記憶體 ring buffer，超過 ring 大小才查 SQLite。
     """
     try:
-        sheet = get_gsheet().worksheet("group_memory")
-        rows = sheet.get_all_records()
+        _ensure_store()
+        group_id = str(group_id)
 
-        msgs = [r for r in rows if str(r["group_id"]) == str(group_id)]
-        msgs = msgs[-limit:]  # 取最新 N 則
+        if limit <= GROUP_MEMORY_RING_SIZE:
+            msgs = list(_get_ring(group_id))[-limit:]  # 取最新 N 則
+        else:
+            msgs = _fetch_latest(group_id, limit)
 
         memory_text = ""
-        for m in msgs:
-            memory_text += f"{m['user']}: {m['text']}\n"
+        for _, _, user, text in msgs:
+            memory_text += f"{user}: {text}\n"
 
         return memory_text
 
     except Exception as e:
         print("❌ 無法讀取群組記憶:", e)
         return ""
-
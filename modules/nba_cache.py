@@ -0,0 +1,167 @@
+# modules/nba_cache.py
+"""
+cdn.nba.com JSON 的條件式快取：
+- 每個 URL 記住 ETag / Last-Modified，再抓時帶 If-None-Match / If-Modified-Since，
+  沒變就收到 304，直接用記憶體裡的資料
+- NBA_FRESH_SECONDS 內重複要求同一個 URL 連 304 都不送（很多人同時 !nba 時只抓一次）
+- 已結束的比賽（mark_final）視為不會再變，之後完全不再發請求
+- 同一個 URL 同時只會有一個請求在跑，其他人等它的結果
+
+get_json 回傳 (data, version)；version 只有內容真的變了才會增加，
+呼叫端可以用它快取由資料算出來的結果（例如格式化好的比賽摘要）。
+get_json_async 是 ASGI 模式（asgi.py）用的非同步版，共用同一份快取與版本號。
+"""
+import asyncio
+import itertools
+import os
+import threading
+import time
+
+from modules.http_client import http_get
+
+# 同一個 URL 多久內不重新確認（秒）
+NBA_FRESH_SECONDS = float(os.getenv("NBA_FRESH_SECONDS", "15"))
+
+# 最多快取幾個 URL（超過就丟掉最久沒用的，已結束的比賽也一樣）
+NBA_CACHE_SIZE = int(os.getenv("NBA_CACHE_SIZE", "200"))
+
+
+class _Entry:
+    __slots__ = ("data", "etag", "last_modified", "checked_at", "version", "final", "lock")
+
+    def __init__(self):
+        self.data = None
+        self.etag = None
+        self.last_modified = None
+        self.checked_at = 0.0
+        self.version = 0
+        self.final = False
+        self.lock = threading.Lock()
+
+
+_ENTRIES = {}
+_ENTRIES_LOCK = threading.Lock()
+
+# 所有 URL 共用的版本號（entry 被淘汰後重抓也不會和舊版本撞號）
+_VERSIONS = itertools.count(1)
+
+_STATS = {"requests": 0, "not_modified": 0, "fresh_hits": 0, "final_hits": 0}
+_STATS_LOCK = threading.Lock()
+
+
+def _count(name: str):
+    with _STATS_LOCK:
+        _STATS[name] += 1
+
+
+def _entry(url: str) -> _Entry:
+    with _ENTRIES_LOCK:
+        entry = _ENTRIES.pop(url, None) or _Entry()
+        # dict 保持插入順序：重新放到最後面 = 最近使用
+        _ENTRIES[url] = entry
+        while len(_ENTRIES) > NBA_CACHE_SIZE:
+            evicted = next(iter(_ENTRIES))
+            _ENTRIES.pop(evicted)
+            _ASYNC_LOCKS.pop(evicted, None)
+        return entry
+
+
+def _cached(entry: _Entry, fresh_seconds: float):
+    """已結束或剛確認過的資料直接用，回傳 (data, version)；需要重新確認就回傳 None"""
+    if entry.data is None:
+        return None
+    if entry.final:
+        _count("final_hits")
+        return entry.data, entry.version
+    if time.monotonic() - entry.checked_at < fresh_seconds:
+        _count("fresh_hits")
+        return entry.data, entry.version
+    return None
+
+
+def _conditional_headers(entry: _Entry):
+    headers = {}
+    if entry.data is not None:
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+    return headers
+
+
+def _store(entry: _Entry, res):
+    """把回應寫進 entry，回傳 (data, version)；version 最後才更新（讀到新資料配舊版本只會多算一次）"""
+    entry.checked_at = time.monotonic()
+
+    if res.status_code == 304 and entry.data is not None:
+        _count("not_modified")
+        return entry.data, entry.version
+
+    res.raise_for_status()
+    entry.data = res.json()
+    entry.etag = res.headers.get("ETag")
+    entry.last_modified = res.headers.get("Last-Modified")
+    entry.version = next(_VERSIONS)
+    return entry.data, entry.version
+
+
+def get_json(url: str, timeout=5, fresh_seconds=None):
+    """抓 JSON（帶條件式快取），回傳 (data, version)"""
+    fresh_seconds = NBA_FRESH_SECONDS if fresh_seconds is None else fresh_seconds
+    entry = _entry(url)
+
+    with entry.lock:
+        cached = _cached(entry, fresh_seconds)
+        if cached:
+            return cached
+
+        headers = _conditional_headers(entry)
+        _count("requests")
+        return _store(entry, http_get(url, timeout=timeout, headers=headers))
+
+
+# 非同步版：同一個 URL 同時只有一個請求（只在 event loop 裡使用）
+_ASYNC_LOCKS = {}
+
+
+async def get_json_async(url: str, timeout=5, fresh_seconds=None):
+    """
+    get_json 的非同步版（httpx），請求期間不佔 thread。
+    不拿 entry.lock（同步版可能正拿著它等網路），寫入順序見 _store。
+    """
+    from modules.async_http import async_http_get
+
+    fresh_seconds = NBA_FRESH_SECONDS if fresh_seconds is None else fresh_seconds
+    entry = _entry(url)
+
+    cached = _cached(entry, fresh_seconds)
+    if cached:
+        return cached
+
+    lock = _ASYNC_LOCKS.setdefault(url, asyncio.Lock())
+    async with lock:
+        cached = _cached(entry, fresh_seconds)
+        if cached:
+            return cached
+
+        headers = _conditional_headers(entry)
+        _count("requests")
+        res = await async_http_get(url, timeout=timeout, headers=headers)
+        return _store(entry, res)
+
+
+def mark_final(url: str):
+    """這個 URL 的內容不會再變（例如已結束比賽的 boxscore）"""
+    with _ENTRIES_LOCK:
+        entry = _ENTRIES.get(url)
+    if entry is not None:
+        entry.final = True
+
+
+def get_nba_cache_stats():
+    with _STATS_LOCK:
+        stats = dict(_STATS)
+    with _ENTRIES_LOCK:
+        stats["entries"] = len(_ENTRIES)
+        stats["final_entries"] = sum(1 for e in _ENTRIES.values() if e.final)
+    return stats
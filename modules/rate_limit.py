@@ -0,0 +1,42 @@
+# modules/rate_limit.py
+import os
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    簡單的 token bucket 限流器（thread-safe）。
+    rate = 每秒可發出的請求數，burst = 瞬間最多可連發幾個。
+    rate <= 0 代表不限流。
+    """
+
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取得一個 token，不夠時就 sleep 到有為止"""
+        if self.rate <= 0:
+            return
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+# Yahoo Fantasy API 全域限流（每個 process 各自計算）
+yahoo_rate_limiter = RateLimiter(float(os.getenv("YAHOO_RATE_LIMIT", "10")))
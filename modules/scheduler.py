@@ -0,0 +1,213 @@
+# modules/scheduler.py
+"""
+背景排程：在 app process 裡定期執行預先抓取之類的工作。
+
+- 每個 Job 有固定間隔（interval），也可以有 trigger()：回傳值一變（例如今天又有比賽打完）
+  就提早執行，但兩次執行至少相隔 min_gap 秒
+- 每個 gunicorn worker 都會跑自己的排程 thread，靠檔案鎖（fcntl.flock）
+  加上 SQLite 裡的執行紀錄，確保同一個工作同一時間只有一個 worker 在跑，
+  而且跑完之後其他 worker 不會再跑一次
+- 沒有 fcntl 的環境（Windows 本機開發）只用 process 內的鎖
+"""
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from modules.sqlite_utils import get_sqlite, sqlite_lock
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+
+# 多久檢查一次有沒有工作該執行（秒）
+SCHEDULER_TICK = float(os.getenv("SCHEDULER_TICK", "60"))
+
+# 檔案鎖放的位置（同一台機器上的 worker 要看到同一個目錄）
+SCHEDULER_LOCK_DIR = os.getenv("SCHEDULER_LOCK_DIR", tempfile.gettempdir())
+
+
+class Job:
+    def __init__(self, name: str, fn, interval: float, trigger=None, min_gap: float = 0):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.trigger = trigger
+        self.min_gap = min_gap
+
+
+_TABLE_READY = False
+
+
+def _ensure_table():
+    global _TABLE_READY
+    if _TABLE_READY:
+        return
+
+    with sqlite_lock():
+        conn = get_sqlite()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS scheduler_runs (
+                job          TEXT PRIMARY KEY,
+                last_run     REAL NOT NULL,
+                token        TEXT,
+                last_status  TEXT,
+                last_seconds REAL
+            )
+            """
+        )
+        conn.commit()
+        _TABLE_READY = True
+
+
+def _load_state(name: str):
+    """回傳 (last_run, token)；從沒跑過是 (0, None)"""
+    _ensure_table()
+    with sqlite_lock():
+        row = get_sqlite().execute(
+            "SELECT last_run, token FROM scheduler_runs WHERE job = ?", (name,)
+        ).fetchone()
+    return row if row else (0.0, None)
+
+
+def _save_state(name: str, last_run: float, token, status: str, seconds: float):
+    with sqlite_lock():
+        conn = get_sqlite()
+        conn.execute(
+            "INSERT OR REPLACE INTO scheduler_runs "
+            "(job, last_run, token, last_status, last_seconds) VALUES (?, ?, ?, ?, ?)",
+            (name, last_run, token, status, seconds),
+        )
+        conn.commit()
+
+
+_LOCAL_LOCKS = {}
+
+
+@contextmanager
+def _job_lock(name: str):
+    """拿到鎖 yield True；其他 worker（或 thread）正在跑就 yield False"""
+    local = _LOCAL_LOCKS.setdefault(name, threading.Lock())
+    if not local.acquire(blocking=False):
+        yield False
+        return
+
+    f = None
+    try:
+        if fcntl is not None:
+            f = open(os.path.join(SCHEDULER_LOCK_DIR, f"line-bot-{name}.lock"), "w")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+        yield True
+    finally:
+        if f is not None:
+            f.close()  # 關檔同時釋放 flock
+        local.release()
+
+
+class Scheduler:
+    def __init__(self, tick: float = SCHEDULER_TICK):
+        self.tick = tick
+        self.jobs = []
+        self._thread = None
+        self._lock = threading.Lock()
+        # {job: {"runs", "failures", "skipped_locked", "last_seconds"}}（只統計這個 worker）
+        self._stats = {}
+
+    def register(self, job: Job):
+        self.jobs.append(job)
+        self._stats[job.name] = {"runs": 0, "failures": 0, "skipped_locked": 0, "last_seconds": None}
+
+    def _is_due(self, job: Job, last_run: float, last_token, token) -> bool:
+        elapsed = time.time() - last_run
+        if elapsed >= job.interval:
+            return True
+        return token is not None and token != last_token and elapsed >= job.min_gap
+
+    def _trigger_token(self, job: Job, last_run: float):
+        if job.trigger is None or time.time() - last_run < job.min_gap:
+            return None
+        try:
+            token = job.trigger()
+            return None if token is None else str(token)
+        except Exception as e:
+            print(f"❌ 排程 {job.name} trigger 失敗：", e)
+            return None
+
+    def run_pending(self):
+        """檢查每個工作，該跑的就跑（同一工作同時只有一個 worker 會執行）"""
+        for job in self.jobs:
+            try:
+                last_run, last_token = _load_state(job.name)
+                token = self._trigger_token(job, last_run)
+                if not self._is_due(job, last_run, last_token, token):
+                    continue
+
+                with _job_lock(job.name) as acquired:
+                    if not acquired:
+                        self._stats[job.name]["skipped_locked"] += 1
+                        continue
+
+                    # 拿到鎖之後再確認一次：可能別的 worker 剛跑完
+                    last_run, last_token = _load_state(job.name)
+                    if not self._is_due(job, last_run, last_token, token):
+                        continue
+
+                    self._run(job, token if token is not None else last_token)
+
+            except Exception as e:
+                print(f"❌ 排程 {job.name} 檢查失敗：", e)
+
+    def _run(self, job: Job, token):
+        started = time.time()
+        status = "ok"
+        try:
+            job.fn()
+        except Exception as e:
+            status = f"error: {e}"
+            self._stats[job.name]["failures"] += 1
+            print(f"❌ 排程 {job.name} 執行失敗：", e)
+
+        seconds = time.time() - started
+        # 失敗也記錄時間，避免每個 tick 一直重試
+        _save_state(job.name, started, token, status, seconds)
+        self._stats[job.name]["runs"] += 1
+        self._stats[job.name]["last_seconds"] = round(seconds, 3)
+        print(f"⏰ 排程 {job.name} 完成（{status}，{seconds:.1f}s）")
+
+    def _loop(self):
+        while True:
+            self.run_pending()
+            time.sleep(self.tick)
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None or not self.jobs:
+                return
+            self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+            self._thread.start()
+
+    def stats(self):
+        result = {"enabled": SCHEDULER_ENABLED, "jobs": {}}
+        for job in self.jobs:
+            try:
+                last_run, _ = _load_state(job.name)
+            except Exception:
+                last_run = None
+            result["jobs"][job.name] = dict(
+                self._stats[job.name],
+                interval=job.interval,
+                last_run=last_run,
+            )
+        return result
+
+
+scheduler = Scheduler()
@@ -1,12 +1,63 @@
 # modules/sheet_utils.py
+import contextlib
+import contextvars
 import json
 import os
+import threading
+import time
+
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 
+# 超過這個秒數就重新 authorize（service account token 有效期 1 小時）
+SHEET_REAUTH_SECONDS = int(os.getenv("SHEET_REAUTH_SECONDS", "3000"))
+
+_LOCK = threading.RLock()
+_CREDENTIALS = None
+_SPREADSHEET = None
+_AUTHORIZED_AT = 0.0
+_WORKSHEETS = {}
+
+# Sheets 呼叫次數統計：{scope: {"runs": 執行次數, "calls": API 呼叫數}}
+_METRICS = {}
+_METRICS_LOCK = threading.Lock()
+_CURRENT_SCOPE = contextvars.ContextVar("sheet_metrics_scope", default="other")
+
+
+def _record_sheet_call(response, *args, **kwargs):
+    """requests response hook：每個 Sheets / Drive HTTP 請求記一筆"""
+    global _AUTHORIZED_AT
+
+    scope = _CURRENT_SCOPE.get()
+    with _METRICS_LOCK:
+        m = _METRICS.setdefault(scope, {"runs": 0, "calls": 0})
+        m["calls"] += 1
+
+    # 憑證失效：下次 get_gsheet() 重新 authorize
+    if response.status_code == 401:
+        _AUTHORIZED_AT = 0.0
+
+    return response
+
+
+def _install_metrics_hook(gc):
+    # gspread 6 把 session 放在 gc.http_client，舊版直接放在 gc.session
+    session = getattr(getattr(gc, "http_client", gc), "session", None)
+    if session is not None:
+        session.hooks.setdefault("response", []).append(_record_sheet_call)
+
+
+def _credentials_expired():
+    if _CREDENTIALS is None:
+        return True
+    if time.time() - _AUTHORIZED_AT > SHEET_REAUTH_SECONDS:
+        return True
+    return bool(getattr(_CREDENTIALS, "access_token_expired", False))
+
+
+def _authorize():
+    global _CREDENTIALS, _SPREADSHEET, _AUTHORIZED_AT
 
-def get_gsheet():
-    """取得 Google Sheet 物件（整本試算表）。"""
     credentials_info = json.loads(os.getenv("GOOGLE_SERVICE_ACCOUNT_JSON"))
     credentials = ServiceAccountCredentials.from_json_keyfile_dict(
         credentials_info,
@@ -16,16 +67,80 @@ def get_gsheet():
         ],
     )
     gc = gspread.authorize(credentials)
-    return gc.open_by_url(os.getenv("GOOGLE_SHEET_URL"))
+    _install_metrics_hook(gc)
+
+    spreadsheet = gc.open_by_url(os.getenv("GOOGLE_SHEET_URL"))
+
+    _CREDENTIALS = credentials
+    _SPREADSHEET = spreadsheet
+    _AUTHORIZED_AT = time.time()
+    # 舊的 worksheet handle 綁著舊 client，一起丟掉
+    _WORKSHEETS.clear()
+
+
+def get_gsheet():
+    """
+    取得 Google Sheet 物件（整本試算表）。
+    整個 process 共用同一個 client，憑證快過期時才重新 authorize。
+    """
+    with _LOCK:
+        if _SPREADSHEET is None or _credentials_expired():
+            _authorize()
+        return _SPREADSHEET
+
+
+def get_worksheet(name: str, create: bool = False):
+    """
+    取得分頁 handle（第一次用到才向 Google 查，之後沿用）。
+    create=True 時分頁不存在就建立（例如新 tenant 的 token 分頁）。
+    """
+    with _LOCK:
+        spreadsheet = get_gsheet()
+        ws = _WORKSHEETS.get(name)
+        if ws is None:
+            try:
+                ws = spreadsheet.worksheet(name)
+            except gspread.exceptions.WorksheetNotFound:
+                if not create:
+                    raise
+                ws = spreadsheet.add_worksheet(title=name, rows=10, cols=2)
+            _WORKSHEETS[name] = ws
+        return ws
+
+
+@contextlib.contextmanager
+def sheet_metrics_scope(name: str):
+    """在這個區塊裡的 Sheets 呼叫都算在 name 底下（例如指令名稱）"""
+    with _METRICS_LOCK:
+        _METRICS.setdefault(name, {"runs": 0, "calls": 0})["runs"] += 1
+
+    token = _CURRENT_SCOPE.set(name)
+    try:
+        yield
+    finally:
+        _CURRENT_SCOPE.reset(token)
+
+
+def get_sheet_metrics():
+    """回傳每個 scope 的 Sheets 呼叫統計（含平均每次幾個呼叫）"""
+    with _METRICS_LOCK:
+        result = {}
+        for scope, m in _METRICS.items():
+            runs = m["runs"]
+            result[scope] = {
+                "runs": runs,
+                "calls": m["calls"],
+                "calls_per_run": round(m["calls"] / runs, 2) if runs else None,
+            }
+        return result
 
 
 def load_sheet_commands():
     """讀取 keyword_reply 分頁，回傳 {keyword: response} dict。"""
     try:
-        sheet = get_gsheet().worksheet("keyword_reply")
+        sheet = get_worksheet("keyword_reply")
         rows = sheet.get_all_records()
         return {row["keyword"].lower(): row["response"] for row in rows}
     except Exception as e:
         print("❌ Google Sheet 載入失敗:", e)
         return {}
-
@@ -0,0 +1,30 @@
+# modules/sqlite_utils.py
+import os
+import sqlite3
+import threading
+
+# 本機 SQLite 檔案位置（Render 上可指到 persistent disk）
+SQLITE_PATH = os.getenv("SQLITE_PATH", "fantasy_cache.db")
+
+_CONN = None
+_LOCK = threading.RLock()
+
+
+def get_sqlite():
+    """
+    取得整個 process 共用的 SQLite 連線。
+    多執行緒共用同一條連線，呼叫端讀寫時要包在 sqlite_lock() 裡。
+    """
+    global _CONN
+
+    with _LOCK:
+        if _CONN is None:
+            _CONN = sqlite3.connect(SQLITE_PATH, timeout=30, check_same_thread=False)
+            # WAL：讓多個 gunicorn worker 同時讀寫同一個檔案
+            _CONN.execute("PRAGMA journal_mode=WAL")
+        return _CONN
+
+
+def sqlite_lock():
+    """共用連線的鎖（RLock，可重入）"""
+    return _LOCK
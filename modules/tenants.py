@@ -0,0 +1,375 @@
+# modules/tenants.py
+"""
+多聯盟（tenant）設定：
+- 每個 LINE 群組可以綁自己的 Yahoo 聯盟（league_key）和 OAuth token（存在哪個 Sheet 分頁）
+- 綁定存在 SQLite（tenants table），所有 worker 共用；沒綁定的群組用環境變數的預設聯盟
+  （YAHOO_LEAGUE_KEY + yahoo_token 分頁），跟以前單一聯盟時完全一樣
+- 處理訊息時用 tenant_scope() 設定目前的 tenant（contextvar），
+  Yahoo 呼叫、stat schema、球員索引、各種快取都依它分開
+- 依聯盟分開的記憶體快取用 LeagueCache：最多保留 TENANT_MAX_LEAGUES 個聯盟，超過就丟最久沒用的；
+  聯盟裡會隨使用者輸入變多的快取另外限制在 TENANT_MAX_ENTRIES 筆
+- Yahoo OAuth 的 state 是每次登入產生的一次性亂數（oauth_states table），callback 時核對並刪掉，
+  對應到要存 token 的分頁和發起登入的群組；不能拿分頁名稱直接偽造 callback 蓋掉別的群組的 token
+- !league login 不會先改群組設定：token 真的存好之後才切到群組自己的分頁，
+  登入放棄或連結過期時群組照舊用原本的聯盟
+"""
+import contextlib
+import contextvars
+import hashlib
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.sqlite_utils import get_sqlite, sqlite_lock
+
+DEFAULT_LEAGUE_KEY = os.getenv("YAHOO_LEAGUE_KEY")
+DEFAULT_TOKEN_SHEET = "yahoo_token"
+
+# 每種依聯盟分開的快取最多保留幾個聯盟
+TENANT_MAX_LEAGUES = int(os.getenv("TENANT_MAX_LEAGUES", "8"))
+
+# 每個聯盟裡由使用者輸入產生的快取（交易試算、記住的球員查詢）最多幾筆
+TENANT_MAX_ENTRIES = int(os.getenv("TENANT_MAX_ENTRIES", "256"))
+
+# 綁定資料在記憶體裡多久重新讀一次（其他 worker 可能改過）
+TENANT_REGISTRY_TTL = float(os.getenv("TENANT_REGISTRY_TTL", "60"))
+
+# 登入連結（OAuth state）多久內有效（秒）
+TENANT_LOGIN_TTL = float(os.getenv("TENANT_LOGIN_TTL", "900"))
+
+# 還在用預設 Yahoo 帳號的群組裡，哪些可以自己 !league list / set（逗號分隔的 group_id）；
+# 其他群組要先 !league login 授權自己的帳號
+LEAGUE_DEFAULT_TOKEN_GROUPS = {
+    g.strip() for g in os.getenv("LEAGUE_DEFAULT_TOKEN_GROUPS", "").split(",") if g.strip()
+}
+
+
+class Tenant:
+    __slots__ = ("tenant_id", "league_key", "token_sheet")
+
+    def __init__(self, tenant_id: str, league_key, token_sheet: str = DEFAULT_TOKEN_SHEET):
+        self.tenant_id = tenant_id
+        self.league_key = league_key
+        self.token_sheet = token_sheet
+
+    def __repr__(self):
+        return f"Tenant({self.tenant_id!r}, {self.league_key!r}, {self.token_sheet!r})"
+
+
+DEFAULT_TENANT = Tenant("default", DEFAULT_LEAGUE_KEY, DEFAULT_TOKEN_SHEET)
+
+_CURRENT = contextvars.ContextVar("tenant", default=DEFAULT_TENANT)
+
+
+def current_tenant() -> Tenant:
+    return _CURRENT.get()
+
+
+def current_league_key():
+    return _CURRENT.get().league_key
+
+
+@contextlib.contextmanager
+def tenant_scope(tenant):
+    """在這個區塊裡（包含 TenantExecutor / job_queue 派出去的 thread）都用這個 tenant"""
+    token = _CURRENT.set(tenant or DEFAULT_TENANT)
+    try:
+        yield tenant
+    finally:
+        _CURRENT.reset(token)
+
+
+class TenantExecutor(ThreadPoolExecutor):
+    """submit 出去的工作沿用呼叫端的 contextvars（目前的 tenant、Sheets 統計 scope）"""
+
+    def submit(self, fn, /, *args, **kwargs):
+        ctx = contextvars.copy_context()
+        return super().submit(ctx.run, fn, *args, **kwargs)
+
+
+class LeagueCache:
+    """
+    依聯盟分開的記憶體快取（thread-safe），最多 max_leagues 個聯盟，超過就丟最久沒用的。
+    on_evict(value)：被丟掉時呼叫（例如停掉背景 thread）
+    """
+
+    def __init__(self, max_leagues: int = TENANT_MAX_LEAGUES, on_evict=None):
+        self.max_leagues = max_leagues
+        self.on_evict = on_evict
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, league_key, default=None):
+        with self._lock:
+            if league_key not in self._data:
+                return default
+            self._data.move_to_end(league_key)
+            return self._data[league_key]
+
+    def set(self, league_key, value):
+        with self._lock:
+            self._data[league_key] = value
+            self._data.move_to_end(league_key)
+            evicted = self._evict()
+        self._notify(evicted)
+
+    def get_or_create(self, league_key, factory):
+        with self._lock:
+            if league_key in self._data:
+                self._data.move_to_end(league_key)
+                return self._data[league_key]
+            value = factory()
+            self._data[league_key] = value
+            evicted = self._evict()
+        self._notify(evicted)
+        return value
+
+    def pop(self, league_key, default=None):
+        with self._lock:
+            return self._data.pop(league_key, default)
+
+    def values(self):
+        with self._lock:
+            return list(self._data.values())
+
+    def _evict(self):
+        evicted = []
+        while len(self._data) > self.max_leagues:
+            evicted.append(self._data.popitem(last=False)[1])
+        return evicted
+
+    def _notify(self, evicted):
+        if self.on_evict:
+            for value in evicted:
+                self.on_evict(value)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+# ==============================
+# 群組 → 聯盟 / token 的綁定（SQLite）
+# ==============================
+_TABLE_READY = False
+
+# {group_id: Tenant}
+_REGISTRY = {}
+_LOADED_AT = 0.0
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _ensure_table():
+    global _TABLE_READY
+    if _TABLE_READY:
+        return
+
+    with sqlite_lock():
+        conn = get_sqlite()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tenants (
+                group_id    TEXT PRIMARY KEY,
+                league_key  TEXT,
+                token_sheet TEXT NOT NULL,
+                updated_at  REAL NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS oauth_states (
+                state       TEXT PRIMARY KEY,
+                token_sheet TEXT NOT NULL,
+                group_id    TEXT,
+                expires_at  REAL NOT NULL
+            )
+            """
+        )
+        conn.commit()
+        _TABLE_READY = True
+
+
+def _registry():
+    global _REGISTRY, _LOADED_AT
+
+    if time.time() - _LOADED_AT < TENANT_REGISTRY_TTL:
+        return _REGISTRY
+
+    with _REGISTRY_LOCK:
+        if time.time() - _LOADED_AT < TENANT_REGISTRY_TTL:
+            return _REGISTRY
+        try:
+            _ensure_table()
+            with sqlite_lock():
+                rows = get_sqlite().execute(
+                    "SELECT group_id, league_key, token_sheet FROM tenants"
+                ).fetchall()
+            _REGISTRY = {g: Tenant(g, lk, sheet) for g, lk, sheet in rows}
+        except Exception as e:
+            print("❌ 讀取 tenant 設定失敗：", e)
+        _LOADED_AT = time.time()
+        return _REGISTRY
+
+
+def _invalidate():
+    global _LOADED_AT
+    _LOADED_AT = 0.0
+
+
+def get_tenant(group_id) -> Tenant:
+    """群組的 tenant；沒綁定就是預設 tenant"""
+    if not group_id:
+        return DEFAULT_TENANT
+    return _registry().get(group_id, DEFAULT_TENANT)
+
+
+def is_bound(group_id) -> bool:
+    return bool(group_id) and group_id in _registry()
+
+
+def _save(group_id: str, league_key, token_sheet: str):
+    _ensure_table()
+    with sqlite_lock():
+        conn = get_sqlite()
+        conn.execute(
+            "INSERT OR REPLACE INTO tenants (group_id, league_key, token_sheet, updated_at) "
+            "VALUES (?, ?, ?, ?)",
+            (group_id, league_key, token_sheet, time.time()),
+        )
+        conn.commit()
+    _invalidate()
+
+
+def token_sheet_for(group_id: str) -> str:
+    """群組自己的 token 分頁名稱（不含原始 group_id）"""
+    return f"{DEFAULT_TOKEN_SHEET}_{hashlib.sha1(group_id.encode()).hexdigest()[:8]}"
+
+
+def may_choose_league(group_id) -> bool:
+    """群組可以自己換聯盟嗎：用自己 Yahoo 帳號的可以；用預設帳號的只有 LEAGUE_DEFAULT_TOKEN_GROUPS"""
+    if not group_id:
+        return False
+    return get_tenant(group_id).token_sheet != DEFAULT_TOKEN_SHEET or group_id in LEAGUE_DEFAULT_TOKEN_GROUPS
+
+
+def bind_league(group_id: str, league_key: str) -> Tenant:
+    """群組改用 league_key（token 沿用目前的設定）"""
+    tenant = get_tenant(group_id)
+    _save(group_id, league_key, tenant.token_sheet)
+    return get_tenant(group_id)
+
+
+def bind_own_token(group_id: str) -> Tenant:
+    """
+    群組改用自己的 Yahoo 帳號（token 存在獨立分頁）；聯盟要之後再選。
+    OAuth callback 存好 token 之後才呼叫，登入沒完成就不會動到原本的設定
+    """
+    tenant = get_tenant(group_id)
+    sheet = token_sheet_for(group_id)
+    league_key = tenant.league_key if tenant.token_sheet == sheet else None
+    _save(group_id, league_key, sheet)
+    return get_tenant(group_id)
+
+
+def unbind(group_id: str):
+    """恢復成預設聯盟（還沒完成的 !league login 連結也一起作廢）"""
+    _ensure_table()
+    with sqlite_lock():
+        conn = get_sqlite()
+        conn.execute("DELETE FROM tenants WHERE group_id = ?", (group_id,))
+        conn.execute("DELETE FROM oauth_states WHERE group_id = ?", (group_id,))
+        conn.commit()
+    _invalidate()
+
+
+def create_login_state(group_id=None) -> str:
+    """
+    產生這次登入用的 OAuth state（TENANT_LOGIN_TTL 內有效，只能用一次）。
+    group_id：!league login 的群組（token 存到群組自己的分頁）；None 是登入預設帳號
+    """
+    _ensure_table()
+    token_sheet = token_sheet_for(group_id) if group_id else DEFAULT_TOKEN_SHEET
+    state = secrets.token_urlsafe(24)
+    now = time.time()
+    with sqlite_lock():
+        conn = get_sqlite()
+        conn.execute("DELETE FROM oauth_states WHERE expires_at < ?", (now,))
+        conn.execute(
+            "INSERT INTO oauth_states (state, token_sheet, group_id, expires_at) VALUES (?, ?, ?, ?)",
+            (state, token_sheet, group_id, now + TENANT_LOGIN_TTL),
+        )
+        conn.commit()
+    return state
+
+
+def peek_login_state(state):
+    """state 還有效就回傳對應的 token 分頁（不會用掉）；否則 None"""
+    if not state:
+        return None
+    _ensure_table()
+    with sqlite_lock():
+        row = get_sqlite().execute(
+            "SELECT token_sheet FROM oauth_states WHERE state = ? AND expires_at >= ?",
+            (state, time.time()),
+        ).fetchone()
+    return row[0] if row else None
+
+
+def consume_login_state(state):
+    """
+    OAuth callback 用：核對並刪掉 state，回傳 (token 分頁, 群組 id 或 None)；
+    無效 / 過期 / 已用過回傳 None
+    """
+    if not state:
+        return None
+    _ensure_table()
+    with sqlite_lock():
+        conn = get_sqlite()
+        row = conn.execute(
+            "SELECT token_sheet, group_id, expires_at FROM oauth_states WHERE state = ?", (state,)
+        ).fetchone()
+        # 同一個 state 同時被用兩次時，只有真的刪到那一筆的算數
+        deleted = conn.execute("DELETE FROM oauth_states WHERE state = ?", (state,)).rowcount
+        conn.commit()
+    if not row or not deleted or row[2] < time.time():
+        return None
+    return row[0], row[1]
+
+
+def all_tenants():
+    """每個有設定聯盟的 tenant 各一個（同一個聯盟只列一次），背景工作用"""
+    tenants = {}
+    if DEFAULT_TENANT.league_key:
+        tenants[DEFAULT_TENANT.league_key] = DEFAULT_TENANT
+    for t in _registry().values():
+        if t.league_key:
+            tenants.setdefault(t.league_key, t)
+    return list(tenants.values())
+
+
+def groups_for_league(league_key, group_ids):
+    """group_ids 裡屬於 league_key 的群組（沒綁定的算預設聯盟）"""
+    return [g for g in group_ids if get_tenant(g).league_key == league_key]
+
+
+def get_tenant_stats():
+    registry = _registry()
+    return {
+        "bound_groups": len(registry),
+        "leagues": len({t.league_key for t in registry.values() if t.league_key}),
+        "default_league": DEFAULT_TENANT.league_key,
+    }
+
+
+def run_for_each_tenant(fn):
+    """背景工作用：每個聯盟各跑一次 fn(league_key)，在該 tenant 的 scope 裡執行"""
+    for tenant in all_tenants():
+        with tenant_scope(tenant):
+            try:
+                fn(tenant.league_key)
+            except Exception as e:
+                print(f"❌ {tenant.league_key} 執行失敗：", e)
@@ -0,0 +1,15 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+# 測試用獨立的 SQLite 檔案，不碰到正式的快取
+os.environ.setdefault("SQLITE_PATH", os.path.join(tempfile.mkdtemp(), "test.db"))
+# modules.llm 匯入時就會檢查 key（測試不會真的呼叫 OpenAI）
+os.environ.setdefault("OPENAI_API_KEY", "test")
+# 測試會 import app：LINE 設定檢查要過，不啟動背景排程
+os.environ.setdefault("LINE_CHANNEL_SECRET", "test")
+os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "test")
+os.environ.setdefault("SCHEDULER_ENABLED", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,176 @@
+# tests/test_commands.py
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.commands import CommandRouter, required_argument
+
+
+def _router():
+    router = CommandRouter(threads=4)
+
+    @router.fallback
+    def fallback(ctx):
+        return f"查無指令：{ctx.command}"
+
+    return router
+
+
+def _outcomes(router, name):
+    entry = router.stats()[name]
+    return {k: entry[k] for k in ("ok", "error", "timeout", "busy", "usage")}, entry["latency"]["count"]
+
+
+def test_handler_exception_returns_error_text_and_counts_once():
+    router = _router()
+
+    @router.command("boom")
+    def boom(ctx, args):
+        raise ValueError("壞掉")
+
+    @router.command("slow_boom", timeout=5)
+    def slow_boom(ctx, args):
+        raise ValueError("也壞掉")
+
+    assert "執行失敗：壞掉" in router.dispatch(None, "boom", "")
+    assert "執行失敗：也壞掉" in router.dispatch(None, "slow_boom", "")
+
+    for name in ("boom", "slow_boom"):
+        outcomes, observed = _outcomes(router, name)
+        assert outcomes == {"ok": 0, "error": 1, "timeout": 0, "busy": 0, "usage": 0}
+        assert observed == 1
+        assert router.stats()[name]["running"] == 0
+
+
+def test_timeout_then_failure_is_only_counted_as_timeout():
+    router = _router()
+    release = threading.Event()
+    finished = threading.Event()
+
+    @router.command("stuck", timeout=0.05)
+    def stuck(ctx, args):
+        try:
+            release.wait(5)
+            raise RuntimeError("太晚了")
+        finally:
+            finished.set()
+
+    assert "處理超過" in router.dispatch(None, "stuck", "")
+    release.set()
+    finished.wait(5)
+    # _run 的 finally 在 handler 之後才記錄
+    for _ in range(100):
+        if router.stats()["stuck"]["running"] == 0:
+            break
+        threading.Event().wait(0.01)
+
+    outcomes, observed = _outcomes(router, "stuck")
+    assert outcomes == {"ok": 0, "error": 0, "timeout": 1, "busy": 0, "usage": 0}
+    assert observed == 1
+
+
+def test_busy_is_recorded_the_same_way_sync_and_async():
+    router = _router()
+    release = threading.Event()
+    started = threading.Event()
+
+    @router.command("one", timeout=5, max_concurrency=1)
+    def one(ctx, args):
+        started.set()
+        release.wait(5)
+        return "done"
+
+    worker = threading.Thread(target=router.dispatch, args=(None, "one", ""))
+    worker.start()
+    started.wait(5)
+
+    assert "稍後再試" in router.dispatch(None, "one", "")
+
+    async def never():
+        return "不應該執行"
+
+    assert "稍後再試" in asyncio.run(router.dispatch_async("one", never))
+
+    release.set()
+    worker.join(5)
+
+    outcomes, observed = _outcomes(router, "one")
+    assert outcomes == {"ok": 1, "error": 0, "timeout": 0, "busy": 2, "usage": 0}
+    assert observed == 3
+
+
+def test_async_exception_returns_error_text():
+    router = _router()
+
+    @router.command("nba", timeout=5)
+    def nba(ctx, args):
+        return ""
+
+    async def broken():
+        raise ConnectionError("cdn 掛了")
+
+    assert "執行失敗：cdn 掛了" in asyncio.run(router.dispatch_async("nba", broken))
+    outcomes, _ = _outcomes(router, "nba")
+    assert outcomes["error"] == 1
+
+
+def test_usage_error_and_fallback():
+    router = _router()
+
+    @router.command("player", parser=required_argument("用法：!player <名字>"))
+    def player(ctx, name):
+        return name
+
+    assert router.dispatch(None, "player", "") == "用法：!player <名字>"
+    assert router.dispatch(None, "player", "curry") == "curry"
+    assert router.dispatch(None, "hello", "") == "查無指令：hello"
+    assert router.stats()["player"]["usage"] == 1
+    assert router.stats()["*"]["ok"] == 1
+
+
+def test_dispatch_threaded_runs_handler_once_in_callers_pool():
+    router = _router()
+    threads = []
+
+    @router.command("slow", timeout=5)
+    def slow(ctx, args):
+        threads.append(threading.current_thread().name)
+        return args.upper()
+
+    @router.command("stuck", timeout=0.05)
+    def stuck(ctx, args):
+        threading.Event().wait(0.3)
+        return "太晚了"
+
+    pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="caller")
+    try:
+        assert asyncio.run(router.dispatch_threaded(pool, None, "slow", "curry")) == "CURRY"
+        assert "處理超過" in asyncio.run(router.dispatch_threaded(pool, None, "stuck", ""))
+        assert asyncio.run(router.dispatch_threaded(pool, None, "hello", "")) == "查無指令：hello"
+    finally:
+        pool.shutdown(wait=True)
+
+    # 沒有經過 router 自己的 pool
+    assert threads[0].startswith("caller")
+    assert router._pool is None
+    assert router.stats()["stuck"]["timeout"] == 1
+    assert router.stats()["stuck"]["ok"] == 0
+
+
+def test_message_scope_puts_unregistered_commands_in_one_bucket():
+    from types import SimpleNamespace
+
+    import app
+    from modules import sheet_utils
+    from modules.commands import FALLBACK_NAME
+
+    def scope_of(text):
+        event = SimpleNamespace(message=SimpleNamespace(text=text))
+        with app.message_scope(event, tenant=app.get_tenant(None)):
+            return sheet_utils._CURRENT_SCOPE.get()
+
+    assert scope_of("!NBA today") == "nba"
+    assert scope_of("!whatever") == FALLBACK_NAME
+    assert scope_of("!another-typo") == FALLBACK_NAME
+    assert scope_of("!") == FALLBACK_NAME
+    assert scope_of("hello") == "group_message"
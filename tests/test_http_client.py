@@ -0,0 +1,43 @@
+# tests/test_http_client.py
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from modules.http_client import get_http_stats, http_get
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_keep_alive_requests_reuse_one_connection(server):
+    before = get_http_stats()
+
+    for _ in range(3):
+        assert http_get(server + "/").text == "ok"
+
+    after = get_http_stats()
+    assert after["requests"] - before["requests"] == 3
+    assert after["connections"] - before["connections"] == 1
+    assert after["pool_hits"] - before["pool_hits"] == 2
@@ -0,0 +1,59 @@
+# tests/test_injury_feed.py
+from modules.fantasy.injury_feed import (
+    diff_snapshots,
+    format_alert,
+    load_snapshots,
+    save_snapshots,
+)
+
+
+def _snap(name, status=None, injury=None, notes_ts=None, team="GSW"):
+    return {"name": name, "team": team, "status": status, "injury": injury, "notes_ts": notes_ts}
+
+
+def test_diff_snapshots_reports_status_injury_and_note_changes():
+    old = {
+        "p1": _snap("Curry", "GTD", "Ankle"),
+        "p2": _snap("Green"),
+        "p3": _snap("Kuminga", notes_ts="100"),
+        "p4": _snap("Podziemski"),
+    }
+    new = {
+        "p1": _snap("Curry", "O", "Ankle"),
+        "p2": _snap("Green", injury="Back"),
+        "p3": _snap("Kuminga", notes_ts="200"),
+        "p4": _snap("Podziemski"),
+    }
+
+    assert [key for key, _, _ in diff_snapshots(old, new)] == ["p1", "p2", "p3"]
+
+
+def test_diff_snapshots_ignores_new_players_and_none_vs_empty():
+    old = {"p1": _snap("Curry", status=None, injury="")}
+    new = {
+        # None 和空字串視為一樣
+        "p1": _snap("Curry", status="", injury=None),
+        # 新加入名單（之前沒有紀錄）不算異動，就算已經是 O
+        "p9": _snap("Rookie", "O", "Knee"),
+    }
+
+    assert diff_snapshots(old, new) == []
+    assert diff_snapshots({}, new) == []
+
+
+def test_snapshots_are_stored_per_league():
+    save_snapshots("nba.l.a", {"p1": _snap("Curry", "GTD")})
+    save_snapshots("nba.l.b", {"p1": _snap("Curry", "O")})
+
+    assert load_snapshots("nba.l.a")["p1"]["status"] == "GTD"
+    assert load_snapshots("nba.l.b")["p1"]["status"] == "O"
+    assert load_snapshots("nba.l.c") == {}
+
+
+def test_format_alert_shows_transition_owner_and_note():
+    changes = [("p1", _snap("Curry", "GTD"), _snap("Curry", "O", "Ankle"))]
+    text = format_alert(changes, {"p1": {"content": "Out Friday"}}, {"p1": "Alpha"})
+
+    assert "Curry（GSW，Alpha）：GTD → O" in text
+    assert "傷勢：Ankle" in text
+    assert "📘 Out Friday" in text
@@ -0,0 +1,46 @@
+# tests/test_live.py
+from modules.fantasy import live
+from modules.tenants import Tenant
+
+
+class _Tracker(live.LiveTracker):
+    """不抓 NBA，只數 poll 次數"""
+
+    def poll(self):
+        self._count("polls")
+        return False
+
+
+def test_tracker_stops_when_idle_and_restarts_on_use(monkeypatch):
+    monkeypatch.setattr(live, "LIVE_IDLE_INTERVAL", 0.01)
+    tracker = _Tracker(Tenant("g", "nba.l.1"))
+
+    monkeypatch.setattr(live, "LIVE_IDLE_STOP", 0.05)
+    tracker.start()
+    thread = tracker._thread
+    thread.join(5)
+    assert not thread.is_alive()
+    assert tracker._thread is None
+    assert tracker.stats()["polls"] > 0
+
+    # 再用一次 !live 就重新啟動
+    tracker.start()
+    thread = tracker._thread
+    assert thread is not None
+    tracker.stop()
+    thread.join(5)
+    assert tracker._thread is None
+
+
+def test_evicted_tracker_stops_and_is_not_restarted(monkeypatch):
+    monkeypatch.setattr(live, "LIVE_IDLE_INTERVAL", 0.01)
+    tracker = _Tracker(Tenant("g", "nba.l.2"))
+    tracker.start()
+    thread = tracker._thread
+
+    tracker.stop()
+    thread.join(5)
+    assert not thread.is_alive()
+
+    tracker.start()
+    assert tracker._thread is None
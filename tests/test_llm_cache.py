@@ -0,0 +1,85 @@
+# tests/test_llm_cache.py
+import threading
+import time
+
+from modules.llm_cache import TTLCache, analysis_key, cached_analysis, llm_cache
+from modules.tenants import Tenant, tenant_scope
+
+
+def test_different_stat_payloads_give_different_keys():
+    a = analysis_key("last14", ["p1"], [{"12": 50, "0": 2}])
+    b = analysis_key("last14", ["p1"], [{"12": 48, "0": 2}])
+    assert a != b
+
+
+def test_same_payload_in_any_order_gives_same_key():
+    a = analysis_key("value", ["p1"], [{"12": 50, "5": 0.5}, "z"])
+    b = analysis_key("value", ["p1"], [{"5": 0.5, "12": 50}, "z"])
+    assert a == b
+
+
+def test_key_depends_on_league_and_player_order():
+    with tenant_scope(Tenant("g1", "L1")):
+        k1 = analysis_key("vs", ["a", "b"], ["x"])
+        k2 = analysis_key("vs", ["b", "a"], ["x"])
+    with tenant_scope(Tenant("g2", "L2")):
+        k3 = analysis_key("vs", ["a", "b"], ["x"])
+    assert len({k1, k2, k3}) == 3
+
+
+def test_ttl_cache_expires_and_evicts_lru():
+    cache = TTLCache(maxsize=2, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+
+def test_ttl_cache_partition_limit_keeps_other_partitions():
+    cache = TTLCache(maxsize=10, ttl=60, partition_size=2)
+    cache.set(("L1", 1), "a")
+    cache.set(("L2", 1), "b")
+    cache.set(("L1", 2), "c")
+    cache.set(("L1", 3), "d")
+
+    assert cache.get(("L1", 1)) is None
+    assert cache.get(("L2", 1)) == "b"
+    assert cache.stats()["partitions"] == 2
+
+
+def test_cached_analysis_computes_once_for_concurrent_callers():
+    calls = []
+    started = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return "analysis"
+
+    payload = [{"12": time.time()}]
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cached_analysis("t", ["p"], payload, compute)))
+        for _ in range(4)
+    ]
+    threads[0].start()
+    started.wait(1)
+    for t in threads[1:]:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == ["analysis"] * 4
+    assert len(calls) == 1
+
+
+def test_cached_analysis_skips_results_rejected_by_should_cache():
+    payload = [{"x": time.time()}]
+    cached_analysis("t", ["p"], payload, lambda: "partial", should_cache=lambda _: False)
+    assert llm_cache.get(analysis_key("t", ["p"], payload)) is None
@@ -0,0 +1,117 @@
+# tests/test_matchup.py
+import datetime
+import itertools
+
+import numpy as np
+import pytest
+
+from modules.fantasy import matchup
+from modules.fantasy.stat_schema import GP_STAT_ID
+from modules.fantasy.stats_cache import NBA_TZ
+from modules.fantasy.trade import RosterSnapshot
+
+# project_week 用的是真正的「今天」（NBA 時區）
+TODAY = datetime.datetime.now(NBA_TZ).date()
+WEEK_END = TODAY + datetime.timedelta(days=6)
+
+
+def _stats(pts, gp=10):
+    return {GP_STAT_ID: gp, "12": pts * gp, "15": 5 * gp, "16": 3 * gp, "17": gp, "18": gp,
+            "10": gp, "19": 2 * gp, "9004003": f"{5 * gp}/{10 * gp}", "9007006": f"{4 * gp}/{5 * gp}"}
+
+
+def _snapshot():
+    teams = {
+        "t.1": {"name": "Alpha", "is_mine": True, "players": [
+            {"player_key": "a1", "name": "A One", "team": "GS"},
+            {"player_key": "a2", "name": "A Two", "team": "GS", "status": "O"},
+        ]},
+        "t.2": {"name": "Beta", "is_mine": False, "players": [
+            {"player_key": "b1", "name": "B One", "team": "BOS"},
+        ]},
+    }
+    stats = {"a1": _stats(30), "a2": _stats(40), "b1": _stats(10)}
+    return RosterSnapshot(None, teams, stats)
+
+
+def _scoreboard(stats_a=None, stats_b=None):
+    return {
+        "week": 10,
+        "week_end": WEEK_END.isoformat(),
+        "matchups": [[
+            {"team_key": "t.1", "name": "Alpha", "stats": stats_a or {}},
+            {"team_key": "t.2", "name": "Beta", "stats": stats_b or {}},
+        ]],
+    }
+
+
+@pytest.fixture
+def league(monkeypatch):
+    snapshot = _snapshot()
+    schedule = []
+    monkeypatch.setattr(matchup, "get_roster_snapshot", lambda league_key: snapshot)
+    monkeypatch.setattr(matchup, "get_schedule", lambda: schedule)
+    return snapshot, schedule
+
+
+def test_win_distribution_matches_brute_force():
+    p = np.array([[0.9, 0.5, 0.2, 0.6], [0.0, 1.0, 0.5, 0.5]])
+    dist = matchup._win_distribution(p)
+
+    for row, probs in zip(dist, p):
+        expected = np.zeros(len(probs) + 1)
+        for outcome in itertools.product([0, 1], repeat=len(probs)):
+            weight = np.prod([q if won else 1 - q for q, won in zip(probs, outcome)])
+            expected[sum(outcome)] += weight
+        assert np.allclose(row, expected)
+        assert row.sum() == pytest.approx(1.0)
+
+
+def test_games_remaining_skips_started_games_today(league):
+    _, schedule = league
+    schedule += [
+        (TODAY, "GSW", "BOS", "g1"),
+        (TODAY, "LAL", "BOS", "g2"),
+        (TODAY + datetime.timedelta(days=2), "GSW", "LAL", "g3"),
+        (WEEK_END + datetime.timedelta(days=1), "GSW", "BOS", "g4"),
+    ]
+
+    counts = matchup.games_remaining(WEEK_END, today=TODAY, today_status={"g2": matchup.GAME_FINAL})
+
+    assert counts == {"GSW": 2, "BOS": 1, "LAL": 1}
+
+
+def test_project_week_favours_team_with_more_volume(league):
+    _, schedule = league
+    for day in range(3):
+        schedule.append((TODAY + datetime.timedelta(days=day), "GSW", "BOS", f"g{day}"))
+
+    projection = matchup.project_week("nba.l.1", _scoreboard(), today_status={})
+    m = projection["matchups"][0]
+    pts = projection["labels"].index("PTS")
+    alpha, beta = m["teams"]
+
+    # 受傷的 a2 不算剩餘場次：30 × 3 vs 10 × 3
+    assert alpha["final"][pts] == pytest.approx(90)
+    assert beta["final"][pts] == pytest.approx(30)
+    assert alpha["games"] == 3
+    assert m["cat_prob"][pts] > 0.9
+    assert 0.0 <= m["win"] + m["tie"] <= 1.0
+    assert m["expected_cats"] == pytest.approx(m["cat_prob"].sum())
+
+
+def test_project_week_with_no_games_left_uses_current_totals(league):
+    labels = league[0].labels
+    # 週末最後：沒有剩餘場次，結果已經確定
+    projection = matchup.project_week(
+        "nba.l.1",
+        _scoreboard({"12": "100", "19": "5"}, {"12": "80", "19": "9"}),
+        today_status={},
+    )
+    prob = projection["matchups"][0]["cat_prob"]
+
+    assert prob[labels.index("PTS")] == 1.0
+    # TO 少的贏
+    assert prob[labels.index("TO")] == 1.0
+    # 兩隊一樣（都是 0）就是 50%
+    assert prob[labels.index("REB")] == 0.5
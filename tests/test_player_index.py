@@ -0,0 +1,88 @@
+# tests/test_player_index.py
+from modules.fantasy import player_index
+from modules.fantasy.player_index import PlayerIndex, fuzzy_match, name_parts, normalize_name
+
+PLAYERS = [
+    {"player_key": "1", "name": "Nikola Jokić"},
+    {"player_key": "2", "name": "Shai Gilgeous-Alexander"},
+    {"player_key": "3", "name": "Jaren Jackson Jr."},
+    {"player_key": "4", "name": "Jalen Green"},
+    {"player_key": "5", "name": "Jalen Brunson"},
+    {"player_key": "6", "name": "Stephen Curry"},
+    {"player_key": "7", "name": "Seth Curry"},
+]
+
+
+def _index():
+    index = PlayerIndex("test.l.1")
+    index.build(PLAYERS)
+    return index
+
+
+def _key(player):
+    return player["player_key"] if player else None
+
+
+def test_normalize_name_strips_accents_and_punctuation():
+    assert normalize_name("Nikola Jokić") == "nikola jokic"
+    assert normalize_name("  Shai Gilgeous-Alexander ") == "shai gilgeous alexander"
+    assert normalize_name("D'Angelo Russell") == "dangelo russell"
+    assert name_parts(normalize_name("Jaren Jackson Jr.")) == ["jaren", "jackson"]
+
+
+def test_lookup_full_name_nickname_acronym_and_unique_parts():
+    index = _index()
+    assert _key(index.lookup("nikola jokic")) == "1"
+    assert _key(index.lookup("joker")) == "1"
+    assert _key(index.lookup("SGA")) == "2"
+    assert _key(index.lookup("jjj")) == "3"
+    assert _key(index.lookup("brunson")) == "5"
+    # 兩位 Curry、兩位 Jalen：不唯一就不當 alias
+    assert index.lookup("curry") is None
+    assert index.lookup("jalen") is None
+
+
+def test_lookup_resolves_clear_typo():
+    index = _index()
+    assert _key(index.lookup("nikola jokkic")) == "1"
+    assert _key(index.lookup("brunsen")) == "5"
+
+
+def test_lookup_rejects_typo_close_to_two_players():
+    # 和 Stephen Curry、Seth Curry 都差 2 個字，不猜
+    assert _index().lookup("sethen curry") is None
+    # 明顯比較接近其中一位就可以
+    assert _key(_index().lookup("steth curry")) == "7"
+
+
+def test_fuzzy_match_requires_margin_over_runner_up():
+    a = {"player_key": "a"}
+    b = {"player_key": "b"}
+    candidates = [("jackson", a), ("jackman", b)]
+
+    # jacksen：a 差 1，b 差 2 → 差距不到 2
+    assert fuzzy_match("jacksen", candidates) is None
+    assert _key(fuzzy_match("jacksen", candidates, margin=1)) == "a"
+    assert _key(fuzzy_match("jacksen", [("jackson", a)])) == "a"
+
+
+def test_fuzzy_match_only_scans_same_first_letter():
+    # 開頭字母打錯就不會出現在候選裡
+    assert _index().lookup("kokic") is None
+
+
+def test_remembered_queries_are_capped_and_cleared_on_rebuild(monkeypatch):
+    monkeypatch.setattr(player_index, "TENANT_MAX_ENTRIES", 2)
+    index = _index()
+    rookie = {"player_key": "9", "name": "Rookie One"}
+
+    for query in ("rook", "rookie 1", "r one"):
+        index.remember(query, rookie)
+
+    # 最早記住的查詢被擠掉
+    assert index.lookup("rook") is None
+    assert _key(index.lookup("rookie 1")) == "9"
+    assert _key(index.lookup("r one")) == "9"
+
+    index.build(PLAYERS)
+    assert index.lookup("r one") is None
@@ -0,0 +1,23 @@
+# tests/test_player_stats.py
+from modules.fantasy.player_stats import summarize_stats
+from modules.fantasy.stat_schema import GP_STAT_ID
+
+
+def test_summarize_stats_reads_stat_ids_as_per_game_lines():
+    stats = {GP_STAT_ID: 2, "12": 50, "15": 12, "5": 0.556, "9004003": "20/36", "19": 4}
+
+    assert summarize_stats(stats).splitlines() == [
+        "出賽: 2 場",
+        "PTS: 25.0",
+        "REB: 6.0",
+        "FG%: 0.556",
+        "TO: 2.0",
+    ]
+
+
+def test_summarize_stats_without_games_keeps_totals():
+    assert summarize_stats({"12": "30"}) == "PTS: 30.0"
+
+
+def test_summarize_stats_empty():
+    assert summarize_stats({}) == ""
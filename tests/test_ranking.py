@@ -0,0 +1,135 @@
+# tests/test_ranking.py
+import numpy as np
+
+from modules.fantasy.fa import rank_fa
+from modules.fantasy.ranking import (
+    Baseline,
+    StatMatrix,
+    FOCUS_WEIGHT,
+    parse_category_args,
+    scoring_columns,
+    variant_weights,
+)
+from modules.fantasy.stat_schema import StatSchema, GP_STAT_ID
+
+SCHEMA = StatSchema.default()
+COLUMNS = scoring_columns(SCHEMA)
+
+
+def _daily(pts, reb, fgm, fga, ftm, fta):
+    return {
+        "12": pts, "15": reb, "16": 3, "17": 1, "18": 0, "10": 2, "19": 2,
+        # 單日命中率：不能直接加總
+        "5": fgm / fga, "8": ftm / fta,
+        "9004003": f"{fgm}/{fga}", "9007006": f"{ftm}/{fta}",
+    }
+
+
+def test_combine_days_counts_games_and_recomputes_percentages():
+    days = [_daily(20, 5, 8, 16, 4, 5), _daily(30, 7, 12, 20, 2, 5), {}]
+    total = SCHEMA.combine_days(days)
+
+    assert total[GP_STAT_ID] == 2
+    assert total["12"] == 50
+    assert total["9004003"] == "20/36"
+    assert total["5"] == round(20 / 36, 3)
+    assert total["8"] == round(6 / 10, 3)
+
+
+def test_combine_days_without_games_is_empty():
+    assert SCHEMA.combine_days([{}, {}]) == {}
+
+
+def test_combine_days_skips_percent_without_ratio_column():
+    schema = StatSchema.compile({"PTS": "12", "FG%": "5"})
+    total = schema.combine_days([{"12": 10, "5": 0.5}, {"12": 20, "5": 0.4}])
+
+    assert total == {"12": 30, GP_STAT_ID: 2}
+
+
+def test_summed_daily_rows_match_yahoo_lastweek_rows():
+    summed = SCHEMA.combine_days([_daily(20, 5, 8, 16, 4, 5), _daily(30, 7, 12, 20, 2, 5)])
+    # Yahoo stats;type=lastweek：總和 + 場數 + 命中 / 出手
+    yahoo = {
+        GP_STAT_ID: "2", "12": "50", "15": "12", "16": "6", "17": "2", "18": "0",
+        "10": "4", "19": "4", "5": ".556", "8": ".600",
+        "9004003": "20/36", "9007006": "6/10",
+    }
+
+    matrix = StatMatrix.build([({"player_key": "a"}, summed), ({"player_key": "b"}, yahoo)], COLUMNS)
+
+    assert np.allclose(matrix.values[0], matrix.values[1], atol=1e-3, equal_nan=True)
+    assert np.allclose(matrix.attempts[0], matrix.attempts[1])
+    # 場均：50 分 / 2 場
+    pts = [c.label for c in COLUMNS].index("PTS")
+    assert matrix.values[0][pts] == 25
+
+
+def test_rank_fa_mixed_recent_sources_are_comparable():
+    season = {GP_STAT_ID: "40", "12": "800", "15": "200", "16": "120", "17": "40", "18": "20",
+              "10": "60", "19": "80", "5": ".500", "8": ".800",
+              "9004003": "300/600", "9007006": "80/100"}
+    yahoo_recent = {GP_STAT_ID: "2", "12": "50", "15": "12", "16": "6", "17": "2", "18": "0",
+                    "10": "4", "19": "4", "5": ".556", "8": ".600",
+                    "9004003": "20/36", "9007006": "6/10"}
+    summed_recent = SCHEMA.combine_days([_daily(20, 5, 8, 16, 4, 5), _daily(30, 7, 12, 20, 2, 5)])
+    weaker = SCHEMA.combine_days([_daily(5, 2, 2, 8, 0, 2)] * 3)
+
+    players = [
+        {"player_key": "yahoo", "name": "A", "team": "X", "season": season, "lastweek": yahoo_recent},
+        {"player_key": "summed", "name": "B", "team": "X", "season": season, "lastweek": summed_recent},
+        {"player_key": "weak", "name": "C", "team": "X", "season": season, "lastweek": weaker},
+    ]
+
+    ranked = {r["player_key"]: r for r in rank_fa(players)}
+
+    assert abs(ranked["yahoo"]["recent"] - ranked["summed"]["recent"]) < 0.05
+    assert ranked["weak"]["recent"] < ranked["summed"]["recent"]
+
+
+def _line(pts, to, fgm, fga, gp=1):
+    return {GP_STAT_ID: gp, "12": pts, "15": 5, "16": 5, "17": 1, "18": 1, "10": 1, "19": to,
+            "9004003": f"{fgm}/{fga}", "9007006": "4/5"}
+
+
+def test_variant_weights_focus_punt_and_punt_rows():
+    labels = ["PTS", "REB", "TO"]
+    names, W = variant_weights(labels, focus=["REB"], punt=["TO"])
+
+    assert names == ["main", "all", "punt PTS", "punt REB", "punt TO"]
+    assert W[0].tolist() == [1.0, FOCUS_WEIGHT, 0.0]
+    assert W[1].tolist() == [1.0, 1.0, 1.0]
+    # 每一列 punt 版本只把自己那一項歸零
+    assert W[2:].tolist() == [[0, 1, 1], [1, 0, 1], [1, 1, 0]]
+
+
+def test_parse_category_args_aliases_and_punt():
+    focus, punt = parse_category_args(["reb", "AST", "punt", "to", "3", "ft%"])
+
+    assert focus == ["REB", "AST", "3PTM", "FT%"]
+    assert punt == ["TO"]
+
+
+def test_baseline_reverses_turnovers_and_weights_percent_by_attempts():
+    rows = [
+        ({"player_key": "avg"}, _line(20, 2, 9, 20)),
+        # 命中率 50%（聯盟平均附近）
+        ({"player_key": "volume"}, _line(20, 2, 10, 20)),
+        # 失誤多的 TO z-score 要是負的
+        ({"player_key": "sloppy"}, _line(20, 6, 9, 20)),
+        # 命中率高但出手很少：影響比高出手的小
+        ({"player_key": "efficient_low"}, _line(20, 2, 3, 4)),
+        ({"player_key": "efficient_high"}, _line(20, 2, 15, 20)),
+    ]
+    matrix = StatMatrix.build(rows, COLUMNS)
+    baseline = Baseline.fit(matrix, COLUMNS)
+    Z = baseline.zscores(matrix)
+    labels = [c.label for c in COLUMNS]
+    to, fg = labels.index("TO"), labels.index("FG%")
+
+    assert Z[2, to] < 0 < Z[0, to]
+    # 聯盟命中率用總命中 / 總出手
+    assert np.isclose(baseline.league_pct[fg], (9 + 10 + 9 + 3 + 15) / (20 * 4 + 4))
+    assert Z[4, fg] > Z[3, fg] > Z[0, fg]
+    # 沒有差異的項目（REB）z-score 都是 0，不會除以 0
+    assert np.allclose(Z[:, labels.index("REB")], 0)
@@ -0,0 +1,96 @@
+# tests/test_scheduler.py
+import os
+
+import pytest
+
+from modules import scheduler as scheduler_module
+from modules.scheduler import Job, Scheduler
+
+# 沒有 fcntl（Windows）時排程只用 process 內的鎖
+fcntl = pytest.importorskip("fcntl")
+
+
+@pytest.fixture(autouse=True)
+def lock_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(scheduler_module, "SCHEDULER_LOCK_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _scheduler(name, fn, **kwargs):
+    s = Scheduler(tick=0.01)
+    s.register(Job(name, fn, **kwargs))
+    return s
+
+
+def test_job_runs_once_per_interval_across_workers():
+    calls = []
+    worker_a = _scheduler("interval_job", lambda: calls.append("a"), interval=3600)
+    worker_b = _scheduler("interval_job", lambda: calls.append("b"), interval=3600)
+
+    worker_a.run_pending()
+    # 另一個 worker 看到 SQLite 裡的紀錄，不會再跑一次
+    worker_b.run_pending()
+    worker_a.run_pending()
+
+    assert calls == ["a"]
+    assert worker_a.stats()["jobs"]["interval_job"]["runs"] == 1
+
+
+def test_trigger_change_runs_early_after_min_gap():
+    calls = []
+    token = {"value": 1}
+    s = _scheduler("trigger_job", lambda: calls.append(token["value"]),
+                   interval=3600, trigger=lambda: token["value"], min_gap=0)
+
+    s.run_pending()
+    s.run_pending()
+    assert calls == [1]
+
+    # 例如今天又有比賽打完
+    token["value"] = 2
+    s.run_pending()
+    assert calls == [1, 2]
+
+
+def test_trigger_respects_min_gap():
+    calls = []
+    token = {"value": 1}
+    s = _scheduler("gap_job", lambda: calls.append(token["value"]),
+                   interval=3600, trigger=lambda: token["value"], min_gap=3600)
+
+    s.run_pending()
+    token["value"] = 2
+    s.run_pending()
+
+    assert calls == [1]
+
+
+def test_locked_job_is_skipped(lock_dir):
+    calls = []
+    s = _scheduler("locked_job", lambda: calls.append(1), interval=0)
+
+    # 模擬另一個 worker 正在跑（不同的 open file 會互相擋住 flock）
+    with open(os.path.join(lock_dir, "line-bot-locked_job.lock"), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        s.run_pending()
+
+    assert calls == []
+    assert s.stats()["jobs"]["locked_job"]["skipped_locked"] == 1
+
+    # 鎖放掉之後就可以跑
+    s.run_pending()
+    assert calls == [1]
+
+
+def test_failed_job_is_recorded_and_not_retried_every_tick():
+    def boom():
+        raise RuntimeError("Yahoo 掛了")
+
+    s = _scheduler("failing_job", boom, interval=3600)
+    s.run_pending()
+    s.run_pending()
+
+    stats = s.stats()["jobs"]["failing_job"]
+    assert stats["runs"] == 1
+    assert stats["failures"] == 1
+    assert stats["last_run"] > 0
@@ -0,0 +1,103 @@
+# tests/test_tenants.py
+import app
+from modules import tenants
+from modules.tenants import bind_league, bind_own_token, may_choose_league, unbind
+
+
+def test_default_token_groups_cannot_choose_league_unless_allowed(monkeypatch):
+    unbind("group-default")
+    assert not may_choose_league("group-default")
+    assert not may_choose_league("")
+
+    monkeypatch.setattr(tenants, "LEAGUE_DEFAULT_TOKEN_GROUPS", {"group-default"})
+    assert may_choose_league("group-default")
+
+    # 綁了預設帳號的其他聯盟也一樣用預設 token
+    bind_league("group-bound", "nba.l.1")
+    assert not may_choose_league("group-bound")
+    unbind("group-bound")
+
+
+def test_own_token_groups_can_choose_league():
+    bind_own_token("group-own")
+    assert may_choose_league("group-own")
+    unbind("group-own")
+    assert not may_choose_league("group-own")
+
+
+def test_login_state_is_random_single_use_and_expires(monkeypatch):
+    sheet = tenants.token_sheet_for("group-login")
+    state = tenants.create_login_state("group-login")
+
+    assert state != sheet
+    assert state != tenants.create_login_state("group-login")
+    assert tenants.peek_login_state(state) == sheet
+    # 分頁名稱本身不是有效的 state
+    assert tenants.consume_login_state(sheet) is None
+
+    assert tenants.consume_login_state(state) == (sheet, "group-login")
+    assert tenants.consume_login_state(state) is None
+    assert tenants.peek_login_state(state) is None
+
+    # 預設帳號的登入不屬於任何群組
+    assert tenants.consume_login_state(tenants.create_login_state()) == (tenants.DEFAULT_TOKEN_SHEET, None)
+
+    monkeypatch.setattr(tenants, "TENANT_LOGIN_TTL", -1)
+    expired = tenants.create_login_state("group-login")
+    assert tenants.peek_login_state(expired) is None
+    assert tenants.consume_login_state(expired) is None
+
+
+def test_pending_login_keeps_current_binding_until_reset():
+    bind_league("group-pending", "nba.l.1")
+    state = tenants.create_login_state("group-pending")
+
+    # 登入還沒完成：群組照舊用原本的聯盟和 token
+    tenant = tenants.get_tenant("group-pending")
+    assert (tenant.league_key, tenant.token_sheet) == ("nba.l.1", tenants.DEFAULT_TOKEN_SHEET)
+
+    # 途中 !league reset 的話連結也作廢
+    unbind("group-pending")
+    assert tenants.consume_login_state(state) is None
+
+
+class _TokenResponse:
+    def __init__(self, result):
+        self.result = result
+        self.text = str(result)
+
+    def json(self):
+        return self.result
+
+
+def test_group_switches_token_sheet_only_after_login_succeeds(monkeypatch):
+    saved = []
+    monkeypatch.setattr(app, "save_yahoo_token", lambda *args, token_sheet: saved.append(token_sheet))
+    bind_league("group-callback", "nba.l.1")
+
+    login, _, error = app.yahoo_code_exchange("code", tenants.create_login_state("group-callback"))
+    assert error is None
+    app.yahoo_save_login(_TokenResponse({"error": "invalid_grant"}), login)
+    assert tenants.get_tenant("group-callback").league_key == "nba.l.1"
+
+    login, _, _ = app.yahoo_code_exchange("code", tenants.create_login_state("group-callback"))
+    app.yahoo_save_login(
+        _TokenResponse({"access_token": "a", "refresh_token": "r", "expires_in": 3600}), login
+    )
+    tenant = tenants.get_tenant("group-callback")
+    assert saved == [tenants.token_sheet_for("group-callback")]
+    assert (tenant.league_key, tenant.token_sheet) == (None, saved[0])
+    unbind("group-callback")
+
+
+def test_league_cache_evicts_least_recently_used_and_notifies():
+    evicted = []
+    cache = tenants.LeagueCache(max_leagues=2, on_evict=evicted.append)
+    cache.set("a", "A")
+    cache.get_or_create("b", lambda: "B")
+    cache.get("a")
+    cache.get_or_create("c", lambda: "C")
+
+    assert evicted == ["B"]
+    assert cache.get("b") is None
+    assert sorted(cache.values()) == ["A", "C"]
@@ -0,0 +1,69 @@
+# tests/test_token_cache.py
+import datetime
+
+import pytest
+
+import app
+
+SHEET = "yahoo_token_test"
+
+
+@pytest.fixture
+def yahoo(monkeypatch):
+    calls = {"load": 0, "post": 0}
+    expired = (datetime.datetime.utcnow() - datetime.timedelta(hours=1)).isoformat()
+
+    def load(token_sheet=None):
+        calls["load"] += 1
+        return "old-access", "refresh", expired
+
+    def post(*args, **kwargs):
+        calls["post"] += 1
+        raise ConnectionError("Yahoo 掛了")
+
+    monkeypatch.setattr(app, "load_yahoo_token", load)
+    monkeypatch.setattr(app, "http_post", post)
+    monkeypatch.setattr(app, "_YAHOO_TOKENS", {})
+    monkeypatch.setattr(app, "_YAHOO_TOKEN_RETRY_AT", {})
+    return calls
+
+
+def test_failed_refresh_backs_off_per_token_sheet(yahoo, monkeypatch):
+    assert app.refresh_yahoo_token_if_needed(SHEET) == "old-access"
+    assert app.refresh_yahoo_token_if_needed(SHEET) == "old-access"
+    assert app.refresh_yahoo_token_if_needed(SHEET) == "old-access"
+    # 失敗後不再每次都讀 Sheet、打 Token API
+    assert yahoo == {"load": 1, "post": 1}
+
+    # 別的 tenant 的分頁不受影響
+    app.refresh_yahoo_token_if_needed(SHEET + "_other")
+    assert yahoo == {"load": 2, "post": 2}
+
+    # backoff 過了才再試
+    monkeypatch.setitem(app._YAHOO_TOKEN_RETRY_AT, SHEET, 0)
+    app.refresh_yahoo_token_if_needed(SHEET)
+    assert yahoo == {"load": 3, "post": 3}
+
+
+def test_missing_token_is_backed_off_too(yahoo, monkeypatch):
+    monkeypatch.setattr(app, "load_yahoo_token", lambda token_sheet=None: (None, None, None))
+
+    assert app.refresh_yahoo_token_if_needed(SHEET) is None
+    assert app.refresh_yahoo_token_if_needed(SHEET) is None
+    assert yahoo["post"] == 0
+    assert SHEET in app._YAHOO_TOKEN_RETRY_AT
+
+
+def test_new_login_clears_backoff(yahoo, monkeypatch):
+    def no_sheets(*args, **kwargs):
+        raise RuntimeError("Sheets 也掛了")
+
+    # Sheet 寫入失敗也要用記憶體裡的新 token
+    monkeypatch.setattr(app, "get_worksheet", no_sheets)
+    app.refresh_yahoo_token_if_needed(SHEET)
+    assert SHEET in app._YAHOO_TOKEN_RETRY_AT
+
+    app.save_yahoo_token("new-access", "new-refresh", 3600, token_sheet=SHEET)
+
+    assert SHEET not in app._YAHOO_TOKEN_RETRY_AT
+    assert app.refresh_yahoo_token_if_needed(SHEET) == "new-access"
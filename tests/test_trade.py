@@ -0,0 +1,110 @@
+# tests/test_trade.py
+import threading
+
+import numpy as np
+import pytest
+
+from modules.fantasy import trade
+from modules.fantasy.stat_schema import GP_STAT_ID
+from modules.fantasy.trade import RosterSnapshot, TradeError, parse_trade_argument
+
+
+def _stats(pts, fgm, fga, gp=10):
+    return {GP_STAT_ID: gp, "12": pts * gp, "15": 5 * gp, "16": 3 * gp, "17": gp, "18": gp,
+            "10": gp, "19": 2 * gp, "9004003": f"{fgm * gp}/{fga * gp}", "9007006": f"{4 * gp}/{5 * gp}"}
+
+
+def _snapshot():
+    teams = {
+        "t.1": {"name": "Alpha", "is_mine": True, "players": [
+            {"player_key": "curry", "name": "Stephen Curry"},
+            {"player_key": "green", "name": "Draymond Green"},
+        ]},
+        "t.2": {"name": "Beta", "is_mine": False, "players": [
+            {"player_key": "tatum", "name": "Jayson Tatum"},
+            {"player_key": "white", "name": "Derrick White"},
+        ]},
+    }
+    stats = {
+        "curry": _stats(26, 9, 19),
+        "green": _stats(8, 3, 6),
+        "tatum": _stats(27, 9, 20),
+        "white": _stats(15, 5, 11),
+    }
+    return RosterSnapshot(None, teams, stats)
+
+
+def test_parse_trade_argument_formats():
+    assert parse_trade_argument("Curry, Green for Tatum") == (["Curry", "Green"], ["Tatum"])
+    assert parse_trade_argument("Curry + Green ↔ Tatum、White") == (["Curry", "Green"], ["Tatum", "White"])
+    assert parse_trade_argument("柯瑞 換 Tatum") == (["柯瑞"], ["Tatum"])
+    # 舊格式：1 換 1
+    assert parse_trade_argument("Curry Lillard") == (["Curry"], ["Lillard"])
+    assert parse_trade_argument("Curry") is None
+    assert parse_trade_argument("Curry for ") is None
+    assert parse_trade_argument("") is None
+
+
+def test_team_totals_sums_counting_and_pools_percentages():
+    snapshot = _snapshot()
+    totals = snapshot.team_totals(["curry", "green"])
+    labels = snapshot.labels
+
+    assert totals[labels.index("PTS")] == pytest.approx(34)
+    assert totals[labels.index("REB")] == pytest.approx(10)
+    # FG%：總命中 / 總出手，不是兩人命中率的平均
+    assert totals[labels.index("FG%")] == pytest.approx(12 / 25)
+    assert snapshot.team_totals(["nobody"]).tolist() == [0.0] * len(labels)
+
+
+def test_evaluate_two_for_one_moves_totals_between_teams():
+    snapshot = _snapshot()
+    result = snapshot.evaluate(["curry", "green"], ["tatum"])
+    team_a, team_b = result["teams"]
+    pts = result["labels"].index("PTS")
+
+    assert (team_a["name"], team_b["name"]) == ("Alpha", "Beta")
+    assert team_a["delta"][pts] == pytest.approx(27 - 34)
+    assert team_b["delta"][pts] == pytest.approx(34 - 27)
+    # 兩隊的計數項目變化互為相反數
+    counting = ~result["is_pct"]
+    assert np.allclose(team_a["delta"][counting], -team_b["delta"][counting])
+    assert team_a["value_out"] == pytest.approx(team_b["value_in"])
+
+    # 同一份 snapshot 內重試（順序不同）直接用快取
+    assert snapshot.evaluate(["green", "curry"], ["tatum"]) is result
+
+
+def test_evaluate_rejects_invalid_trades():
+    snapshot = _snapshot()
+    with pytest.raises(TradeError):
+        snapshot.evaluate(["curry"], ["green"])
+    with pytest.raises(TradeError):
+        snapshot.evaluate(["curry", "tatum"], ["white"])
+    with pytest.raises(TradeError):
+        snapshot.evaluate(["curry"], ["free_agent"])
+    with pytest.raises(TradeError):
+        snapshot.evaluate(["curry"], ["curry"])
+
+
+def test_slow_snapshot_load_only_blocks_its_own_league(monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+
+    def load(league_key):
+        if league_key == "nba.l.slow":
+            started.set()
+            release.wait(5)
+        return _snapshot()
+
+    monkeypatch.setattr(trade, "_load_snapshot", load)
+    slow = threading.Thread(target=trade.get_roster_snapshot, args=("nba.l.slow",))
+    slow.start()
+    try:
+        assert started.wait(5)
+        # 另一個聯盟不用等 nba.l.slow 的 Yahoo 呼叫
+        assert trade.get_roster_snapshot("nba.l.fast") is not None
+        assert slow.is_alive()
+    finally:
+        release.set()
+        slow.join(5)